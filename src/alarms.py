@@ -0,0 +1,279 @@
+import re
+
+import numpy as np
+import pyqtgraph as pg
+
+RULE = re.compile(
+    r"^\s*(?:(?P<name>[^:`]+):)?\s*(?P<condition>.+?)"
+    r"(?:\s+hysteresis\s+(?P<hysteresis>\S+))?(?:\s+for\s+(?P<duration>\S+))?\s*$",
+    re.IGNORECASE,
+)
+FUNCTION = re.compile(r"^(?P<function>rate|nan|stuck)\s*\(\s*(?P<channel>[^)]+?)\s*\)\s*(?P<rest>.*)$", re.IGNORECASE)
+COMPARISON = re.compile(r"^(?P<channel>.*?)\s*(?P<operator>>=|<=|>|<)\s*(?P<level>[^<>=\s]+)$")
+LEVEL = re.compile(r"^(?P<operator>>=|<=|>|<)\s*(?P<level>\S+)$")
+
+
+def last_true(mask):
+    """
+    Returns the index of the last True of `mask` at or before every position
+    (-1 before the first one): carries a value set at some samples over the
+    following ones without a Python loop.
+    """
+    indices = np.where(mask, np.arange(len(mask)), -1)
+    np.maximum.accumulate(indices, out=indices)
+    return indices
+
+
+def shifted(values, first):
+    """Returns `values` shifted by one, `first` in front: the previous value of each sample"""
+    return np.concatenate(([first], values[:-1]))
+
+
+class AlarmEvent(object):
+    """An alarm raised (or cleared) by a rule at a sample"""
+
+    def __init__(self, rule, x, raised, value, y):
+        """
+        :param in float value: the value compared (e.g. the rate of change)
+        :param in float y: the value of the channel
+        """
+        self.rule = rule
+        self.x = x
+        self.raised = raised
+        self.value = value
+        self.y = y
+
+    def __str__(self):
+        return "Alarm '{}' {} at {:.6g} ({} = {:.6g})".format(
+            self.rule.name, "raised" if self.raised else "cleared", self.x, self.rule.channel, self.value
+        )
+
+
+class AlarmRule(object):
+    """
+    A condition on one channel, evaluated over whole batches of samples:
+
+    - `current > 2`, `temp <= -10`: a threshold, optionally with
+      `hysteresis 0.2` (cleared once 0.2 below / above the level again)
+    - `rate(current) > 100`: the rate of change, per unit of the x axis
+    - `nan(current)`: the value is not a number
+    - `stuck(current)`: the value did not change from one sample to the next
+
+    `for 50` only raises the alarm once the condition held for 50 units of the
+    x axis (e.g. `current > 2 for 50` with a time column in ms), and a rule
+    may be named with a `name:` prefix. Column names which contain spaces or
+    operators can be quoted with backticks, as for math channels.
+
+    The state of the rule (whether the condition holds, since when, the
+    previous sample) is carried from one batch to the next, so evaluating a
+    stream batch by batch gives the same events as evaluating all of it at
+    once.
+
+    :raises ValueError: if the rule cannot be parsed
+    """
+
+    def __init__(self, definition):
+        self.definition = definition.strip()
+        match = RULE.match(self.definition)
+        if match is None:
+            raise ValueError("Invalid alarm rule '{}'".format(definition))
+        condition = match.group("condition").strip()
+        self.function = None
+        self.operator = None
+        self.level = None
+        function = FUNCTION.match(condition)
+        if function is not None:
+            self.function = function.group("function").lower()
+            self.channel = function.group("channel")
+            rest = function.group("rest").strip()
+            if self.function == "rate":
+                comparison = LEVEL.match(rest)
+                if comparison is None:
+                    raise ValueError("Expected 'rate(channel) > level', got '{}'".format(condition))
+                self.__set_comparison__(comparison)
+            elif rest:
+                raise ValueError("Unexpected '{}' after {}()".format(rest, self.function))
+        else:
+            comparison = COMPARISON.match(condition)
+            if comparison is None:
+                raise ValueError("Expected 'channel > level', got '{}'".format(condition))
+            self.channel = comparison.group("channel")
+            self.__set_comparison__(comparison)
+        self.channel = self.channel.strip().strip("`").strip()
+        if not self.channel:
+            raise ValueError("Alarm rule '{}' has no channel".format(definition))
+        self.hysteresis = self.__number__(match.group("hysteresis") or "0", "hysteresis")
+        self.duration = self.__number__(match.group("duration") or "0", "duration")
+        if self.hysteresis and self.operator is None:
+            raise ValueError("Hysteresis only applies to thresholds")
+        self.name = (match.group("name") or "").strip() or condition
+        self.count = 0
+        self.reset()
+
+    @staticmethod
+    def __number__(text, what):
+        try:
+            return float(text)
+        except ValueError:
+            raise ValueError("Invalid {} '{}'".format(what, text))
+
+    def __set_comparison__(self, comparison):
+        self.operator = comparison.group("operator")
+        self.level = self.__number__(comparison.group("level"), "level")
+
+    def reset(self):
+        """Forgets the state carried between batches (e.g. when the device restarted)"""
+        self.last_x = np.nan
+        self.last_y = np.nan
+        # whether the condition held at the last sample, since when, and
+        # whether it held long enough to raise the alarm
+        self.state = False
+        self.run_start = np.nan
+        self.active = False
+
+    def __condition__(self, x, y):
+        """Returns (values compared, boolean mask of the samples where the condition holds)"""
+        previous_y = shifted(y, self.last_y)
+        if self.function == "nan":
+            return y, np.isnan(y)
+        if self.function == "stuck":
+            return y, y == previous_y
+        values = y
+        if self.function == "rate":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = (y - previous_y) / (x - shifted(x, self.last_x))
+        if self.operator[0] == ">":
+            fire = values >= self.level if self.operator == ">=" else values > self.level
+            release = values <= self.level - self.hysteresis
+        else:
+            fire = values <= self.level if self.operator == "<=" else values < self.level
+            release = values >= self.level + self.hysteresis
+        if not self.hysteresis:
+            release = ~fire & ~np.isnan(values)
+        # the state is that of the last sample which fired or released,
+        # samples in between (and NaNs) keep it
+        last = last_true(fire | release)
+        state = np.where(last >= 0, fire[np.maximum(last, 0)], self.state)
+        return values, state
+
+    def process(self, x, y):
+        """
+        :param in numpy.ndarray x: time values of the batch
+        :param in numpy.ndarray y: values of the channel for the batch
+        :returns: list of :class:`AlarmEvent`, in order
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if not len(x):
+            return []
+        values, state = self.__condition__(x, y)
+        state = state.astype(bool)
+
+        # time each run of the condition started at: a stuck value was
+        # already there at the previous sample
+        previous_state = shifted(state, self.state)
+        start_x = shifted(x, self.last_x) if self.function == "stuck" else x
+        last = last_true(state & ~previous_state)
+        run_start = np.where(last >= 0, start_x[np.maximum(last, 0)], self.run_start)
+        with np.errstate(invalid="ignore"):
+            active = state & (x - run_start >= self.duration)
+
+        previous_active = shifted(active, self.active)
+        raised = np.flatnonzero(active & ~previous_active)
+        cleared = np.flatnonzero(~active & previous_active)
+        self.count += len(raised)
+
+        self.last_x = x[-1]
+        self.last_y = y[-1]
+        self.state = bool(state[-1])
+        self.run_start = run_start[-1] if self.state else np.nan
+        self.active = bool(active[-1])
+
+        order = np.sort(np.concatenate((raised, cleared)))
+        is_raised = active[order]
+        return [
+            AlarmEvent(self, float(x[index]), bool(up), float(values[index]), float(y[index]))
+            for index, up in zip(order.tolist(), is_raised.tolist())
+        ]
+
+    def __str__(self):
+        return self.definition
+
+
+class AlarmRules(object):
+    """The alarm rules of a plot, evaluated over each batch of its columns"""
+
+    def __init__(self):
+        self.rules = []
+
+    def __len__(self):
+        return len(self.rules)
+
+    def add(self, rule):
+        """Adds a rule, replacing the one with the same name"""
+        self.rules = [r for r in self.rules if r.name != rule.name]
+        self.rules.append(rule)
+
+    def remove(self, name):
+        self.rules = [r for r in self.rules if r.name != name]
+
+    def reset(self):
+        for rule in self.rules:
+            rule.reset()
+
+    def copy(self):
+        """New rules with the same definitions and no state, e.g. to evaluate another plot"""
+        rules = AlarmRules()
+        for rule in self.rules:
+            rules.add(AlarmRule(rule.definition))
+        return rules
+
+    def process(self, names, batch):
+        """
+        :param in list names: names of the columns of the batch, time first
+        :param in numpy.ndarray batch: rows of samples
+        :returns: list of :class:`AlarmEvent` of all rules, by time
+        """
+        if not len(self.rules) or not len(batch):
+            return []
+        events = []
+        for rule in self.rules:
+            if rule.channel in names[1:]:
+                events.extend(rule.process(batch[:, 0], batch[:, names.index(rule.channel)]))
+        events.sort(key=lambda event: event.x)
+        return events
+
+    def summary(self):
+        """Returns a line per rule with the number of times it was raised"""
+        return [
+            "{}: {} ({})".format(rule.name, rule.count, "active" if rule.active else "inactive")
+            for rule in self.rules
+        ]
+
+
+class AlarmMarkers(object):
+    """The raised alarms of a :class:`plot.Plot`, marked at their sample"""
+
+    def __init__(self, plot):
+        self.scatter = pg.ScatterPlotItem(
+            symbol="t",
+            size=12,
+            pen=pg.mkPen("w"),
+            brush=pg.mkBrush(255, 60, 60, 220),
+            hoverable=True,
+            tip=lambda x, y, data: str(data),
+        )
+        plot.add_overlay(self.scatter)
+
+    def add(self, events):
+        raised = [event for event in events if event.raised]
+        if len(raised):
+            self.scatter.addPoints(
+                x=[event.x for event in raised],
+                # alarms on NaNs are marked at 0
+                y=[event.y if np.isfinite(event.y) else 0.0 for event in raised],
+                data=[str(event) for event in raised],
+            )
+
+    def clear(self):
+        self.scatter.clear()
@@ -0,0 +1,16 @@
+import re
+
+ANSI_ESCAPE = re.compile(r"(?:\x1B[@-_]|[\x80-\x9F])[0-?]*[ -/]*[@-~]")
+# the first character of every escape sequence
+ANSI_START = re.compile(r"[\x1B\x80-\x9F]")
+
+
+def escape_ansi(line):
+    return ANSI_ESCAPE.sub("", str(line))
+
+
+def escape_ansi_text(text):
+    """The same as escape_ansi, for long texts: skips the substitution if there are no escapes"""
+    if ANSI_START.search(text) is None:
+        return text
+    return ANSI_ESCAPE.sub("", text)
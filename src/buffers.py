@@ -0,0 +1,48 @@
+import numpy as np
+
+
+class GrowableArray(object):
+    """
+    Append-only numpy array with amortized O(1) appends, the capacity is
+    doubled whenever it runs out.
+    """
+
+    def __init__(self, dtype=float, capacity=1024):
+        self.buffer = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, values):
+        values = np.asarray(values, dtype=self.buffer.dtype).ravel()
+        end = self.size + len(values)
+        if end > len(self.buffer):
+            capacity = max(end, 2 * len(self.buffer))
+            buffer = np.empty(capacity, dtype=self.buffer.dtype)
+            buffer[: self.size] = self.buffer[: self.size]
+            self.buffer = buffer
+        self.buffer[self.size : end] = values
+        self.size = end
+
+    def append_value(self, value):
+        """Appends a single value, without the overhead of converting a batch"""
+        if self.size == len(self.buffer):
+            buffer = np.empty(max(1, 2 * len(self.buffer)), dtype=self.buffer.dtype)
+            buffer[: self.size] = self.buffer
+            self.buffer = buffer
+        self.buffer[self.size] = value
+        self.size += 1
+
+    def view(self):
+        """Returns a (no copy) view of the valid part of the buffer"""
+        return self.buffer[: self.size]
+
+    def discard(self, count):
+        """Removes the first `count` values"""
+        remaining = self.size - count
+        self.buffer[:remaining] = self.buffer[count : self.size]
+        self.size = remaining
+
+    def clear(self):
+        self.size = 0
@@ -0,0 +1,177 @@
+import math
+
+import numpy as np
+
+from range_index import RangeIndex, summarize
+
+
+class RunningStats(object):
+    """
+    Streaming count / mean / variance (Welford, merged batch by batch with
+    Chan's parallel update), min / max and rms of a series of values.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.sum_squares = 0.0
+        self.min = np.nan
+        self.max = np.nan
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        n = len(values)
+        if not n:
+            return
+        batch_mean = values.mean()
+        batch_m2 = ((values - batch_mean) ** 2).sum()
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += batch_m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.sum_squares += (values * values).sum()
+        self.min = np.fmin(self.min, values.min())
+        self.max = np.fmax(self.max, values.max())
+
+    @property
+    def variance(self):
+        return self.m2 / self.count if self.count else np.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance) if self.count else np.nan
+
+    @property
+    def rms(self):
+        return math.sqrt(self.sum_squares / self.count) if self.count else np.nan
+
+
+class QuantileSketch(object):
+    """
+    Mergeable quantile sketch with a bounded relative error (DDSketch): values
+    are counted in logarithmically sized buckets, so any quantile is within
+    `relative_accuracy` of the true value and two sketches merge by adding
+    their bucket counts.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def __insert__(self, store, magnitudes):
+        keys = np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64)
+        keys, counts = np.unique(keys, return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        tiny = np.finfo(float).tiny
+        positive = values[values > tiny]
+        negative = -values[values < -tiny]
+        self.__insert__(self.positive, positive)
+        self.__insert__(self.negative, negative)
+        self.zero_count += len(values) - len(positive) - len(negative)
+        self.count += len(values)
+
+    def merge(self, other):
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def __value__(self, key):
+        return 2 * self.gamma**key / (self.gamma + 1)
+
+    def quantile(self, q):
+        if not self.count:
+            return np.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self.__value__(key)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self.__value__(key)
+        return self.__value__(max(self.positive)) if self.positive else 0.0
+
+
+class ChannelStatistics(object):
+    """Accumulated statistics of one trace"""
+
+    def __init__(self):
+        self.values = RunningStats()
+        self.intervals = RunningStats()
+        self.quantiles = QuantileSketch()
+        self.index = RangeIndex()
+        self.last_x = None
+
+    def update(self, x, y):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if not len(x):
+            return
+        self.values.update(y)
+        self.quantiles.update(y)
+        if self.last_x is None:
+            self.intervals.update(np.diff(x))
+        else:
+            self.intervals.update(np.diff(x, prepend=self.last_x))
+        self.last_x = x[-1]
+        self.index.append(x, y)
+
+    @property
+    def sample_rate(self):
+        mean = self.intervals.mean
+        return 1.0 / mean if self.intervals.count and mean > 0 else np.nan
+
+    @property
+    def jitter(self):
+        """Standard deviation of the sample interval"""
+        return self.intervals.std
+
+    def visible(self, x_min, x_max, history=None):
+        """
+        Returns the statistics of the samples with x_min <= x <= x_max
+
+        :param in TraceHistory history: samples of the trace spilled to disk
+            (and discarded from the index), if any
+        """
+        start, end = self.index.index_range(x_min, x_max)
+        parts = [self.index.moments(start, end)]
+        if history is not None and x_min <= history.x_max:
+            parts.append(history.moments(x_min, x_max))
+        return summarize(parts)
+
+
+class Statistics(object):
+    """Per-trace statistics of a :class:`plot.Plot`, updated batch by batch"""
+
+    def __init__(self):
+        self.channels = dict()
+
+    def clear(self):
+        self.channels = dict()
+
+    def update(self, name, x, y):
+        if name not in self.channels:
+            self.channels[name] = ChannelStatistics()
+        self.channels[name].update(x, y)
@@ -0,0 +1,200 @@
+import math
+
+import numpy as np
+import pyqtgraph as pg
+from PyQt5 import QtCore
+from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout
+
+from channel_stats import RunningStats
+
+
+class ClockAnalysis(object):
+    """
+    Compares the time column of the received samples (the device clock) with
+    the host time each line was read at (`time.monotonic_ns()` in the port
+    session thread), updated batch by batch:
+
+    - the least squares fit host = offset + scale * device, from running
+      co-moments, gives the device time unit (e.g. 1e-3 host s for ms) and
+      the drift of the device clock against the host in ppm
+    - the residual of the latest sample against the fit is how late it
+      arrived compared to the average, e.g. growing while the host falls
+      behind
+    - the jitter histogram is of host interval - scale * device interval
+      between consecutive samples, in ms
+    - burstiness (Goh & Barabasi) of the host arrival intervals is -1 for
+      perfectly periodic arrivals, around 0 for random ones and approaches 1
+      when lines arrive in bursts (e.g. a USB-UART bridge's latency timer);
+      samples per read is how many lines arrived with the same read
+    """
+
+    def __init__(self, jitter_range_ms=50.0, bin_ms=0.5):
+        self.edges = np.arange(-jitter_range_ms, jitter_range_ms + bin_ms / 2, bin_ms)
+        self.reset()
+
+    def reset(self):
+        self.host_origin = None
+        self.device_origin = None
+        self.count = 0
+        self.mean_device = 0.0
+        self.mean_host = 0.0
+        self.m2_device = 0.0
+        self.co_moment = 0.0
+        self.last_device = np.nan
+        self.last_host = np.nan
+        self.last_host_ns = None
+        self.reads = 0
+        self.residual = np.nan
+        self.intervals = RunningStats()
+        self.jitter = RunningStats()
+        self.histogram = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.outside = 0
+
+    @property
+    def scale(self):
+        """Host seconds per device time unit, NaN until there are two samples"""
+        return self.co_moment / self.m2_device if self.m2_device > 0 else np.nan
+
+    @property
+    def unit(self):
+        """The power of ten the scale is closest to, e.g. 1e-3 for milliseconds"""
+        scale = self.scale
+        if not np.isfinite(scale) or scale <= 0:
+            return np.nan
+        return 10.0 ** round(math.log10(scale))
+
+    @property
+    def drift_ppm(self):
+        return (self.scale / self.unit - 1.0) * 1e6
+
+    @property
+    def burstiness(self):
+        mean, std = self.intervals.mean, self.intervals.std
+        if not self.intervals.count or mean + std <= 0:
+            return np.nan
+        return (std - mean) / (std + mean)
+
+    @property
+    def samples_per_read(self):
+        return self.count / self.reads if self.reads else np.nan
+
+    def update(self, device, host_ns):
+        """
+        :param in numpy.ndarray device: time column of a batch of samples
+        :param in numpy.ndarray host_ns: monotonic_ns the lines were read at
+        """
+        device = np.asarray(device, dtype=float)
+        host_ns = np.asarray(host_ns, dtype=np.int64)
+        if not len(device):
+            return
+        # the device restarted its clock (e.g. it was reset): start over
+        backwards = np.flatnonzero(np.diff(np.concatenate(([self.last_device], device))) < 0)
+        if len(backwards):
+            self.reset()
+            device = device[backwards[-1] :]
+            host_ns = host_ns[backwards[-1] :]
+        if self.host_origin is None:
+            self.host_origin = int(host_ns[0])
+            self.device_origin = device[0]
+            self.last_host_ns = int(host_ns[0]) - 1
+            self.last_device = device[0]
+            self.last_host = 0.0
+
+        d = device - self.device_origin
+        h = (host_ns - self.host_origin) * 1e-9
+        previous_device = self.last_device - self.device_origin
+
+        self.reads += len(np.unique(host_ns[host_ns != self.last_host_ns]))
+
+        # merge the batch into the co-moments (Chan et al.)
+        n = len(d)
+        batch_device, batch_host = d.mean(), h.mean()
+        total = self.count + n
+        delta_device = batch_device - self.mean_device
+        delta_host = batch_host - self.mean_host
+        weight = self.count * n / total
+        self.m2_device += ((d - batch_device) ** 2).sum() + delta_device * delta_device * weight
+        self.co_moment += ((d - batch_device) * (h - batch_host)).sum() + delta_device * delta_host * weight
+        self.mean_device += delta_device * n / total
+        self.mean_host += delta_host * n / total
+        self.count = total
+
+        host_intervals = np.diff(np.concatenate(([self.last_host], h)))
+        device_intervals = np.diff(np.concatenate(([previous_device], d)))
+        if self.count == n:
+            # the first sample has no interval
+            host_intervals, device_intervals = host_intervals[1:], device_intervals[1:]
+        self.intervals.update(host_intervals)
+
+        scale = self.scale
+        if np.isfinite(scale):
+            jitter_ms = (host_intervals - scale * device_intervals) * 1e3
+            self.jitter.update(jitter_ms)
+            counts, _ = np.histogram(jitter_ms, self.edges)
+            self.histogram += counts
+            self.outside += len(jitter_ms) - counts.sum()
+            offset = self.mean_host - scale * self.mean_device
+            self.residual = h[-1] - (offset + scale * d[-1])
+
+        self.last_device = device[-1]
+        self.last_host = h[-1]
+        self.last_host_ns = int(host_ns[-1])
+
+    def summary(self):
+        """Returns the results as lines of text"""
+        if self.count < 2:
+            return ["Waiting for samples"]
+        return [
+            "Samples: {}, reads: {}, samples per read: {:.2f}".format(
+                self.count, self.reads, self.samples_per_read
+            ),
+            "Device time unit: {:.6g} host s (fit {:.9g}), drift: {:+.1f} ppm".format(
+                self.unit, self.scale, self.drift_ppm
+            ),
+            "Latest sample arrived {:+.3f} ms from the fit".format(self.residual * 1e3),
+            "Host interval: mean {:.3f} ms, std {:.3f} ms, max {:.3f} ms".format(
+                self.intervals.mean * 1e3, self.intervals.std * 1e3, self.intervals.max * 1e3
+            ),
+            "Jitter: std {:.3f} ms, min {:+.3f} ms, max {:+.3f} ms ({} outside the histogram)".format(
+                self.jitter.std, self.jitter.min, self.jitter.max, self.outside
+            ),
+            "Burstiness: {:+.2f} (-1 periodic, 0 random, 1 bursty)".format(self.burstiness),
+        ]
+
+
+class ClockView(QWidget):
+    """Shows the results of a :class:`ClockAnalysis`, refreshed while visible"""
+
+    def __init__(self, analysis, font, update_frequency_hz=2, parent=None):
+        super().__init__(parent)
+        self.analysis = analysis
+        self.label = QLabel()
+        self.label.setFont(font)
+        self.label.setStyleSheet("QLabel {color: white;}")
+
+        self.canvas = pg.PlotWidget()
+        self.canvas.showGrid(x=True, y=True, alpha=0.4)
+        self.canvas.getAxis("left").setTextPen("w")
+        self.canvas.getAxis("bottom").setTextPen("w")
+        self.canvas.getPlotItem().setLabel("bottom", text="Jitter (ms)")
+        self.canvas.getPlotItem().setLabel("left", text="Samples")
+        self.histogram = self.canvas.plot(stepMode="center", fillLevel=0, brush=(100, 150, 255, 150))
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.label)
+        layout.addWidget(self.canvas)
+
+        self.update_timer = QtCore.QTimer()
+        self.update_timer.timeout.connect(self.refresh)
+        self.update_period_ms = int(1000.0 / update_frequency_hz)
+
+    def set_visible(self, visible):
+        if visible:
+            self.refresh()
+            self.update_timer.start(self.update_period_ms)
+        else:
+            self.update_timer.stop()
+
+    def refresh(self):
+        self.label.setText("\n".join(self.analysis.summary()))
+        self.histogram.setData(self.analysis.edges, self.analysis.histogram)
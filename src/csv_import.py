@@ -0,0 +1,363 @@
+import collections
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ansi import escape_ansi, escape_ansi_text
+
+# bytes of the file parsed by one task
+RANGE_BYTES = 16 << 20
+# smaller files are parsed on the import thread, a pool is not worth starting
+POOL_MIN_BYTES = 32 << 20
+# lines of incorrect length kept to be logged, of each range
+EXAMPLES = 5
+# ranges passed to `ImportJob.on_range` and not applied yet, at most: they
+# are parsed faster than the GUI thread appends them to the plot
+QUEUED_RANGES = 2
+# the bytes a line of numbers can hold (including nan / inf / infinity)
+NUMERIC_BYTES = np.zeros(256, dtype=bool)
+NUMERIC_BYTES[np.frombuffer(b"0123456789.,+-eE \t\r\nnaifNAIFty", dtype=np.uint8)] = True
+
+
+def parse_header(line):
+    """
+    Returns the column names of a `%` header line (e.g. `%time,a,b`), None
+    if the line is not a header
+    """
+    row = escape_ansi(line).strip().split(",")
+    if len(row) < 2 or "%" not in row[0]:
+        return None
+    header = [name.replace("%", "").strip() for name in row]
+    return list(dict.fromkeys(header))
+
+
+def find_header(path):
+    """
+    :returns: (header, offset of the first line after it, text up to there),
+        the header is empty if the file has none
+    """
+    lines = []
+    with open(path, "rb") as file:
+        for line in file:
+            text = line.decode("utf-8", "replace")
+            lines.append(text)
+            header = parse_header(text)
+            if header is not None:
+                return header, file.tell(), escape_ansi_text("".join(lines))
+        return [], file.tell(), escape_ansi_text("".join(lines))
+
+
+def split_ranges(path, start, end, range_bytes=RANGE_BYTES):
+    """Returns the [start, end) byte ranges of about `range_bytes`, split after newlines"""
+    boundaries = [start]
+    with open(path, "rb") as file:
+        position = start + range_bytes
+        while position < end:
+            file.seek(position)
+            file.readline()
+            position = file.tell()
+            if position >= end:
+                break
+            boundaries.append(position)
+            position += range_bytes
+    boundaries.append(end)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def parse_numeric(line):
+    """Returns the values of a line of any length, None if any of them is not a number"""
+    try:
+        return [float(x) for x in line.split(",")]
+    except ValueError:
+        return None
+
+
+class ParsedRange(object):
+    """
+    The result of parsing a byte range of a CSV file: the sanitized text (for
+    the output view), the rows with exactly as many numbers as the header has
+    columns, and the numeric lines which had another number of columns.
+    """
+
+    def __init__(self, end, text, rows, incorrect, examples):
+        # file offset the range ends at
+        self.end = end
+        self.text = text
+        self.rows = rows
+        self.incorrect = incorrect
+        self.examples = examples
+        # name of the shared memory holding the rows, while in transit
+        self.shared = None
+
+    def share(self):
+        """Moves the rows to shared memory, so only its name is sent back to the parent"""
+        shared = shared_memory.SharedMemory(create=True, size=max(1, self.rows.nbytes))
+        np.ndarray(self.rows.shape, dtype=self.rows.dtype, buffer=shared.buf)[:] = self.rows
+        self.shared = (shared.name, self.rows.shape)
+        self.rows = None
+        shared.close()
+
+    def collect(self):
+        """Takes the rows back out of shared memory, and releases it"""
+        name, shape = self.shared
+        shared = shared_memory.SharedMemory(name=name)
+        try:
+            self.rows = np.ndarray(shape, dtype=float, buffer=shared.buf).copy()
+        finally:
+            shared.close()
+            shared.unlink()
+        self.shared = None
+
+
+def parse_text(text, width):
+    """
+    Parses the lines of `text` with `width` comma separated numbers into a
+    (rows, width) array; the others are skipped (lines which are all numbers
+    but of another width are counted as incorrect).
+
+    The lines are classified by their number of commas (and whether they
+    only hold the bytes numbers are written with) on the whole buffer at
+    once, and runs of well formed lines are converted by numpy's C parser, so
+    only malformed lines go through Python.
+    """
+    data = text.encode("utf-8")
+    if not len(data):
+        return np.empty((0, width)), 0, []
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    newlines = np.flatnonzero(buffer == ord("\n"))
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [len(data)]))
+    commas = np.flatnonzero(buffer == ord(","))
+    counts = np.searchsorted(commas, ends) - np.searchsorted(commas, starts)
+    lengths = ends - starts
+    first = buffer[np.minimum(starts, len(data) - 1)]
+    # e.g. `I (123) wifi: a, b, c` has the right number of commas, but text
+    # (comparisons first: looking every byte up in the table is much slower)
+    candidates = np.flatnonzero((buffer > ord("9")) | (buffer < ord("0")))
+    other = candidates[~NUMERIC_BYTES[buffer[candidates]]]
+    text_bytes = np.searchsorted(other, ends) - np.searchsorted(other, starts)
+    good = (counts == width - 1) & (lengths > 0) & (first != ord("%")) & (text_bytes == 0)
+
+    blocks = []
+    incorrect = 0
+    examples = []
+    # lines of another width which are all numbers are reported, the rest
+    # (log text, blank lines, headers) is skipped silently
+    for index in np.flatnonzero(~good & (lengths > 0) & (counts > 0)).tolist():
+        line = data[starts[index] : ends[index]].decode("utf-8")
+        if parse_numeric(line) is not None:
+            incorrect += 1
+            if len(examples) < EXAMPLES:
+                examples.append(line.strip())
+
+    # runs of consecutive well formed lines
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], good.astype(np.int8), [0]))))
+    for run_start, run_end in zip(edges[0::2].tolist(), edges[1::2].tolist()):
+        parse_run(data, starts, ends, run_start, run_end, width, blocks)
+    rows = np.concatenate(blocks) if len(blocks) else np.empty((0, width))
+    return rows, incorrect, examples
+
+
+def parse_run(data, starts, ends, first, last, width, blocks):
+    """
+    Appends the rows of the lines [first, last) of `data` to `blocks`, parsed
+    by numpy; if some field is not a number after all (e.g. `nan,inf,a`), the
+    run is split in halves, so only the lines around it go through Python.
+    """
+    chunk = data[starts[first] : ends[last - 1]]
+    try:
+        blocks.append(np.loadtxt(io.BytesIO(chunk), delimiter=",", dtype=float, comments=None, ndmin=2))
+        return
+    except ValueError:
+        pass
+    if last - first <= 16:
+        parsed = [parse_numeric(line) for line in chunk.decode("utf-8").split("\n")]
+        blocks.append(np.array([values for values in parsed if values is not None], dtype=float).reshape(-1, width))
+        return
+    middle = (first + last) // 2
+    parse_run(data, starts, ends, first, middle, width, blocks)
+    parse_run(data, starts, ends, middle, last, width, blocks)
+
+
+def parse_range(path, start, end, width, shared=False):
+    """Reads, sanitizes and parses the bytes [start, end) of a CSV file"""
+    with open(path, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    text = escape_ansi_text(data.decode("utf-8", "replace"))
+    rows, incorrect, examples = parse_text(text, width)
+    parsed = ParsedRange(end, text, rows, incorrect, examples)
+    if shared:
+        parsed.share()
+    return parsed
+
+
+def parse_shared_range(args):
+    """Pool task: parse_range, returning the rows in shared memory instead of pickled"""
+    return parse_range(*args, shared=True)
+
+
+def parse_file(path, start, width, workers=None, cancelled=None):
+    """
+    Yields the :class:`ParsedRange` of the file from `start` on, in file
+    order. Large files are parsed by a pool of `workers` processes (one per
+    core by default), at most two ranges per worker in flight.
+    """
+    end = os.path.getsize(path)
+    ranges = split_ranges(path, start, end)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or end - start < POOL_MIN_BYTES:
+        for range_start, range_end in ranges:
+            if cancelled is not None and cancelled.is_set():
+                return
+            yield parse_range(path, range_start, range_end, width)
+        return
+
+    # spawned (not forked) workers: the GUI process has threads running
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(min(workers, len(ranges))) as pool:
+        pending = collections.deque()
+        tasks = iter(ranges)
+        try:
+            for range_start, range_end in tasks:
+                pending.append(pool.apply_async(parse_shared_range, ((path, range_start, range_end, width),)))
+                if len(pending) < 2 * workers:
+                    continue
+                parsed = pending.popleft().get()
+                parsed.collect()
+                yield parsed
+                if cancelled is not None and cancelled.is_set():
+                    break
+            while len(pending) and not (cancelled is not None and cancelled.is_set()):
+                parsed = pending.popleft().get()
+                parsed.collect()
+                yield parsed
+        finally:
+            # release the shared memory of the ranges parsed but not used
+            for result in pending:
+                try:
+                    result.get().collect()
+                except Exception:
+                    pass
+
+
+class ImportJob(object):
+    """
+    Imports a `%` header CSV file on a worker thread (and a process pool for
+    large files). Called on the worker thread, in this order:
+
+    - `on_header(header, text)`: the column names (empty if there is no
+      header) and the text up to and including the header line
+    - `on_range(parsed, fraction)`: the :class:`ParsedRange` of each part of
+      the file, in order, and the fraction of the file done
+    - `on_finished(path, error)`: `error` is empty on success
+
+    `on_range` may hand the range over to another thread (e.g. with a Qt
+    signal), which calls :meth:`applied` once it is done with it: at most
+    `QUEUED_RANGES` ranges wait to be applied, the import waits for the rest.
+    """
+
+    def __init__(self, path, workers=None, on_header=None, on_range=None, on_finished=None):
+        self.path = path
+        self.workers = workers
+        self.on_header = on_header
+        self.on_range = on_range
+        self.on_finished = on_finished
+        self.cancelled = threading.Event()
+        self.queued = threading.Semaphore(QUEUED_RANGES)
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.__run__, daemon=True)
+            self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def applied(self):
+        """Called (from any thread) once a range passed to `on_range` is applied"""
+        self.queued.release()
+
+    def __wait_to_queue__(self):
+        """Waits until one more range may be passed to `on_range`, False if cancelled meanwhile"""
+        while not self.queued.acquire(timeout=0.1):
+            if self.cancelled.is_set():
+                return False
+        return True
+
+    def __run__(self):
+        error = ""
+        try:
+            header, start, text = find_header(self.path)
+            if self.on_header:
+                self.on_header(header, text)
+            if len(header):
+                size = max(1, os.path.getsize(self.path) - start)
+                for parsed in parse_file(self.path, start, len(header), self.workers, self.cancelled):
+                    if not self.on_range:
+                        continue
+                    if not self.__wait_to_queue__():
+                        break
+                    self.on_range(parsed, (parsed.end - start) / size)
+            if self.cancelled.is_set():
+                error = "cancelled"
+        except Exception as e:
+            print("Import thread exception: " + str(e))
+            error = str(e)
+        if self.on_finished:
+            self.on_finished(self.path, error)
+
+
+def import_file(path, workers=None):
+    """Parses a whole file, returns (header, rows), e.g. for benchmarking"""
+    header, start, _ = find_header(path)
+    blocks = [parsed.rows for parsed in parse_file(path, start, len(header), workers)] if len(header) else []
+    return header, np.concatenate(blocks) if len(blocks) else np.empty((0, len(header)))
+
+
+if __name__ == "__main__":
+    # benchmark, e.g. `python csv_import.py 64 256 1024`: writes CSV files of
+    # these sizes (MB) and reports the import throughput with 1, 2, 4, ...
+    # workers, up to the number of cores
+    sizes = [int(arg) for arg in sys.argv[1:]] or [16, 64, 256]
+    cores = os.cpu_count() or 1
+    counts = sorted(set([1 << i for i in range(cores.bit_length()) if 1 << i <= cores] + [cores]))
+    rng = np.random.default_rng(0)
+    line = "{:.3f},{:.6f},{:.6f},{:.6f}\n"
+    print("{} cores".format(cores))
+    for size in sizes:
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as file:
+            path = file.name
+            file.write("%time,a,b,c\n")
+            rows = 0
+            block = rng.standard_normal((100000, 3))
+            while file.tell() < size << 20:
+                file.write("".join(line.format(rows + i, *values) for i, values in enumerate(block.tolist())))
+                rows += len(block)
+        try:
+            for workers in counts:
+                # the pool is only used for large files, force it
+                POOL_MIN_BYTES = 0 if workers > 1 else POOL_MIN_BYTES
+                started = time.perf_counter()
+                header, data = import_file(path, workers)
+                elapsed = time.perf_counter() - started
+                assert len(data) == rows, (len(data), rows)
+                print(
+                    "{:>6} MB, {:>2} workers: {:>7.2f} s, {:>7.1f} MB/s, {:>12,.0f} rows/s".format(
+                        size, workers, elapsed, os.path.getsize(path) / elapsed / 1e6, rows / elapsed
+                    )
+                )
+        finally:
+            os.remove(path)
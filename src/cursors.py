@@ -0,0 +1,143 @@
+import pyqtgraph as pg
+from PyQt5 import QtCore
+from PyQt5.QtWidgets import QLabel
+
+
+def format_value(value):
+    return "{:.6g}".format(value) if value is not None else "-"
+
+
+class Cursors(object):
+    """
+    Reading values off a :class:`plot.Plot`:
+
+    - a crosshair following the mouse, with the value of every trace at the
+      time under it
+    - two measurement cursors (A and B) to drag along the x axis, with the
+      time between them, its inverse, and each trace's value at both, its
+      change and its min / max / mean between them in `readout`
+
+    Values are looked up by binary search of the time column and the range
+    statistics come from the per-block index of :mod:`range_index`, so both
+    take about the same time however long the capture is (including the
+    spilled history).
+    """
+
+    def __init__(self, plot, update_frequency_hz=4):
+        self.plot = plot
+        self.plot_item = plot.plot_item
+
+        self.vertical = pg.InfiniteLine(angle=90, movable=False, pen=pg.mkPen("w", width=1))
+        self.horizontal = pg.InfiniteLine(angle=0, movable=False, pen=pg.mkPen("w", width=1))
+        self.hover_text = pg.TextItem(color="w", fill=pg.mkBrush(27, 27, 28, 200), anchor=(0, 1))
+        for item in (self.vertical, self.horizontal, self.hover_text):
+            item.hide()
+            item.setZValue(1000)
+            plot.add_overlay(item)
+        self.hover_proxy = None
+
+        self.markers = []
+        for name, color in (("A", "y"), ("B", "c")):
+            marker = pg.InfiniteLine(
+                angle=90,
+                movable=True,
+                pen=pg.mkPen(color, width=1, style=QtCore.Qt.DashLine),
+                label=name,
+                labelOpts={"position": 0.95, "color": color},
+            )
+            marker.hide()
+            marker.setZValue(1000)
+            marker.sigPositionChanged.connect(self.refresh)
+            plot.add_overlay(marker)
+            self.markers.append(marker)
+        self.placed = False
+
+        self.readout = QLabel()
+        self.readout.setStyleSheet("QLabel {font: 10pt monospace; color: white; background: rgb(27,27,28);}")
+        self.readout.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse)
+        self.readout.hide()
+
+        # the data between the cursors changes as samples come in
+        self.update_timer = QtCore.QTimer()
+        self.update_timer.timeout.connect(self.refresh)
+        self.update_period_ms = int(1000.0 / update_frequency_hz)
+
+    def traces(self):
+        return [name for name in self.plot.channel_names() if name in self.plot.data]
+
+    def set_crosshair_visible(self, visible):
+        if visible and self.hover_proxy is None:
+            self.hover_proxy = pg.SignalProxy(self.plot.canvas.scene().sigMouseMoved, rateLimit=60, slot=self.__on_mouse_moved__)
+        elif not visible and self.hover_proxy is not None:
+            self.hover_proxy.disconnect()
+            self.hover_proxy = None
+        if not visible:
+            for item in (self.vertical, self.horizontal, self.hover_text):
+                item.hide()
+
+    def set_measurement_visible(self, visible):
+        if visible and not self.placed:
+            # a third and two thirds of the way across the view
+            (x_min, x_max), _ = self.plot_item.viewRange()
+            self.markers[0].setValue(x_min + (x_max - x_min) / 3)
+            self.markers[1].setValue(x_min + 2 * (x_max - x_min) / 3)
+            self.placed = True
+        for marker in self.markers:
+            marker.setVisible(visible)
+        self.readout.setVisible(visible)
+        if visible:
+            self.refresh()
+            self.update_timer.start(self.update_period_ms)
+        else:
+            self.update_timer.stop()
+
+    def __on_mouse_moved__(self, event):
+        position = event[0]
+        if not self.plot_item.sceneBoundingRect().contains(position):
+            for item in (self.vertical, self.horizontal, self.hover_text):
+                item.hide()
+            return
+        point = self.plot_item.vb.mapSceneToView(position)
+        x_value = point.x()
+        lines = ["{} = {}".format(self.plot.trace_names[0] if len(self.plot.trace_names) else "x", format_value(x_value))]
+        for name in self.traces():
+            sample = self.plot.sample_at(name, x_value)
+            if sample is not None:
+                lines.append("{}: {}".format(name, format_value(sample[1])))
+        self.vertical.setPos(x_value)
+        self.horizontal.setPos(point.y())
+        self.hover_text.setText("\n".join(lines))
+        self.hover_text.setPos(x_value, point.y())
+        for item in (self.vertical, self.horizontal, self.hover_text):
+            item.show()
+
+    def refresh(self):
+        if not self.readout.isVisible():
+            return
+        a, b = self.markers[0].value(), self.markers[1].value()
+        dt = b - a
+        lines = [
+            "A = {}   B = {}   Δt = {}   1/Δt = {}".format(
+                format_value(a), format_value(b), format_value(dt), format_value(1.0 / dt) if dt else "-"
+            ),
+            "{:<20} {:>12} {:>12} {:>12} {:>12} {:>12} {:>12}".format("", "A", "B", "Δy", "min", "max", "mean"),
+        ]
+        x_min, x_max = min(a, b), max(a, b)
+        for name in self.traces():
+            at_a = self.plot.sample_at(name, a)
+            at_b = self.plot.sample_at(name, b)
+            y_a = at_a[1] if at_a is not None else None
+            y_b = at_b[1] if at_b is not None else None
+            between = self.plot.range_statistics(name, x_min, x_max) or {}
+            lines.append(
+                "{:<20} {:>12} {:>12} {:>12} {:>12} {:>12} {:>12}".format(
+                    name[:20],
+                    format_value(y_a),
+                    format_value(y_b),
+                    format_value(y_b - y_a if y_a is not None and y_b is not None else None),
+                    format_value(between.get("min")),
+                    format_value(between.get("max")),
+                    format_value(between.get("mean")),
+                )
+            )
+        self.readout.setText("\n".join(lines))
@@ -0,0 +1,167 @@
+import ast
+import operator
+import re
+
+import numpy as np
+
+BINARY_OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+    ast.Mod: np.mod,
+    ast.Pow: np.power,
+}
+
+UNARY_OPERATORS = {
+    ast.USub: np.negative,
+    ast.UAdd: np.positive,
+}
+
+COMPARE_OPERATORS = {
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+
+FUNCTIONS = {
+    "abs": np.abs,
+    "sqrt": np.sqrt,
+    "exp": np.exp,
+    "log": np.log,
+    "log10": np.log10,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "asin": np.arcsin,
+    "acos": np.arccos,
+    "atan": np.arctan,
+    "atan2": np.arctan2,
+    "hypot": np.hypot,
+    "min": np.minimum,
+    "max": np.maximum,
+    "clip": np.clip,
+    "sign": np.sign,
+    "floor": np.floor,
+    "ceil": np.ceil,
+    "round": np.round,
+    "degrees": np.degrees,
+    "radians": np.radians,
+    "where": np.where,
+}
+
+CONSTANTS = {
+    "pi": np.pi,
+    "e": np.e,
+}
+
+QUOTED_NAME = re.compile(r"`([^`]+)`")
+
+
+class DerivedChannel(object):
+    """
+    A trace computed from the other columns of the header, e.g.
+    `mag = sqrt(ax^2 + ay^2 + az^2)`.
+
+    The expression is parsed once into a tree of numpy operations, which is
+    then evaluated over whole columns (a received batch or an imported file)
+    at a time. Column names which are not valid identifiers can be quoted
+    with backticks, e.g. `` `motor current` * 2 ``.
+
+    :raises ValueError: if the expression is invalid or uses anything other
+        than column names, numbers, arithmetic and the known functions
+    """
+
+    def __init__(self, name, expression):
+        self.name = name.strip()
+        self.expression = expression.strip()
+        if not self.name:
+            raise ValueError("Derived channel has no name")
+
+        # replace quoted column names with identifiers the parser accepts
+        self.aliases = {}
+
+        def alias(match):
+            identifier = "__column_{}".format(len(self.aliases))
+            self.aliases[identifier] = match.group(1).strip()
+            return identifier
+
+        source = QUOTED_NAME.sub(alias, self.expression)
+        # `^` is what people write for "to the power of", not xor, and it
+        # needs the precedence of `**` too
+        source = source.replace("^", "**")
+        try:
+            tree = ast.parse(source, mode="eval")
+        except SyntaxError as e:
+            raise ValueError("Invalid expression '{}': {}".format(self.expression, e.msg))
+        self.columns = set()
+        self.evaluate = self.__compile__(tree.body)
+
+    @staticmethod
+    def parse(definition):
+        """Creates a :class:`DerivedChannel` from a `name = expression` string"""
+        name, separator, expression = definition.partition("=")
+        if not separator:
+            raise ValueError("Expected 'name = expression', got '{}'".format(definition))
+        return DerivedChannel(name, expression)
+
+    def __compile__(self, node):
+        """
+        Turns an expression node into a function of a dict of column name ->
+        numpy array
+        """
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            value = float(node.value)
+            return lambda columns: value
+        elif isinstance(node, ast.Name):
+            if node.id in CONSTANTS:
+                value = CONSTANTS[node.id]
+                return lambda columns: value
+            column = self.aliases.get(node.id, node.id)
+            self.columns.add(column)
+            return operator.itemgetter(column)
+        elif isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            function = BINARY_OPERATORS[type(node.op)]
+            left = self.__compile__(node.left)
+            right = self.__compile__(node.right)
+            return lambda columns: function(left(columns), right(columns))
+        elif isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+            function = UNARY_OPERATORS[type(node.op)]
+            operand = self.__compile__(node.operand)
+            return lambda columns: function(operand(columns))
+        elif (
+            isinstance(node, ast.Compare)
+            and len(node.ops) == 1
+            and type(node.ops[0]) in COMPARE_OPERATORS
+        ):
+            function = COMPARE_OPERATORS[type(node.ops[0])]
+            left = self.__compile__(node.left)
+            right = self.__compile__(node.comparators[0])
+            return lambda columns: function(left(columns), right(columns)).astype(float)
+        elif (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in FUNCTIONS
+            and not node.keywords
+        ):
+            function = FUNCTIONS[node.func.id]
+            arguments = [self.__compile__(argument) for argument in node.args]
+            return lambda columns: function(*[argument(columns) for argument in arguments])
+        raise ValueError(
+            "Unsupported expression '{}' in '{}'".format(ast.unparse(node), self.expression)
+        )
+
+    def __call__(self, columns, length):
+        """
+        :param in dict columns: column name -> numpy array, all of `length`
+        :returns: numpy array of `length` values
+        """
+        with np.errstate(all="ignore"):
+            values = self.evaluate(columns)
+        return np.broadcast_to(np.asarray(values, dtype=float), (length,))
+
+    def __str__(self):
+        return "{} = {}".format(self.name, self.expression)
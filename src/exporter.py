@@ -0,0 +1,189 @@
+import json
+import os
+import struct
+import threading
+
+import numpy as np
+
+# rows converted and written at a time
+CHUNK_ROWS = 1 << 16
+
+# columnar files: magic, header length, JSON header (padded so the data is
+# 64 byte aligned), then every column as contiguous little-endian float64
+COLUMNAR_MAGIC = b"USPCOL1\n"
+COLUMNAR_EXTENSION = ".uspc"
+
+
+class PlotSnapshot(object):
+    """
+    The time column, header columns and math channels of a :class:`plot.Plot`,
+    limited to the rows [start, end) which existed when it was taken,
+    including the rows spilled to disk.
+
+    The plot's lists are only ever appended to (clearing the plot or spilling
+    replaces them), so the snapshot keeps references to them instead of
+    copying, and rows are converted to numpy a chunk at a time from the
+    export thread. Math channels added part way through the capture are
+    padded with NaN.
+    """
+
+    def __init__(self, plot, x_range=None):
+        """
+        :param in Plot plot: plot to export
+        :param in tuple x_range: (x_min, x_max) of the rows to export, all
+            rows if None
+        :raises ValueError: if the plot has no data
+        """
+        names = [name for name in plot.column_names() if name in plot.data]
+        if len(plot.trace_names) < 2 or not len(names):
+            raise ValueError("The plot has no data to export")
+        x = plot.column(names[0], 0)
+        self.names = plot.trace_names[:1] + names
+        self.columns = [x] + [plot.column(name, 1) for name in names]
+        length = len(x)
+        # a column shorter than the time column holds its latest rows
+        self.offsets = [length - len(column) for column in self.columns]
+
+        self.start, self.end = 0, length
+        if x_range is not None:
+            self.start = x.search(x_range[0], "left")
+            self.end = max(self.start, x.search(x_range[1], "right"))
+
+    def __len__(self):
+        return self.end - self.start
+
+    def column(self, index, start, end):
+        """Returns rows [start, end) (relative to the snapshot) of one column"""
+        start += self.start
+        end += self.start
+        values = np.full(end - start, np.nan)
+        column, offset = self.columns[index], self.offsets[index]
+        first = max(start, offset)
+        if first < end:
+            values[first - start :] = column.read(first - offset, end - offset)
+        return values
+
+    def chunk(self, start, end):
+        """Returns rows [start, end) (relative to the snapshot) as a 2D array"""
+        return np.column_stack([self.column(index, start, end) for index in range(len(self.columns))])
+
+    def chunks(self):
+        """Yields (rows written before, rows) for consecutive chunks"""
+        for start in range(0, len(self), CHUNK_ROWS):
+            yield start, self.chunk(start, min(len(self), start + CHUNK_ROWS))
+
+
+def write_csv(snapshot, file, job):
+    """
+    Writes a snapshot in the `%` header CSV format which File > Open Raw reads,
+    floats in their shortest round-trip representation.
+    """
+    file.write("%" + ",".join(snapshot.names) + "\n")
+    for done, rows in snapshot.chunks():
+        file.write("\n".join(",".join(map(repr, row)) for row in rows.tolist()))
+        file.write("\n")
+        job.progress(done + len(rows))
+
+
+def write_columnar(snapshot, file, job):
+    """
+    Writes a snapshot column after column, so each column can later be
+    memory mapped on its own, see :func:`read_columnar`.
+    """
+    header = json.dumps({"columns": snapshot.names, "rows": len(snapshot), "dtype": "<f8"}).encode("utf-8")
+    used = len(COLUMNAR_MAGIC) + 4 + len(header)
+    header += b" " * (-used % 64)
+    file.write(COLUMNAR_MAGIC + struct.pack("<I", len(header)) + header)
+
+    total = len(snapshot) * len(snapshot.names)
+    for index in range(len(snapshot.names)):
+        for start in range(0, len(snapshot), CHUNK_ROWS):
+            end = min(len(snapshot), start + CHUNK_ROWS)
+            file.write(snapshot.column(index, start, end).astype("<f8").tobytes())
+            job.progress(index * len(snapshot) + end, total)
+
+
+def read_columnar(path):
+    """
+    :returns: dict of column name -> read only, memory mapped numpy array
+    :raises ValueError: if the file is not a columnar export
+    """
+    with open(path, "rb") as file:
+        if file.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError("'{}' is not a columnar export".format(path))
+        (length,) = struct.unpack("<I", file.read(4))
+        header = json.loads(file.read(length).decode("utf-8"))
+        offset = file.tell()
+    names, rows = header["columns"], header["rows"]
+    if not rows:
+        return {name: np.empty(0) for name in names}
+    data = np.memmap(path, dtype=header["dtype"], mode="r", offset=offset, shape=(len(names), rows))
+    return {name: data[index] for index, name in enumerate(names)}
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class ExportJob(object):
+    """
+    Writes one export file on a worker thread. `write(file, job)` writes the
+    data in chunks and calls `job.progress(done)` after each one, which
+    reports the progress and stops the job once it is cancelled.
+
+    `on_progress(fraction)` and `on_finished(path, error)` are called on the
+    worker thread, `error` is empty on success. A cancelled or failed export
+    does not leave a partial file behind.
+    """
+
+    def __init__(self, path, write, total, binary=False, on_progress=None, on_finished=None):
+        self.path = path
+        self.write = write
+        self.total = total
+        self.binary = binary
+        self.on_progress = on_progress
+        self.on_finished = on_finished
+        self.cancelled = threading.Event()
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.__run__, daemon=True)
+            self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def progress(self, done, total=None):
+        if self.cancelled.is_set():
+            raise ExportCancelled()
+        total = total if total is not None else self.total
+        if self.on_progress and total:
+            self.on_progress(min(1.0, done / total))
+
+    def __run__(self):
+        error = ""
+        file = None
+        try:
+            if self.binary:
+                file = open(self.path, "wb")
+            else:
+                file = open(self.path, "w", newline="\n", encoding="utf-8")
+            with file:
+                self.write(file, self)
+        except ExportCancelled:
+            error = "cancelled"
+        except Exception as e:
+            print("Export thread exception: " + str(e))
+            error = str(e)
+        if error and file is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        if self.on_finished:
+            self.on_finished(self.path, error)
@@ -0,0 +1,86 @@
+import json
+import sys
+import time
+
+import numpy as np
+
+from fanout_server import FRAME, HEADER, BATCH, BATCH_HEADER, GAP, GAP_PAYLOAD, connect, default_address
+
+
+class FanoutClient(object):
+    """
+    Reference subscriber of a :class:`fanout_server.FanoutServer`. Iterating
+    over it yields the messages of the server as they arrive:
+
+    - ("header", tag, columns): the column names of the batches of `tag`
+    - ("batch", tag, rows): a 2D numpy array of samples
+    - ("gap", None, count): `count` batches were dropped because this client
+      did not keep up
+
+    e.g.
+
+        for kind, tag, value in FanoutClient("unix:/tmp/uart_serial_plotter.sock"):
+            if kind == "batch":
+                print(tag, value[-1])
+    """
+
+    def __init__(self, address=None):
+        self.connection = connect(address or default_address())
+        self.buffer = bytearray()
+        self.columns = {}
+
+    def close(self):
+        self.connection.close()
+
+    def __read__(self, size):
+        while len(self.buffer) < size:
+            data = self.connection.recv(max(1 << 20, size - len(self.buffer)))
+            if not data:
+                raise EOFError("the server closed the connection")
+            self.buffer += data
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def read(self):
+        """Returns the next message, see the class description"""
+        kind, length = FRAME.unpack(self.__read__(FRAME.size))
+        payload = self.__read__(length)
+        if kind == HEADER:
+            header = json.loads(payload.decode("utf-8"))
+            self.columns[header["tag"]] = header["columns"]
+            return "header", header["tag"], header["columns"]
+        if kind == BATCH:
+            tag_length, rows, columns = BATCH_HEADER.unpack_from(payload)
+            start = BATCH_HEADER.size + tag_length
+            tag = payload[BATCH_HEADER.size : start].decode("utf-8")
+            return "batch", tag, np.frombuffer(payload, dtype="<f8", offset=start).reshape(rows, columns)
+        if kind == GAP:
+            return "gap", None, GAP_PAYLOAD.unpack(payload)[0]
+        raise ValueError("Unknown frame type {}".format(kind))
+
+    def __iter__(self):
+        try:
+            while True:
+                yield self.read()
+        except EOFError:
+            return
+
+
+if __name__ == "__main__":
+    # e.g. `python fanout_client.py unix:/tmp/uart_serial_plotter.sock`,
+    # prints the headers and the received samples/s of a running plotter
+    client = FanoutClient(sys.argv[1] if len(sys.argv) > 1 else None)
+    rows = 0
+    started = time.perf_counter()
+    for kind, tag, value in client:
+        if kind == "header":
+            print("header '{}': {}".format(tag, ", ".join(value)))
+        elif kind == "gap":
+            print("dropped {} batches".format(value))
+        else:
+            rows += len(value)
+        if time.perf_counter() - started >= 1.0:
+            print("{:,.0f} samples/s".format(rows / (time.perf_counter() - started)))
+            rows = 0
+            started = time.perf_counter()
@@ -0,0 +1,379 @@
+import collections
+import errno
+import json
+import os
+import selectors
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+# every message is a frame: type (uint8) and payload length (uint32), then
+# the payload, all little-endian
+FRAME = struct.Struct("<BI")
+# payload: JSON {"tag": ..., "columns": [...]}, sent whenever the columns of
+# a tag change, and to every new subscriber for each tag seen so far
+HEADER = 1
+# payload: tag length (uint16), rows, columns (uint32), the tag (utf-8),
+# then rows x columns float64 in row-major order
+BATCH = 2
+BATCH_HEADER = struct.Struct("<HII")
+# payload: number of batches dropped (uint32) since the last frame, because
+# the subscriber did not keep up
+GAP = 3
+GAP_PAYLOAD = struct.Struct("<I")
+
+
+def default_address():
+    """A Unix domain socket in the temp directory, or a localhost TCP port"""
+    if hasattr(socket, "AF_UNIX"):
+        return "unix:" + os.path.join(tempfile.gettempdir(), "uart_serial_plotter.sock")
+    return "tcp:127.0.0.1:47100"
+
+
+def connect(address):
+    """Returns a socket connected to a fan-out server at `address`"""
+    if address.startswith("unix:"):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(address[len("unix:") :])
+        return connection
+    host, _, port = address[len("tcp:") :].rpartition(":")
+    return socket.create_connection((host, int(port)))
+
+
+def encode_header(tag, columns):
+    payload = json.dumps({"tag": tag, "columns": list(columns)}).encode("utf-8")
+    return FRAME.pack(HEADER, len(payload)) + payload
+
+
+def encode_batch(tag, batch):
+    tag = tag.encode("utf-8")
+    batch = np.ascontiguousarray(batch, dtype="<f8")
+    rows, columns = batch.shape
+    header = BATCH_HEADER.pack(len(tag), rows, columns)
+    return FRAME.pack(BATCH, len(header) + len(tag) + batch.nbytes) + header + tag + batch.tobytes()
+
+
+class Subscriber(object):
+    """
+    A connected client and the frames waiting to be sent to it, at most
+    `budget` bytes: once over budget, the oldest batches are dropped (headers
+    are kept) and the client is sent a GAP frame with the count instead.
+    """
+
+    def __init__(self, connection, budget):
+        self.connection = connection
+        self.budget = budget
+        self.frames = collections.deque()
+        self.size = 0
+        self.dropped = 0
+        self.total_dropped = 0
+        self.sending = memoryview(b"")
+
+    def push(self, frame, droppable=True):
+        self.frames.append((frame, droppable))
+        self.size += len(frame)
+        if self.size <= self.budget:
+            return
+        kept = []
+        while self.size > self.budget and len(self.frames) > 1:
+            old, old_droppable = self.frames.popleft()
+            if old_droppable:
+                self.size -= len(old)
+                self.dropped += 1
+                self.total_dropped += 1
+            else:
+                kept.append((old, old_droppable))
+        self.frames.extendleft(reversed(kept))
+
+    def next_frame(self):
+        """Returns the next bytes to send, or None if there are none"""
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            return FRAME.pack(GAP, GAP_PAYLOAD.size) + GAP_PAYLOAD.pack(dropped)
+        if not len(self.frames):
+            return None
+        frame, _ = self.frames.popleft()
+        self.size -= len(frame)
+        return frame
+
+
+class FanoutServer(object):
+    """
+    Publishes the parsed sample batches and header changes of the plotter to
+    any number of local subscribers (see `fanout_client.py`), over a Unix
+    domain socket (`unix:/path`) or a localhost TCP port (`tcp:host:port`).
+
+    `publish` only encodes the batch once and appends it to the bounded
+    buffer of every subscriber, the sockets are written by the server
+    thread, so a slow subscriber never stalls the caller.
+    """
+
+    def __init__(self, address=None, budget=16 << 20):
+        self.address = address or default_address()
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.subscribers = []
+        # tag -> (columns, encoded header frame)
+        self.headers = {}
+        self.selector = selectors.DefaultSelector()
+        self.wake_read, self.wake_write = socket.socketpair()
+        self.wake_read.setblocking(False)
+        self.wake_write.setblocking(False)
+        # (device, inode) of the Unix socket bound, only that one is removed
+        self.bound = None
+        self.listener = self.__listen__()
+        self.running = threading.Event()
+        self.thread = None
+
+    def __listen__(self):
+        if self.address.startswith("unix:"):
+            path = self.address[len("unix:") :]
+            if os.path.exists(path):
+                self.__remove_stale__(path)
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(path)
+            stat = os.stat(path)
+            self.bound = (stat.st_dev, stat.st_ino)
+        else:
+            host, _, port = self.address[len("tcp:") :].rpartition(":")
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((host, int(port)))
+        listener.listen(16)
+        listener.setblocking(False)
+        return listener
+
+    @staticmethod
+    def __remove_stale__(path):
+        """
+        Removes the socket at `path` if it is left over from a plotter which
+        did not exit cleanly
+
+        :raises OSError: if another plotter is listening on it
+        """
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError as e:
+            if e.errno not in (errno.ECONNREFUSED, errno.ENOENT):
+                raise
+        else:
+            raise OSError(errno.EADDRINUSE, "another plotter is publishing on '{}'".format(path))
+        finally:
+            probe.close()
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def __unlink__(self):
+        """Removes the Unix socket bound, unless another plotter replaced it since"""
+        path = self.address[len("unix:") :]
+        try:
+            stat = os.stat(path)
+            if (stat.st_dev, stat.st_ino) == self.bound:
+                os.remove(path)
+        except OSError:
+            pass
+
+    def start(self):
+        if self.thread is None:
+            self.running.set()
+            self.thread = threading.Thread(target=self.__run__, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running.clear()
+        self.__wake__()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    @property
+    def subscriber_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+    def publish(self, tag, columns, batch):
+        """
+        :param in string tag: schema of the batch, "" for untagged samples
+        :param in list columns: names of the columns of the batch, a header
+            frame is sent first whenever they change
+        :param in numpy.ndarray batch: rows of samples, may be empty to only
+            announce the columns
+        """
+        frames = []
+        known = self.headers.get(tag)
+        if known is None or known[0] != list(columns):
+            header = encode_header(tag, columns)
+            frames.append((header, False))
+        if len(batch):
+            frames.append((encode_batch(tag, batch), True))
+        if not len(frames):
+            return
+        with self.lock:
+            if not frames[0][1]:
+                self.headers[tag] = (list(columns), frames[0][0])
+            for subscriber in self.subscribers:
+                for frame, droppable in frames:
+                    subscriber.push(frame, droppable)
+        self.__wake__()
+
+    def __wake__(self):
+        try:
+            self.wake_write.send(b"\0")
+        except (BlockingIOError, OSError):
+            # already woken up / shutting down
+            pass
+
+    def __accept__(self):
+        try:
+            connection, _ = self.listener.accept()
+        except BlockingIOError:
+            return
+        connection.setblocking(False)
+        subscriber = Subscriber(connection, self.budget)
+        with self.lock:
+            for _, header in self.headers.values():
+                subscriber.push(header, False)
+            self.subscribers.append(subscriber)
+        self.selector.register(connection, selectors.EVENT_READ, subscriber)
+
+    def __remove__(self, subscriber):
+        with self.lock:
+            self.subscribers.remove(subscriber)
+        self.selector.unregister(subscriber.connection)
+        subscriber.connection.close()
+
+    def __send__(self, subscriber):
+        """Sends as much as the socket takes, returns False once it is closed"""
+        while True:
+            if not len(subscriber.sending):
+                with self.lock:
+                    frame = subscriber.next_frame()
+                if frame is None:
+                    return True
+                subscriber.sending = memoryview(frame)
+            try:
+                sent = subscriber.connection.send(subscriber.sending)
+            except BlockingIOError:
+                return True
+            except OSError:
+                return False
+            subscriber.sending = subscriber.sending[sent:]
+
+    def __run__(self):
+        self.selector.register(self.listener, selectors.EVENT_READ, "listener")
+        self.selector.register(self.wake_read, selectors.EVENT_READ, "wake")
+        try:
+            while self.running.is_set():
+                for key, events in self.selector.select(timeout=1.0):
+                    if key.data == "listener":
+                        self.__accept__()
+                    elif key.data == "wake":
+                        try:
+                            self.wake_read.recv(4096)
+                        except BlockingIOError:
+                            pass
+                    elif events & selectors.EVENT_READ:
+                        # subscribers do not send anything, this is a close
+                        try:
+                            data = key.fileobj.recv(4096)
+                        except OSError:
+                            data = b""
+                        if not data:
+                            self.__remove__(key.data)
+                # write to every subscriber with something to send, and only
+                # wait for writability of the ones the socket did not take all
+                for subscriber in list(self.subscribers):
+                    if not self.__send__(subscriber):
+                        self.__remove__(subscriber)
+                        continue
+                    waiting = len(subscriber.sending) or len(subscriber.frames) or subscriber.dropped
+                    events = selectors.EVENT_READ | (selectors.EVENT_WRITE if waiting else 0)
+                    self.selector.modify(subscriber.connection, events, subscriber)
+        except Exception as e:
+            print("Fan-out server thread exception: " + str(e))
+        for subscriber in list(self.subscribers):
+            self.__remove__(subscriber)
+        self.selector.close()
+        self.listener.close()
+        self.wake_read.close()
+        self.wake_write.close()
+        if self.bound is not None:
+            self.__unlink__()
+        print("Fan-out server thread exiting")
+
+
+if __name__ == "__main__":
+    # throughput test, e.g. `python fanout_server.py 4 2000 2000000`:
+    # publishes 2000 batches of 1000 x 8 samples at 2M samples/s to 4
+    # subscribers (the first one slow) and reports what each received, and
+    # how long publishing took the publisher
+    from fanout_client import FanoutClient
+
+    subscriber_count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    batch_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 2e6
+    batch = np.random.default_rng(0).standard_normal((1000, 8))
+    columns = ["t"] + ["c{}".format(i) for i in range(7)]
+
+    server = FanoutServer(budget=8 << 20)
+    server.start()
+    results = {}
+
+    def subscribe(index):
+        client = FanoutClient(server.address)
+        rows = batches = gaps = 0
+        started = None
+        for kind, tag, value in client:
+            if started is None:
+                started = time.perf_counter()
+            if kind == "batch":
+                rows += len(value)
+                batches += 1
+                if index == 0:
+                    # a slow consumer
+                    time.sleep(0.005)
+            elif kind == "gap":
+                gaps += value
+            if batches + gaps >= batch_count:
+                break
+        client.close()
+        results[index] = (rows, batches, gaps, time.perf_counter() - started)
+
+    threads = [threading.Thread(target=subscribe, args=(i,)) for i in range(subscriber_count)]
+    for thread in threads:
+        thread.start()
+    while server.subscriber_count < subscriber_count:
+        time.sleep(0.01)
+
+    period = len(batch) / rate
+    publishing = 0.0
+    started = time.perf_counter()
+    for index in range(batch_count):
+        before = time.perf_counter()
+        server.publish("", columns, batch)
+        publishing += time.perf_counter() - before
+        # pace the batches like a device streaming at `rate`
+        time.sleep(max(0.0, started + (index + 1) * period - time.perf_counter()))
+    for thread in threads:
+        thread.join()
+    server.stop()
+
+    print(
+        "published {:,} samples at {:,.0f} samples/s, {:.1f} us per publish call".format(
+            batch_count * len(batch), rate, publishing / batch_count * 1e6
+        )
+    )
+    for index, (rows, batches, gaps, elapsed) in sorted(results.items()):
+        print(
+            "subscriber {}{}: {} batches, {} dropped, {:,.0f} samples/s".format(
+                index, " (slow)" if index == 0 else "", batches, gaps, rows / elapsed
+            )
+        )
@@ -0,0 +1,231 @@
+import math
+
+import numpy as np
+
+from spectrum import sample_rate
+
+
+class Filter(object):
+    """
+    Base class for streaming filters: `process` is called with consecutive
+    batches of samples and carries whatever state it needs from one batch to
+    the next, so filtering a stream batch by batch gives the same result as
+    filtering all of it at once.
+    """
+
+    def process(self, x, y):
+        """
+        :param in numpy.ndarray x: time values of the batch
+        :param in numpy.ndarray y: values of the batch
+        :returns: (x, y) of the filtered batch
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+
+class LinearFilter(Filter):
+    """
+    Linear filter with transfer function B(z) / A(z), i.e. what
+    `scipy.signal.lfilter(b, a, y)` computes.
+
+    B(z) is applied as a convolution and 1 / A(z) as a cascade of first order
+    recursions y[k] = p * y[k-1] + v[k], one per pole p. Each recursion is
+    evaluated in blocks with a cumulative sum, as
+    y[k] = p^k * (p * y[-1] + sum(v[j] * p^-j)), where the block length is
+    limited so that p^-j cannot overflow.
+    """
+
+    def __init__(self, b, a=(1.0,)):
+        a = np.asarray(a, dtype=float)
+        self.b = np.asarray(b, dtype=float) / a[0]
+        self.poles = np.roots(a / a[0]) if len(a) > 1 else np.array([])
+        self.reset()
+
+    def reset(self):
+        self.inputs = None
+        self.outputs = None
+
+    def __prime__(self, value):
+        """Starts from the steady state of a constant input of `value`"""
+        self.inputs = np.full(len(self.b) - 1, value)
+        level = self.b.sum() * value
+        self.outputs = []
+        for p in self.poles:
+            level = level / (1 - p) if abs(1 - p) > 1e-12 else 0.0
+            self.outputs.append(complex(level))
+
+    @staticmethod
+    def __recursion__(v, p, previous):
+        n = len(v)
+        y = np.empty(n, dtype=complex)
+        magnitude = abs(p)
+        if magnitude < 1e-12:
+            return v.astype(complex), complex(v[-1])
+        block = n if magnitude >= 1 else max(1, min(n, int(200 / -math.log10(magnitude))))
+        for start in range(0, n, block):
+            chunk = v[start : start + block]
+            k = np.arange(len(chunk))
+            powers = p ** k
+            y[start : start + len(chunk)] = powers * (p * previous + np.cumsum(chunk / powers))
+            previous = y[start + len(chunk) - 1]
+        return y, previous
+
+    def process(self, x, y):
+        y = np.asarray(y, dtype=float)
+        if not len(y):
+            return x, y
+        if self.inputs is None:
+            self.__prime__(y[0])
+        history = np.concatenate((self.inputs, y))
+        v = np.convolve(history, self.b, mode="valid")
+        if len(self.b) > 1:
+            self.inputs = history[-(len(self.b) - 1) :]
+        v = v.astype(complex)
+        for i, p in enumerate(self.poles):
+            v, self.outputs[i] = LinearFilter.__recursion__(v, p, self.outputs[i])
+        return x, v.real
+
+
+class MovingAverage(LinearFilter):
+    def __init__(self, length):
+        self.length = max(1, int(length))
+        super().__init__(np.ones(self.length) / self.length)
+
+    def __str__(self):
+        return "Moving Average ({})".format(self.length)
+
+
+class ExponentialMovingAverage(LinearFilter):
+    def __init__(self, alpha):
+        self.alpha = alpha
+        super().__init__([alpha], [1.0, alpha - 1.0])
+
+    def __str__(self):
+        return "EMA ({})".format(self.alpha)
+
+
+class Biquad(LinearFilter):
+    """
+    Second order low-pass, high-pass or band-pass filter (RBJ audio EQ
+    cookbook). The cutoff is in 1 / x-axis units, the coefficients are
+    computed once the sample rate is known from the first samples received.
+    """
+
+    KINDS = ["low-pass", "high-pass", "band-pass"]
+
+    def __init__(self, kind, cutoff, q=1.0 / math.sqrt(2)):
+        if kind not in Biquad.KINDS:
+            raise ValueError("Unknown biquad type '{}'".format(kind))
+        self.kind = kind
+        self.cutoff = cutoff
+        self.q = q
+        self.fs = None
+        super().__init__([1.0])
+
+    def __design__(self, fs):
+        w0 = 2 * math.pi * min(self.cutoff / fs, 0.499)
+        alpha = math.sin(w0) / (2 * self.q)
+        cos_w0 = math.cos(w0)
+        if self.kind == "low-pass":
+            b = [(1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2]
+        elif self.kind == "high-pass":
+            b = [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2]
+        else:
+            b = [alpha, 0.0, -alpha]
+        a = [1 + alpha, -2 * cos_w0, 1 - alpha]
+        LinearFilter.__init__(self, b, a)
+        self.fs = fs
+
+    def reset(self):
+        super().reset()
+        self.last_x = None
+
+    def process(self, x, y):
+        if self.fs is None:
+            times = x if self.last_x is None else np.concatenate(([self.last_x], x))
+            fs = sample_rate(times)
+            if fs <= 0:
+                if len(x):
+                    self.last_x = x[-1]
+                return x, y
+            self.__design__(fs)
+        return super().process(x, y)
+
+    def __str__(self):
+        return "{} ({}, Q={:.3g})".format(self.kind.capitalize(), self.cutoff, self.q)
+
+
+class Median(Filter):
+    def __init__(self, length):
+        self.length = max(1, int(length))
+        self.reset()
+
+    def reset(self):
+        self.history = None
+
+    def process(self, x, y):
+        y = np.asarray(y, dtype=float)
+        if not len(y):
+            return x, y
+        if self.history is None:
+            self.history = np.full(self.length - 1, y[0])
+        values = np.concatenate((self.history, y))
+        windows = np.lib.stride_tricks.sliding_window_view(values, self.length)
+        self.history = values[len(values) - (self.length - 1) :]
+        return x, np.median(windows, axis=1)
+
+    def __str__(self):
+        return "Median ({})".format(self.length)
+
+
+class Decimate(Filter):
+    """Averages every `factor` samples into one, carrying partial blocks"""
+
+    def __init__(self, factor):
+        self.factor = max(1, int(factor))
+        self.reset()
+
+    def reset(self):
+        self.pending_x = np.empty(0)
+        self.pending_y = np.empty(0)
+
+    def process(self, x, y):
+        x = np.concatenate((self.pending_x, np.asarray(x, dtype=float)))
+        y = np.concatenate((self.pending_y, np.asarray(y, dtype=float)))
+        used = len(y) - len(y) % self.factor
+        self.pending_x = x[used:]
+        self.pending_y = y[used:]
+        return (
+            x[:used].reshape(-1, self.factor).mean(axis=1),
+            y[:used].reshape(-1, self.factor).mean(axis=1),
+        )
+
+    def __str__(self):
+        return "Decimate ({})".format(self.factor)
+
+
+class FilterChain(object):
+    """Filters applied one after the other to the samples of a trace"""
+
+    def __init__(self):
+        self.filters = []
+
+    def __len__(self):
+        return len(self.filters)
+
+    def append(self, filter):
+        self.filters.append(filter)
+
+    def reset(self):
+        for filter in self.filters:
+            filter.reset()
+
+    def process(self, x, y):
+        for filter in self.filters:
+            x, y = filter.process(x, y)
+        return x, y
+
+    def __str__(self):
+        return " -> ".join(str(filter) for filter in self.filters)
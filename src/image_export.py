@@ -0,0 +1,187 @@
+import math
+
+import numpy as np
+import pyqtgraph as pg
+from PyQt5 import QtCore, QtGui
+
+BACKGROUND = QtGui.QColor(27, 27, 28)
+FOREGROUND = QtGui.QColor(255, 255, 255)
+GRID = QtGui.QColor(255, 255, 255, 100)
+
+
+def m4_indices(px, y, left, width, runs=None):
+    """
+    Returns the (sorted) indices of the points to draw of a polyline with
+    sorted pixel x coordinates `px`, shown on the `width` pixel columns from
+    `left` on: the first, last, minimum and maximum point of every column
+    (M4 aggregation). Drawing only these draws the same pixels as drawing
+    every point, with at most 4 points per column.
+
+    :param in runs: optional (non decreasing) run number of every point, for
+        a line broken into runs: the points of a column are aggregated per run
+    """
+    if len(px) <= 4 * width:
+        return np.arange(len(px))
+    column = np.floor(px).astype(np.int64)
+    np.clip(column, int(left) - 1, int(left) + width + 1, out=column)
+    changed = np.diff(column) != 0
+    if runs is not None:
+        changed |= np.diff(runs) != 0
+    starts = np.concatenate(([0], np.flatnonzero(changed) + 1))
+    ends = np.concatenate((starts[1:], [len(px)])) - 1
+    # sorted by column, then by value: the first and last of each column
+    # in that order are its minimum and maximum
+    order = np.lexsort((y, column) if runs is None else (y, column, runs))
+    return np.unique(np.concatenate((starts, ends, order[starts], order[ends])))
+
+
+def nice_ticks(low, high, count=8):
+    """Returns round tick values between `low` and `high`, about `count` of them"""
+    span = high - low
+    if not np.isfinite(span) or span <= 0:
+        return []
+    raw = span / count
+    magnitude = 10.0 ** math.floor(math.log10(raw))
+    step = next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= raw)
+    first = math.ceil(low / step) * step
+    return [first + i * step for i in range(int((high - first) / step) + 1)]
+
+
+class ImageSnapshot(object):
+    """
+    The visible traces of a :class:`plot.Plot` and its view range, taken on
+    the GUI thread: the traces' columns (including any history spilled to
+    disk) are only referenced, limited to the points which existed at the
+    time (plus one on either side of the view, so lines leaving it are
+    drawn), and converted by the export thread.
+    """
+
+    def __init__(self, plot, font):
+        (self.x_min, self.x_max), (self.y_min, self.y_max) = plot.plot_item.viewRange()
+        self.x_label = plot.trace_names[0] if len(plot.trace_names) else ""
+        self.font = QtGui.QFont(font)
+        self.traces = []
+        for name in plot.channel_names():
+            trace = plot.traces.get(name)
+            if trace is None or not trace.isVisible() or name not in plot.data:
+                continue
+            x, y = plot.column(name, 0), plot.column(name, 1)
+            length = min(len(x), len(y))
+            start = max(0, x.search(self.x_min, "left") - 1)
+            end = min(length, x.search(self.x_max, "right") + 1)
+            color = pg.mkPen(trace.opts["pen"]).color()
+            self.traces.append((name, QtGui.QColor(color), x, y, start, end))
+
+
+def render(snapshot, device, width, height, job):
+    """Draws a snapshot onto a paint device (a QImage or QSvgGenerator)"""
+    # lines are not antialiased (like the plot on screen), which is what
+    # makes the M4 points draw exactly the pixels all of the points would
+    painter = QtGui.QPainter(device)
+    try:
+        draw(painter, snapshot, width, height, job)
+    finally:
+        painter.end()
+
+
+def draw(painter, snapshot, width, height, job):
+    painter.setFont(snapshot.font)
+    metrics = QtGui.QFontMetrics(snapshot.font)
+    painter.fillRect(0, 0, width, height, BACKGROUND)
+
+    x_ticks = nice_ticks(snapshot.x_min, snapshot.x_max)
+    y_ticks = nice_ticks(snapshot.y_min, snapshot.y_max)
+    y_labels = ["{:g}".format(value) for value in y_ticks]
+    left = max([metrics.horizontalAdvance(label) for label in y_labels] + [0]) + metrics.height()
+    bottom = 2 * metrics.height() + metrics.height() // 2
+    area = QtCore.QRectF(left, metrics.height() // 2, width - left - metrics.height(), height - bottom)
+
+    def to_x(values):
+        return area.left() + (values - snapshot.x_min) / (snapshot.x_max - snapshot.x_min) * area.width()
+
+    def to_y(values):
+        return area.bottom() - (values - snapshot.y_min) / (snapshot.y_max - snapshot.y_min) * area.height()
+
+    # grid, tick labels and the x axis label
+    painter.setPen(QtGui.QPen(GRID, 0))
+    for value in x_ticks:
+        painter.drawLine(QtCore.QLineF(to_x(value), area.top(), to_x(value), area.bottom()))
+    for value in y_ticks:
+        painter.drawLine(QtCore.QLineF(area.left(), to_y(value), area.right(), to_y(value)))
+    painter.setPen(FOREGROUND)
+    painter.drawRect(area)
+    for value in x_ticks:
+        label = "{:g}".format(value)
+        painter.drawText(
+            QtCore.QPointF(to_x(value) - metrics.horizontalAdvance(label) / 2, area.bottom() + metrics.height()), label
+        )
+    for value, label in zip(y_ticks, y_labels):
+        painter.drawText(
+            QtCore.QPointF(area.left() - metrics.horizontalAdvance(label) - 4, to_y(value) + metrics.ascent() / 2),
+            label,
+        )
+    painter.drawText(
+        QtCore.QPointF(area.center().x() - metrics.horizontalAdvance(snapshot.x_label) / 2, height - 4),
+        snapshot.x_label,
+    )
+
+    # the traces, from the M4 points of every pixel column
+    painter.setClipRect(area)
+    pixel_columns = max(1, int(math.ceil(area.width())))
+    for index, (name, color, x, y, start, end) in enumerate(snapshot.traces):
+        xs = x.read(start, end)
+        ys = y.read(start, end)
+        # like the plot on screen, the line is broken at non-finite points:
+        # number the runs of finite points between them
+        finite = np.isfinite(xs) & np.isfinite(ys)
+        runs = np.cumsum(~finite)[finite]
+        xs, ys = xs[finite], ys[finite]
+        # vertices are snapped to pixel centers, so every line within a
+        # pixel column is vertical and is covered by the column's extremes
+        px = np.floor(to_x(xs)) + 0.5
+        keep = m4_indices(px, ys, area.left(), pixel_columns, runs)
+        px, py, runs = px[keep], np.floor(to_y(ys[keep])) + 0.5, runs[keep]
+        # and of those, only the ones which are not on top of the previous one
+        distinct = np.ones(len(px), dtype=bool)
+        distinct[1:] = (np.diff(px) != 0) | (np.diff(py) != 0) | (np.diff(runs) != 0)
+        px, py, runs = px[distinct].tolist(), py[distinct].tolist(), runs[distinct]
+        painter.setPen(QtGui.QPen(color, 1))
+        breaks = (np.flatnonzero(np.diff(runs)) + 1).tolist()
+        for first, last in zip([0] + breaks, breaks + [len(px)]):
+            painter.drawPolyline(QtGui.QPolygonF([QtCore.QPointF(a, b) for a, b in zip(px[first:last], py[first:last])]))
+        job.progress(index + 1)
+
+    # legend
+    painter.setClipping(False)
+    for index, (name, color, _, _, _, _) in enumerate(snapshot.traces):
+        y = area.top() + (index + 1) * metrics.height()
+        painter.setPen(QtGui.QPen(color, 2))
+        painter.drawLine(QtCore.QLineF(area.left() + 8, y - metrics.ascent() / 3, area.left() + 28, y - metrics.ascent() / 3))
+        painter.setPen(FOREGROUND)
+        painter.drawText(QtCore.QPointF(area.left() + 34, y), name)
+
+
+def write_png(snapshot, width, height, file, job):
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_ARGB32)
+    render(snapshot, image, width, height, job)
+    data = QtCore.QByteArray()
+    buffer = QtCore.QBuffer(data)
+    buffer.open(QtCore.QIODevice.WriteOnly)
+    image.save(buffer, "PNG")
+    buffer.close()
+    file.write(bytes(data))
+
+
+def write_svg(snapshot, width, height, file, job):
+    from PyQt5 import QtSvg
+
+    data = QtCore.QByteArray()
+    buffer = QtCore.QBuffer(data)
+    buffer.open(QtCore.QIODevice.WriteOnly)
+    generator = QtSvg.QSvgGenerator()
+    generator.setOutputDevice(buffer)
+    generator.setSize(QtCore.QSize(width, height))
+    generator.setViewBox(QtCore.QRect(0, 0, width, height))
+    render(snapshot, generator, width, height, job)
+    buffer.close()
+    file.write(bytes(data))
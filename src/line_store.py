@@ -0,0 +1,235 @@
+import re
+import tempfile
+import threading
+
+import numpy as np
+
+from buffers import GrowableArray
+
+
+class Chunk(object):
+    """
+    A sealed, immutable block of whole lines. Its trigram set (of the
+    lowercased text) lets a substring search skip chunks which cannot
+    contain the pattern. Once spilled to disk, only the location of the
+    bytes in the spill file is kept in memory.
+    """
+
+    def __init__(self, start, data):
+        self.start = start
+        self.length = len(data)
+        self.data = bytes(data)
+        self.trigrams = Chunk.trigrams(self.data.lower())
+        self.file_offset = None
+
+    @staticmethod
+    def trigrams(data):
+        values = np.frombuffer(data, dtype=np.uint8).astype(np.int32)
+        if len(values) < 3:
+            return np.empty(0, dtype=np.int32)
+        return np.unique((values[:-2] << 16) | (values[1:-1] << 8) | values[2:])
+
+    def may_contain(self, trigrams):
+        return np.isin(trigrams, self.trigrams, assume_unique=True).all()
+
+
+class LineStore(object):
+    """
+    Append-only store of received text lines: the text of all lines lives in
+    one byte buffer (split into chunks, which are spilled to a temporary file
+    past `memory_limit` bytes), with an array of line start offsets and an
+    array of per-line host timestamps.
+
+    Lines are addressed by their index, searching returns line indices.
+    Text may be read (e.g. exported) from another thread while lines are
+    appended: sealing a chunk and using the spill file happen under a lock.
+    """
+
+    def __init__(self, chunk_size=1 << 20, memory_limit=64 << 20):
+        self.chunk_size = chunk_size
+        self.memory_limit = memory_limit
+        self.spill_file = None
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.chunks = []
+        self.chunk_starts = []
+        self.active = bytearray()
+        self.active_start = 0
+        self.in_memory = 0
+        self.offsets = GrowableArray(dtype=np.int64)
+        self.timestamps = GrowableArray()
+        self.positions = GrowableArray()
+        with self.lock:
+            if self.spill_file is not None:
+                self.spill_file.close()
+                self.spill_file = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def size(self):
+        """Total number of bytes stored"""
+        return self.active_start + len(self.active)
+
+    def append_text(self, text, timestamp, position=np.nan):
+        """
+        :param in string text: one or more lines, separated by newlines
+        :param in float timestamp: host time the text was received at
+        :param in float position: plot x value the text belongs to (e.g. the
+            time of the last sample received before it), NaN if none
+        """
+        data = text.encode("utf-8", "backslashreplace")
+        if not data.endswith(b"\n"):
+            data += b"\n"
+        if len(self.active) + len(data) > self.chunk_size and len(self.active):
+            self.__seal__()
+        if data.count(b"\n") == 1:
+            # fast path for the common case of a single received line
+            self.offsets.append_value(self.size)
+            self.timestamps.append_value(timestamp)
+            self.positions.append_value(position)
+            self.active += data
+            return
+        ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10) + 1
+        starts = np.concatenate(([0], ends[:-1]))
+        self.offsets.append(self.size + starts)
+        self.timestamps.append(np.full(len(starts), timestamp))
+        self.positions.append(np.full(len(starts), position))
+        self.active += data
+
+    def __seal__(self):
+        chunk = Chunk(self.active_start, self.active)
+        with self.lock:
+            self.chunks.append(chunk)
+            self.chunk_starts.append(chunk.start)
+            self.active_start += len(self.active)
+            self.active = bytearray()
+        self.in_memory += chunk.length
+        # spill the oldest chunks still in memory
+        for chunk in self.chunks:
+            if self.in_memory <= self.memory_limit:
+                break
+            if chunk.data is None:
+                continue
+            with self.lock:
+                if self.spill_file is None:
+                    self.spill_file = tempfile.TemporaryFile(prefix="uart_serial_plotter_")
+                self.spill_file.seek(0, 2)
+                chunk.file_offset = self.spill_file.tell()
+                self.spill_file.write(chunk.data)
+                chunk.data = None
+            self.in_memory -= chunk.length
+
+    def __chunk_data__(self, chunk):
+        data = chunk.data
+        if data is not None:
+            return data
+        with self.lock:
+            self.spill_file.seek(chunk.file_offset)
+            return self.spill_file.read(chunk.length)
+
+    def __blocks__(self):
+        """Yields (absolute start offset, bytes, chunk or None) of all the text"""
+        for chunk in self.chunks:
+            yield chunk.start, self.__chunk_data__(chunk), chunk
+        yield self.active_start, bytes(self.active), None
+
+    def __read__(self, start, end):
+        """Returns the bytes between two absolute offsets"""
+        result = bytearray()
+        with self.lock:
+            index = max(0, int(np.searchsorted(self.chunk_starts, start, side="right")) - 1)
+            chunks = self.chunks[index:]
+            active_start = self.active_start
+            active = self.active[max(0, start - active_start) : end - active_start] if end > active_start else b""
+        for chunk in chunks:
+            if chunk.start >= end:
+                break
+            data = self.__chunk_data__(chunk)
+            result += data[max(0, start - chunk.start) : end - chunk.start]
+        result += active
+        return bytes(result)
+
+    def line_of(self, offset):
+        """Returns the index of the line containing the absolute byte offset"""
+        return int(np.searchsorted(self.offsets.view(), offset, side="right")) - 1
+
+    def lines(self, start, end):
+        """Returns the text of lines [start, end) as a list of strings"""
+        start = max(0, start)
+        end = min(len(self), end)
+        if end <= start:
+            return []
+        offsets = self.offsets.view()
+        first = offsets[start]
+        last = offsets[end] if end < len(self) else self.size
+        text = self.__read__(first, last).decode("utf-8", "backslashreplace")
+        return text.split("\n")[: end - start]
+
+    def line(self, index):
+        return self.lines(index, index + 1)[0]
+
+    def index_of_time(self, timestamp):
+        """Returns the index of the first line received at or after `timestamp`"""
+        return min(len(self) - 1, int(np.searchsorted(self.timestamps.view(), timestamp)))
+
+    def search(self, pattern, regex=False, ignore_case=True, limit=1000):
+        """
+        Finds the lines matching `pattern`.
+
+        :param in string pattern: substring (or regular expression) to find
+        :param in bool regex: treat `pattern` as a regular expression
+        :param in bool ignore_case: case insensitive search
+        :param in int limit: maximum number of lines to return
+        :returns: sorted list of matching line indices
+        :raises re.error: if the regular expression is invalid
+        """
+        needle = pattern.encode("utf-8")
+        flags = re.IGNORECASE if ignore_case else 0
+        if regex:
+            expression = re.compile(needle, flags | re.MULTILINE)
+            trigrams = None
+        else:
+            expression = re.compile(re.escape(needle), flags) if ignore_case else None
+            trigrams = Chunk.trigrams(needle.lower()) if len(needle) >= 3 else None
+
+        results = []
+        for start, data, chunk in self.__blocks__():
+            if chunk is not None and trigrams is not None and not chunk.may_contain(trigrams):
+                continue
+            position = 0
+            while len(results) < limit:
+                if expression is None:
+                    found = data.find(needle, position)
+                else:
+                    match = expression.search(data, position)
+                    found = match.start() if match else -1
+                if found < 0:
+                    break
+                line = self.line_of(start + found)
+                results.append(line)
+                # continue after the end of this line, so each line is only
+                # reported once
+                end = data.find(b"\n", found)
+                position = len(data) if end < 0 else end + 1
+            if len(results) >= limit:
+                break
+        return results
+
+    def write_to(self, file, end=None, progress=None):
+        """
+        Writes the stored text to a binary file object, chunk by chunk.
+
+        :param in int end: number of bytes to write, e.g. the `size` when an
+            export was started, all of them if None
+        :param in callable progress: called with the number of bytes written
+            after each chunk
+        """
+        end = self.size if end is None else end
+        for start in range(0, end, self.chunk_size):
+            file.write(self.__read__(start, min(end, start + self.chunk_size)))
+            if progress:
+                progress(min(end, start + self.chunk_size))
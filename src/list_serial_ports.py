@@ -1,36 +1,79 @@
+import re
 import sys
-import serial
+import threading
 
 port_descriptors = ["USB Serial Port", "TTL232R-3V3", "USB UART", "USB to UART", "usbserial", "RS232", "USB-UART", "USB Single Serial", "USB JTAG/serial debug unit", "FT231X USB UART"]
 
+# every descriptor in a single precompiled pattern, built on first use
+port_matcher = None
+
 def add_port_descriptor(desc):
-    global port_descriptors
+    global port_descriptors, port_matcher
     port_descriptors.append(desc)
+    port_matcher = None
+
+def matches_port_descriptor(description):
+    global port_descriptors, port_matcher
+    if port_matcher is None:
+        port_matcher = re.compile("|".join(re.escape(desc) for desc in port_descriptors))
+    return port_matcher.search(description) is not None
+
+def is_serial_port(device):
+    """Checks a single (e.g. newly connected) device against the port
+    descriptors, without enumerating every port on the system
+    """
+    if sys.platform.startswith("linux"):
+        from serial.tools.list_ports_linux import SysFS
+        return matches_port_descriptor(SysFS(device).description)
+    return device in list_serial_ports()
 
 def list_serial_ports():
-    global port_descriptors
     """Lists serial port names
     :raises EnvironmentError:
         On unsupported or unknown platforms
     :returns:
         A list of the serial ports available on the system
     """
-    ports = list(serial.tools.list_ports.comports())
-    result = []
-    # print("Found {} ports:".format(len(ports)))
-    for p in ports:
-        is_correct_type_of_port = False
-        for desc in port_descriptors:
-            # print("\t{}".format(p.description))
-            if desc in p.description:
-                is_correct_type_of_port = True
-        if is_correct_type_of_port:
+    # imported here rather than at startup, this runs on the enumeration thread
+    import serial.tools.list_ports
+
+    return [p.device for p in serial.tools.list_ports.comports() if matches_port_descriptor(p.description)]
+
+
+class PortEnumerator(object):
+    """
+    Enumerates the serial ports in a background thread and caches the result,
+    so that neither startup nor "Refresh Ports" wait on the enumeration.
+    Requests made while an enumeration is running are coalesced into one more
+    enumeration once it finishes.
+    """
+
+    def __init__(self, on_ports_listed_callback):
+        self.on_ports_listed_callback = on_ports_listed_callback
+        self.ports = None
+        self.lock = threading.Lock()
+        self.running = False
+        self.pending = False
+
+    def refresh(self):
+        with self.lock:
+            if self.running:
+                self.pending = True
+                return
+            self.running = True
+        threading.Thread(target=self.__run__, daemon=True).start()
+
+    def __run__(self):
+        while True:
             try:
-                # s = serial.Serial(p.device)
-                # s.close()
-                result.append(p.device)
-            except (OSError, serial.SerialException) as inst:
-                print(inst)
-                pass
-
-    return result
+                ports = list_serial_ports()
+            except Exception as e:
+                print("Could not list serial ports: " + str(e))
+                ports = self.ports or []
+            self.ports = ports
+            self.on_ports_listed_callback(list(ports))
+            with self.lock:
+                if not self.pending:
+                    self.running = False
+                    return
+                self.pending = False
@@ -0,0 +1,207 @@
+import os
+import re
+
+import numpy as np
+import pyqtgraph as pg
+
+from buffers import GrowableArray
+
+# file of `category: regex` lines replacing the default patterns, if set
+PATTERNS_VARIABLE = "UART_SERIAL_PLOTTER_EVENT_PATTERNS"
+
+# the first matching pattern gives the category of a line, so the most
+# severe ones come first (ESP-IDF log levels, panics and ROM boot messages)
+DEFAULT_PATTERNS = """\
+panic: Guru Meditation|abort\\(\\) was called|panic'ed|Backtrace:
+reset: ^rst:0x|^ets [A-Z][a-z]{2} +\\d+ \\d{4}|^ESP-ROM:
+error: ^E \\(\\d+\\)
+warning: ^W \\(\\d+\\)
+info: ^I \\(\\d+\\)
+"""
+
+COLORS = [(255, 40, 40), (220, 60, 255), (255, 140, 0), (255, 230, 0), (150, 150, 150)]
+
+
+class EventPatterns(object):
+    """
+    Classifies the lines which are not samples (log messages, errors, ...)
+    into categories, from an ordered list of `category: regex` lines; lines
+    which match none of them are not events.
+
+    :raises ValueError: if a line has no category or an invalid regex
+    """
+
+    def __init__(self, text=DEFAULT_PATTERNS):
+        self.text = text
+        self.categories = []
+        alternatives = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            category, separator, pattern = line.partition(":")
+            category = category.strip()
+            if not separator or not category or not pattern.strip():
+                raise ValueError("Expected 'category: regex', got '{}'".format(line))
+            try:
+                re.compile(pattern.strip())
+            except re.error as e:
+                raise ValueError("Invalid pattern for '{}': {}".format(category, e))
+            alternatives.append("(?P<c{}>{})".format(len(alternatives), pattern.strip()))
+            self.categories.append(category)
+        # one regex for all categories, a line is only scanned once
+        self.regex = re.compile("|".join(alternatives)) if len(alternatives) else None
+
+    @staticmethod
+    def load():
+        """The patterns of the file named by `UART_SERIAL_PLOTTER_EVENT_PATTERNS`, or the default ones"""
+        path = os.environ.get(PATTERNS_VARIABLE)
+        if path:
+            try:
+                with open(path) as file:
+                    return EventPatterns(file.read())
+            except (OSError, ValueError) as e:
+                print("Could not load the event patterns from '{}': {}".format(path, e))
+        return EventPatterns()
+
+    def classify(self, line):
+        """Returns the category of a line, None if it is not an event"""
+        if self.regex is None:
+            return None
+        match = self.regex.search(line)
+        if match is None:
+            return None
+        return self.categories[int(match.lastgroup[1:])]
+
+    def priority(self, category):
+        """0 for the first (most severe) category"""
+        return self.categories.index(category) if category in self.categories else len(self.categories)
+
+    def color(self, category):
+        index = self.priority(category)
+        return COLORS[index] if index < len(COLORS) else pg.intColor(index).getRgb()[:3]
+
+
+class EventIndex(object):
+    """
+    The log events of a plot, sorted by x (the time of the last sample
+    received before them), so the events of an x range are found with two
+    binary searches. Each event also keeps the number of the segment (see
+    :meth:`plot.Plot.new_segment`) it was received in: after a restart, the
+    device time starts over and the x of the runs overlap.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.x = np.empty(0)
+        # id of the event at each position, its category (an index into
+        # `names`), segment and text by id
+        self.ids = np.empty(0, dtype=np.int64)
+        self.names = []
+        self.codes = GrowableArray(dtype=np.int64)
+        self.segments = GrowableArray(dtype=np.int64)
+        self.texts = []
+
+    def __len__(self):
+        return len(self.x)
+
+    def extend(self, events):
+        """
+        :param in list events: (x, category, text, segment) of new events,
+            in any order (e.g. after the device restarted, its time starts
+            over)
+        """
+        if not len(events):
+            return
+        x = np.array([event[0] for event in events], dtype=float)
+        ids = np.arange(len(self.texts), len(self.texts) + len(events))
+        for _, category, text, segment in events:
+            if category not in self.names:
+                self.names.append(category)
+            self.codes.append_value(self.names.index(category))
+            self.segments.append_value(segment)
+            self.texts.append(text)
+        order = np.argsort(x, kind="stable")
+        positions = np.searchsorted(self.x, x[order], side="right")
+        self.x = np.insert(self.x, positions, x[order])
+        self.ids = np.insert(self.ids, positions, ids[order])
+
+    def category(self, event):
+        return self.names[self.codes.view()[event]]
+
+    def segment(self, event):
+        return int(self.segments.view()[event])
+
+    def query(self, x_min, x_max, segments=None):
+        """
+        Returns (ids, x) of the events with x_min <= x <= x_max, of the
+        given segment numbers only if `segments` is not None
+        """
+        start = int(np.searchsorted(self.x, x_min, side="left"))
+        end = int(np.searchsorted(self.x, x_max, side="right"))
+        ids, x = self.ids[start:end], self.x[start:end]
+        if segments is not None:
+            kept = np.isin(self.segments.view()[ids], segments)
+            ids, x = ids[kept], x[kept]
+        return ids, x
+
+
+class EventMarkers(object):
+    """
+    Vertical markers of the log events of a :class:`plot.Plot` in its
+    visible x range. Only the visible events get a marker, from a pool of at
+    most `MAX_MARKERS` lines (the most severe events first, if there are
+    more), so panning costs the same however many events there are. Only
+    the events of the current segment and of the earlier segments drawn
+    under it are shown, the latter faded like their traces.
+    """
+
+    MAX_MARKERS = 100
+
+    def __init__(self, plot, index, patterns):
+        self.plot = plot
+        self.index = index
+        self.patterns = patterns
+        self.lines = []
+        self.visible = True
+        plot.plot_item.sigXRangeChanged.connect(self.refresh)
+
+    def set_visible(self, visible):
+        self.visible = visible
+        self.refresh()
+
+    def __line__(self, number):
+        while len(self.lines) <= number:
+            line = pg.InfiniteLine(angle=90, movable=False, label="", labelOpts={"position": 0.97, "color": "w"})
+            self.plot.add_overlay(line)
+            self.lines.append(line)
+        return self.lines[number]
+
+    def refresh(self, *args):
+        ids, xs = np.empty(0, dtype=np.int64), np.empty(0)
+        current = len(self.plot.segments) + 1
+        if self.visible and len(self.index):
+            (x_min, x_max), _ = self.plot.plot_item.viewRange()
+            segments = [current] + [segment.number for segment in self.plot.shown_segments()]
+            ids, xs = self.index.query(x_min, x_max, segments)
+        if len(ids) > EventMarkers.MAX_MARKERS:
+            table = np.array([self.patterns.priority(name) for name in self.index.names])
+            priorities = table[self.index.codes.view()[ids]]
+            chosen = np.sort(np.lexsort((np.arange(len(ids)), priorities))[: EventMarkers.MAX_MARKERS])
+            ids, xs = ids[chosen], xs[chosen]
+        for number, (event, x) in enumerate(zip(ids.tolist(), xs.tolist())):
+            category = self.index.category(event)
+            segment = self.index.segment(event)
+            label = category if segment == current else "{} (#{})".format(category, segment)
+            line = self.__line__(number)
+            line.setPos(x)
+            # the events of earlier segments are faded, like their traces
+            line.setPen(pg.mkPen(self.patterns.color(category) + ((255,) if segment == current else (90,)), width=1))
+            # the label is a format string
+            line.label.setFormat(label.replace("{", "{{").replace("}", "}}"))
+            line.setToolTip(self.index.texts[event])
+            line.show()
+        for line in self.lines[len(ids) :]:
+            line.hide()
@@ -1,17 +1,28 @@
 #!/usr/bin/python
-from main_window import MainWindow
-from PyQt5.QtWidgets import QApplication
-from PyQt5 import QtGui
+# only the standard library is imported here: the CSV import's worker
+# processes are spawned from this script too (as `__mp_main__`), and must not
+# import the GUI
+import multiprocessing
 import signal
-
-from list_serial_ports import add_port_descriptor
-
-signal.signal(signal.SIGINT, signal.SIG_DFL)
 import sys
 
-from resource_helpers import path
 
 def main():
+    # first, the startup timer measures from its import
+    from startup_timer import StartupTimer
+
+    from main_window import MainWindow
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5 import QtGui
+
+    from list_serial_ports import add_port_descriptor
+    from resource_helpers import path
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    startup_timer = StartupTimer()
+    startup_timer.mark("imports")
+
     # get the arguments, and if there are any, add them as allowed port descriptors
     for arg in sys.argv[1:]:
         print("Adding port descriptor: '{}'".format(arg))
@@ -19,9 +30,12 @@ def main():
 
     app = QApplication(sys.argv)
     app.setWindowIcon(QtGui.QIcon(path("images/icon.png")))
-    MainWindow()
+    window = MainWindow()
+    startup_timer.mark("window")
+    startup_timer.watch(window, window.log)
     sys.exit(app.exec_())
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
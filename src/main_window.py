@@ -1,19 +1,14 @@
 import functools
 import os
 from PyQt5 import QtWidgets
-import re
-import serial
-import serial.tools.list_ports
-from io import StringIO
 
-import threading
 import queue
+import time
+from time import perf_counter_ns
 
-import sys
+import numpy as np
 
-def escape_ansi(line):
-    ansi_escape = re.compile(r"(?:\x1B[@-_]|[\x80-\x9F])[0-?]*[ -/]*[@-~]")
-    return ansi_escape.sub("", str(line))
+import sys
 
 from PyQt5 import QtGui
 from PyQt5 import QtCore
@@ -29,16 +24,45 @@ from PyQt5.QtWidgets import (
     QSplitter,
     QPlainTextEdit,
     QVBoxLayout,
+    QInputDialog,
+    QProgressDialog,
+    QTabBar,
 )
 
 from action import Action
+from ansi import escape_ansi
 from pages import PlotPage
-from list_serial_ports import list_serial_ports
+from page_cache import PageCache
+from trigger import Trigger
+from log_events import EventIndex, EventPatterns
+from segments import ResetDetector
+from list_serial_ports import PortEnumerator, is_serial_port
 import csv
 from tabs import Tabs
+from output_view import OutputView
+from tagged_stream import TaggedStream
+from clock_analysis import ClockAnalysis
+from profiler import PROFILER, write_trace
+import exporter
 
 class MainWindow(QMainWindow):
 
+    # emitted from the device monitor thread
+    port_added = QtCore.pyqtSignal(str)
+    port_removed = QtCore.pyqtSignal(str)
+    # emitted from the port enumeration thread
+    ports_listed = QtCore.pyqtSignal(list)
+    # emitted from the port session thread with (state, detail)
+    port_state_changed = QtCore.pyqtSignal(str, str)
+    # emitted from the export thread with the fraction done / (path, error)
+    export_progress = QtCore.pyqtSignal(float)
+    export_finished = QtCore.pyqtSignal(str, str)
+    # emitted from the import thread with (header, text before the data) /
+    # (parsed range, fraction done) / (path, error)
+    import_header = QtCore.pyqtSignal(list, str)
+    import_range = QtCore.pyqtSignal(object, float)
+    import_finished = QtCore.pyqtSignal(str, str)
+
     from menubar import (
         menubar_init,
         menubar_add_menu,
@@ -50,11 +74,38 @@ class MainWindow(QMainWindow):
         super().__init__()
 
         self.serial_data_queue = queue.Queue()
-        self.run_serial_port_thread = False
-        self.serial_port_thread = None
-        self.serial_port = None
+        self.port_session = None
         self.port = None
-        self.output_editor = None
+        self.output_view = None
+        self.last_sample_time = np.nan
+        self.trigger = Trigger()
+        # alarm rules of the main plot and their markers, created with the
+        # first rule, see __add_alarm_rule__()
+        self.alarm_rules = None
+        self.alarm_markers = None
+        # lines which are not samples but match an event pattern (e.g.
+        # ESP-IDF log messages), by the time of the last sample before
+        # them; the ones received before any sample wait for one
+        self.event_patterns = EventPatterns.load()
+        self.log_events = EventIndex()
+        self.pending_log_events = []
+        # number of the segment of the main plot the events received now
+        # belong to, ahead of the plot while a tick's rows are parsed: the
+        # detector finds the restarts in them as the plot's will, and
+        # `event_rows` of them were looked at
+        self.event_segment = 1
+        self.event_resets = ResetDetector()
+        self.event_rows = 0
+        self.event_markers = None
+        self.clock_analysis = ClockAnalysis()
+        self.clock_view = None
+        # header of each tag seen so far, and the streams of the tags which
+        # data lines have been received for, see __route_tagged_line__()
+        self.headers = {}
+        self.tagged_streams = {}
+        # headers (by their first field) not applied yet, as they may be of
+        # tags, see __pending_header__()
+        self.pending_headers = {}
         self.baudrate = 115200
         self.baudrate_values = [
             110,
@@ -73,18 +124,39 @@ class MainWindow(QMainWindow):
             921600,
         ]
 
+        self.serial_ports = []
+        # network sources added from the menu, listed with the serial ports
+        self.network_sources = []
+        self.port_added.connect(self.__on_port_added__)
+        self.port_removed.connect(self.__on_port_removed__)
+        self.ports_listed.connect(self.__on_ports_listed__)
+        self.port_state_changed.connect(self.__on_port_state_changed__)
+        self.export_job = None
+        self.export_progress_dialog = None
+        self.export_progress.connect(self.__on_export_progress__)
+        self.export_finished.connect(self.__on_export_finished__)
+        self.import_job = None
+        self.import_progress_dialog = None
+        self.import_incorrect = 0
+        # page of the file being imported, and the alarm rules evaluated over
+        # it (copies of the main plot's) with their markers, if any
+        self.import_page = None
+        self.import_alarms = None
+        # a tab per opened file, evicted to their spill files least recently
+        # used first once the plots take more than the memory budget
+        self.page_cache = PageCache()
+        self.import_header.connect(self.__on_import_header__)
+        self.import_range.connect(self.__on_import_range__)
+        self.import_finished.connect(self.__on_import_finished__)
+        self.port_enumerator = PortEnumerator(self.ports_listed.emit)
+        self.device_monitor = None
+        self.fanout_server = None
+
         self.__init_ui__()
 
-        # At this point, the menubar is initialized
-        # which would've called __refresh_ports__()
-        #
-        # If there is a port, open it
-        if self.port:
-            self.log("Current port: " + str(self.port))
-            self.__reopen_serial_port__()
-            self.__change_menubar_text_open_close_port__()
-        else:
-            self.log("No device connected")
+        # The window is shown by now; the rest of the setup waits for the
+        # event loop, so the first frame is not held up by it
+        QtCore.QTimer.singleShot(0, self.__init_deferred__)
 
         self.update_timer = QtCore.QTimer(timerType=0)  # Qt.PreciseTimer
         self.update_timer.timeout.connect(self.__update_plot__)
@@ -94,15 +166,10 @@ class MainWindow(QMainWindow):
         self.update_timer.start(PLOT_UPDATE_PERIOD_MS)
 
     def __init_font__(self):
-        fontDatabase = QtGui.QFontDatabase()
-        families = fontDatabase.families()
-
-        desired_font = "Consolas"
-        self.font = None
-        if desired_font in families:
-            self.font = QtGui.QFont(desired_font)
-        else:
-            self.font = QtGui.QFont("Monospace")
+        # Consolas if installed, otherwise Monospace: Qt falls back through
+        # the families itself, without listing every installed font
+        self.font = QtGui.QFont()
+        self.font.setFamilies(["Consolas", "Monospace"])
         self.font.setStyleHint(QtGui.QFont.System)
         self.font.setPointSize(10)
 
@@ -146,24 +213,35 @@ class MainWindow(QMainWindow):
             self.plot_page, str(self.port) if self.port is not None else "Untitled"
         )
         self.plot_tab.setTabText(0, str(self.port) if self.port is not None else "No Port / File Selected")
+
+        # Frozen captures from the trigger are shown in their own tab
+        self.trigger_page = PlotPage()
+        self.trigger_page.plot.canvas.getAxis("left").tickFont = self.font
+        self.trigger_page.plot.canvas.getAxis("bottom").tickFont = self.font
+        self.plot_tab.addTab(self.trigger_page, "Trigger")
         self.plot_tab.setStyleSheet(
             "QTabBar::tab:selected {font-weight: bold}"
             "QTabBar::tab {background: rgb(27,27,28); color: white;}"
             "QTabWidget:pane {border: 1px solid gray;}"
         )
         self.plot_tab.setFont(self.font)
+        # only the tabs of opened files can be closed
+        self.plot_tab.setTabsClosable(True)
+        self.__pin_tab__(0)
+        self.__pin_tab__(1)
+        self.plot_tab.tabCloseRequested.connect(self.__close_tab__)
+        self.plot_tab.currentChanged.connect(self.__on_tab_changed__)
 
         self.__init_actions__()
         self.__init_menubar__()
 
         self.setStyleSheet("QMainWindow { background-color: rgb(27,27,28); }")
 
-        self.output_editor = QPlainTextEdit()
-        self.output_editor.setFont(self.font)
-        self.output_editor.setStyleSheet(self.__get_editor_stylesheet__())
+        self.output_view = OutputView(self.font, self.__get_editor_stylesheet__())
+        self.output_view.position_selected.connect(self.__show_plot_position__)
 
         self.tabs = Tabs(self)
-        self.tabs.addTab(self.output_editor, "Output")
+        self.tabs.addTab(self.output_view, "Output")
         self.tabs.setTabText(0, "Output")
         self.tabs.addTab(self.log_editor, "Log")
         self.tabs.setTabText(1, "Log")
@@ -202,9 +280,22 @@ class MainWindow(QMainWindow):
             self.__save_received_data_to_file__
         )
 
+        self.exportPlotDataAction = Action(None, "Export Plot Data...", self)
+        self.exportPlotDataAction.setStatusTip(
+            "Exports the plotted data (all of it or the visible range) to CSV or a columnar binary file"
+        )
+        self.exportPlotDataAction.triggered.connect(self.__export_plot_data__)
+
+        self.exportPlotImageAction = Action(None, "Export Plot Image...", self)
+        self.exportPlotImageAction.setStatusTip(
+            "Renders the visible part of the plot to a PNG or SVG file of any size in the background"
+        )
+        self.exportPlotImageAction.triggered.connect(self.__export_plot_image__)
+
         self.autoClearPlotAction = Action(None, "Clear Plot on Reset", self)
         self.autoClearPlotAction.setStatusTip(
-            "Clears the plot when a new header is received/detected"
+            "Starts a new segment when the header is received again (keeping the previous ones), "
+            "clears the plot when a different header is received"
         )
         self.autoClearPlotAction.triggered.connect(self.__on_auto_clear_plot_action__)
         self.autoClearPlotAction.setCheckable(True)
@@ -215,11 +306,143 @@ class MainWindow(QMainWindow):
         self.refreshAction.setStatusTip("Refresh Serial Ports")
         self.refreshAction.triggered.connect(self.__refresh_ports__)
 
+        self.openNetworkSourceAction = Action(None, "Add Network Source...", self)
+        self.openNetworkSourceAction.setStatusTip(
+            "Receive from a TCP connection or UDP port instead of a serial port"
+        )
+        self.openNetworkSourceAction.triggered.connect(self.__open_network_source__)
+
+        self.publishSamplesAction = Action(None, "Publish Samples", self)
+        self.publishSamplesAction.setStatusTip(
+            "Publish the parsed samples on a local socket, for other programs to subscribe to"
+        )
+        self.publishSamplesAction.setCheckable(True)
+        self.publishSamplesAction.setChecked(False)
+        self.publishSamplesAction.triggered.connect(self.__on_publish_samples_action__)
+
+        self.stageTimersAction = Action(None, "Enable Stage Timers", self)
+        self.stageTimersAction.setStatusTip(
+            "Time each step of receiving, parsing and plotting lines (read, decode, parse, render, ...)"
+        )
+        self.stageTimersAction.setCheckable(True)
+        self.stageTimersAction.setChecked(False)
+        self.stageTimersAction.triggered.connect(self.__on_stage_timers_action__)
+
+        self.logStageTimingsAction = Action(None, "Log Stage Timings", self)
+        self.logStageTimingsAction.setStatusTip("Write the timings of each step recorded so far to the log")
+        self.logStageTimingsAction.triggered.connect(self.__log_stage_timings__)
+
+        self.resetStageTimingsAction = Action(None, "Reset Stage Timings", self)
+        self.resetStageTimingsAction.setStatusTip("Forget the timings recorded so far")
+        self.resetStageTimingsAction.triggered.connect(PROFILER.clear)
+
+        self.captureTraceAction = Action(None, "Capture Trace...", self)
+        self.captureTraceAction.setStatusTip(
+            "Record every step for a number of seconds and save it as a Chrome / Perfetto trace"
+        )
+        self.captureTraceAction.triggered.connect(self.__capture_trace__)
+
+        self.captureCProfileAction = Action(None, "Capture With cProfile", self)
+        self.captureCProfileAction.setStatusTip(
+            "Also profile the GUI thread with cProfile during a capture, saved next to the trace (.prof)"
+        )
+        self.captureCProfileAction.setCheckable(True)
+        self.captureCProfileAction.setChecked(False)
+
         self.rescaleAxesAction = Action(None, "Rescale Axes", self)
         self.rescaleAxesAction.setShortcut("Ctrl+R")
         self.rescaleAxesAction.setStatusTip("Rescale Plot Axes")
         self.rescaleAxesAction.triggered.connect(self.__rescale_axes__)
 
+        self.showSpectrumAction = Action(None, "Show Spectrum", self)
+        self.showSpectrumAction.setShortcut("Ctrl+F")
+        self.showSpectrumAction.setStatusTip("Show the power spectrum of the latest samples of each trace")
+        self.showSpectrumAction.setCheckable(True)
+        self.showSpectrumAction.setChecked(False)
+        self.showSpectrumAction.triggered.connect(self.__on_show_spectrum_action__)
+
+        self.showStatisticsAction = Action(None, "Show Statistics", self)
+        self.showStatisticsAction.setStatusTip("Show running and visible range statistics of each trace")
+        self.showStatisticsAction.setCheckable(True)
+        self.showStatisticsAction.setChecked(False)
+        self.showStatisticsAction.triggered.connect(self.__on_show_statistics_action__)
+
+        self.segmentsAction = Action(None, "Segments...", self)
+        self.segmentsAction.setStatusTip(
+            "Select the earlier runs of the device (segments) drawn under the current one"
+        )
+        self.segmentsAction.triggered.connect(self.__select_segments__)
+
+        self.showCrosshairAction = Action(None, "Show Crosshair", self)
+        self.showCrosshairAction.setStatusTip("Show the value of every trace at the time under the mouse")
+        self.showCrosshairAction.setCheckable(True)
+        self.showCrosshairAction.setChecked(False)
+        self.showCrosshairAction.triggered.connect(self.__on_show_crosshair_action__)
+
+        self.showMeasurementAction = Action(None, "Show Measurement Cursors", self)
+        self.showMeasurementAction.setStatusTip(
+            "Show two draggable cursors with the time, change and min / max / mean of every trace between them"
+        )
+        self.showMeasurementAction.setCheckable(True)
+        self.showMeasurementAction.setChecked(False)
+        self.showMeasurementAction.triggered.connect(self.__on_show_measurement_action__)
+
+        self.showLogEventsAction = Action(None, "Show Log Events", self)
+        self.showLogEventsAction.setStatusTip("Mark the log lines matching the event patterns (errors, panics, ...) on the plot")
+        self.showLogEventsAction.setCheckable(True)
+        self.showLogEventsAction.setChecked(True)
+        self.showLogEventsAction.triggered.connect(self.__on_show_log_events_action__)
+
+        self.eventPatternsAction = Action(None, "Event Patterns...", self)
+        self.eventPatternsAction.setStatusTip("Edit the 'category: regex' patterns which make a log line an event")
+        self.eventPatternsAction.triggered.connect(self.__edit_event_patterns__)
+
+        self.showTimingAction = Action(None, "Show Host Timing", self)
+        self.showTimingAction.setStatusTip(
+            "Compare the device time of the samples with the host time they were received at"
+        )
+        self.showTimingAction.setCheckable(True)
+        self.showTimingAction.setChecked(False)
+        self.showTimingAction.triggered.connect(self.__on_show_timing_action__)
+
+        self.addDerivedChannelAction = Action(None, "Add Math Channel...", self)
+        self.addDerivedChannelAction.setStatusTip(
+            "Add a trace computed from the other columns, e.g. 'mag = sqrt(ax^2 + ay^2 + az^2)'"
+        )
+        self.addDerivedChannelAction.triggered.connect(self.__add_derived_channel__)
+
+        self.removeDerivedChannelAction = Action(None, "Remove Math Channel...", self)
+        self.removeDerivedChannelAction.setStatusTip("Remove a computed trace")
+        self.removeDerivedChannelAction.triggered.connect(self.__remove_derived_channel__)
+
+        self.addFilterAction = Action(None, "Add Filter...", self)
+        self.addFilterAction.setStatusTip("Append a filter to the filter chain of a trace")
+        self.addFilterAction.triggered.connect(self.__add_filter__)
+
+        self.removeFiltersAction = Action(None, "Remove Filters...", self)
+        self.removeFiltersAction.setStatusTip("Remove the filter chain of a trace")
+        self.removeFiltersAction.triggered.connect(self.__remove_filters__)
+
+        self.addAlarmRuleAction = Action(None, "Add Alarm Rule...", self)
+        self.addAlarmRuleAction.setStatusTip(
+            "Add a rule raising an alarm on a channel, e.g. 'current > 2 for 50' or 'stuck(temp) for 1000'"
+        )
+        self.addAlarmRuleAction.triggered.connect(self.__add_alarm_rule__)
+
+        self.removeAlarmRuleAction = Action(None, "Remove Alarm Rule...", self)
+        self.removeAlarmRuleAction.setStatusTip("Remove an alarm rule")
+        self.removeAlarmRuleAction.triggered.connect(self.__remove_alarm_rule__)
+
+        self.logAlarmCountsAction = Action(None, "Log Alarm Counts", self)
+        self.logAlarmCountsAction.setStatusTip("Write the number of times each alarm was raised to the log")
+        self.logAlarmCountsAction.triggered.connect(self.__log_alarm_counts__)
+
+        self.showRawTracesAction = Action(None, "Show Raw Traces", self)
+        self.showRawTracesAction.setStatusTip("Show the raw traces alongside their filtered traces")
+        self.showRawTracesAction.setCheckable(True)
+        self.showRawTracesAction.setChecked(True)
+        self.showRawTracesAction.triggered.connect(self.__on_show_raw_traces_action__)
+
         self.resetDevice = Action(None, "Toggle DTR/RTS", self)
         self.resetDevice.setStatusTip("Reset Device")
         self.resetDevice.triggered.connect(self.__reset_device__)
@@ -245,6 +468,31 @@ class MainWindow(QMainWindow):
         self.openRawAction.setStatusTip("Import raw CSV - time as first column, data as other colums (not exported by this tool)")
         self.openRawAction.triggered.connect(self.__open_raw__)
 
+        self.triggerArmAction = Action(None, "Arm", self)
+        self.triggerArmAction.setShortcut("Ctrl+T")
+        self.triggerArmAction.setStatusTip("Re-arm the trigger for a new capture")
+        self.triggerArmAction.triggered.connect(self.__arm_trigger__)
+
+        self.triggerChannelAction = Action(None, "Channel...", self)
+        self.triggerChannelAction.setStatusTip("Select the channel the trigger is evaluated on")
+        self.triggerChannelAction.triggered.connect(self.__set_trigger_channel__)
+
+        self.triggerLevelAction = Action(None, "Level...", self)
+        self.triggerLevelAction.setStatusTip("Set the trigger level (lower bound for window triggers)")
+        self.triggerLevelAction.triggered.connect(self.__set_trigger_level__)
+
+        self.triggerWindowHighAction = Action(None, "Window Upper Level...", self)
+        self.triggerWindowHighAction.setStatusTip("Set the upper bound for window triggers")
+        self.triggerWindowHighAction.triggered.connect(self.__set_trigger_window_high__)
+
+        self.triggerHoldoffAction = Action(None, "Holdoff...", self)
+        self.triggerHoldoffAction.setStatusTip("Set the minimum time between two triggers")
+        self.triggerHoldoffAction.triggered.connect(self.__set_trigger_holdoff__)
+
+        self.triggerCaptureSizeAction = Action(None, "Capture Size...", self)
+        self.triggerCaptureSizeAction.setStatusTip("Set the number of pre-trigger and post-trigger samples")
+        self.triggerCaptureSizeAction.triggered.connect(self.__set_trigger_capture_size__)
+
     def __rescale_axes__(self):
         self.plot_page.plot.canvas.getPlotItem().disableAutoRange()
         self.plot_page.plot.canvas.getPlotItem().enableAutoRange()
@@ -255,49 +503,157 @@ class MainWindow(QMainWindow):
         self.menu_add_action("&File", self.importSceneAction)
         self.menu_add_action("&File", self.openRawAction)
         self.menu_add_action("&File", self.exportOutputWindowAction)
+        self.menu_add_action("&File", self.exportPlotDataAction)
+        self.menu_add_action("&File", self.exportPlotImageAction)
         self.menu_add_action("&File", self.exitAction)
 
         self.menubar_add_menu("&View")
         self.menu_add_action("&View", self.rescaleAxesAction)
         self.menu_add_action("&View", self.autoClearPlotAction)
+        self.menu_add_action("&View", self.showSpectrumAction)
+        self.menu_add_action("&View", self.showStatisticsAction)
+        self.menu_add_action("&View", self.segmentsAction)
+        self.menu_add_action("&View", self.showCrosshairAction)
+        self.menu_add_action("&View", self.showMeasurementAction)
+        self.menu_add_action("&View", self.showLogEventsAction)
+        self.menu_add_action("&View", self.eventPatternsAction)
+        self.menu_add_action("&View", self.showTimingAction)
+        self.menu_add_action("&View", self.addDerivedChannelAction)
+        self.menu_add_action("&View", self.removeDerivedChannelAction)
+
+        self.menubar_add_menu("F&ilter")
+        self.menu_add_action("F&ilter", self.addFilterAction)
+        self.menu_add_action("F&ilter", self.removeFiltersAction)
+        self.menu_add_action("F&ilter", self.showRawTracesAction)
+
+        self.menubar_add_menu("&Trigger")
+        self.__init_trigger_menu__()
+
+        self.menubar_add_menu("&Alarms")
+        self.menu_add_action("&Alarms", self.addAlarmRuleAction)
+        self.menu_add_action("&Alarms", self.removeAlarmRuleAction)
+        self.menu_add_action("&Alarms", self.logAlarmCountsAction)
 
         self.menubar_add_menu("&Serial")
+        self.__init_port_menu__()
+        self.menubar_add_menu("&Profile")
+        self.menu_add_action("&Profile", self.stageTimersAction)
+        self.menu_add_action("&Profile", self.logStageTimingsAction)
+        self.menu_add_action("&Profile", self.resetStageTimingsAction)
+        self.menu_add_action("&Profile", self.captureTraceAction)
+        self.menu_add_action("&Profile", self.captureCProfileAction)
+
+    def __init_deferred__(self):
+        # __refresh_ports__() lists the ports in the background; the last
+        # port found is opened once the list arrives in __on_ports_listed__()
         self.__refresh_ports__()
+        self.__start_device_monitor__()
 
     def __init_port_menu__(self):
         serial_menu = self.menubar_get_menu("&Serial")
         serial_menu.clear()
         serial_menu.addAction(self.refreshAction)
-        ports_submenu = serial_menu.addMenu("&Port")
+        self.ports_submenu = serial_menu.addMenu("&Port")
+        serial_menu.addAction(self.openNetworkSourceAction)
 
         # Serial ports submenu
-        ports_submenu.addSeparator()
-        if len(self.serial_ports):
-            self.ports_action_group = QActionGroup(self)
-            for i in range(len(self.serial_ports)):
-                port_name = self.serial_ports[i]
-                action = ports_submenu.addAction(
-                    "&" + str(port_name),
-                    functools.partial(self.__on_port_changed__, port_name),
-                )
-                action.setCheckable(True)
-                # Check the last serial port
-                if i == len(self.serial_ports) - 1:
-                    action.setChecked(True)
-                    self.port = self.serial_ports[i]
-                    self.__on_port_changed__(self.port)
-                self.ports_action_group.addAction(action)
-            self.ports_action_group.setExclusive(True)
-        else:
-            ports_submenu.setEnabled(False)
+        self.ports_submenu.addSeparator()
+        self.ports_action_group = QActionGroup(self)
+        self.ports_action_group.setExclusive(True)
+        self.port_actions = {}
+        for port_name in self.serial_ports + self.network_sources:
+            self.__add_port_action__(port_name)
+        if not len(self.port_actions):
+            self.ports_submenu.setEnabled(False)
 
         self.__init_baudrate_menu__()
         self.menu_add_action("&Serial", self.resetDevice)
         if len(self.serial_ports) == 0:
             self.resetDevice.setEnabled(False)
         self.menu_add_action("&Serial", self.openClosePort)
+        self.menu_add_action("&Serial", self.publishSamplesAction)
         self.__change_menubar_text_open_close_port__()
 
+    def __add_port_action__(self, port_name):
+        action = self.ports_submenu.addAction(
+            "&" + str(port_name),
+            functools.partial(self.__on_port_changed__, port_name),
+        )
+        action.setCheckable(True)
+        self.ports_action_group.addAction(action)
+        self.port_actions[port_name] = action
+        self.ports_submenu.setEnabled(True)
+        self.resetDevice.setEnabled(True)
+        return action
+
+    def __remove_port_action__(self, port_name):
+        action = self.port_actions.pop(port_name)
+        self.ports_action_group.removeAction(action)
+        self.ports_submenu.removeAction(action)
+        if not len(self.port_actions):
+            self.ports_submenu.setEnabled(False)
+            self.resetDevice.setEnabled(False)
+
+    def __start_device_monitor__(self):
+        """Watches for serial devices being connected / disconnected, where supported"""
+        self.device_monitor = None
+        if not sys.platform.startswith("linux"):
+            return
+        from usb_device_listener_linux import UsbDeviceChangeMonitor
+
+        def on_arrival(device):
+            # runs on the monitor thread, so the port is checked here and
+            # the signal takes the result to the GUI thread
+            try:
+                if is_serial_port(device):
+                    self.port_added.emit(device)
+            except Exception as e:
+                print("Could not check device {}: {}".format(device, e))
+
+        try:
+            self.device_monitor = UsbDeviceChangeMonitor(on_arrival, self.port_removed.emit)
+            self.device_monitor.start()
+        except OSError as e:
+            self.log("Could not watch for serial devices: {}".format(e))
+            self.device_monitor = None
+
+    def __on_port_added__(self, port_name):
+        if port_name in self.port_actions:
+            return
+        self.log("Serial port connected: {}".format(port_name))
+        self.serial_ports.append(port_name)
+        self.__add_port_action__(port_name)
+        if port_name == self.port and self.port_session and self.port_session.is_open:
+            # the current device is back, its session reconnects to it
+            self.port_actions[port_name].setChecked(True)
+            return
+        # like on startup, start monitoring the new port if none is open
+        if not (self.port_session and self.port_session.is_open):
+            self.port_actions[port_name].setChecked(True)
+            # give udev a moment to finish setting up the device node
+            QtCore.QTimer.singleShot(
+                500, functools.partial(self.__open_added_port__, port_name)
+            )
+
+    def __open_added_port__(self, port_name):
+        if port_name not in self.port_actions:
+            return
+        try:
+            self.__on_port_changed__(port_name)
+        except Exception as e:
+            self.log("Could not open {}: {}".format(port_name, e))
+
+    def __on_port_removed__(self, port_name):
+        if port_name not in self.port_actions:
+            return
+        self.log("Serial port disconnected: {}".format(port_name))
+        self.serial_ports.remove(port_name)
+        self.__remove_port_action__(port_name)
+        if port_name == self.port:
+            # the session keeps trying to reopen the device (and keeps the
+            # plot) until the port is closed or another one is chosen
+            self.__change_menubar_text_open_close_port__()
+
     def __init_baudrate_menu__(self):
         serial_menu = self.menubar_get_menu("&Serial")
         baudrate_submenu = serial_menu.addMenu("&Baud Rate")
@@ -313,6 +669,40 @@ class MainWindow(QMainWindow):
             self.baudrate_action_group.addAction(action)
         self.baudrate_action_group.setExclusive(True)
 
+    def __init_trigger_menu__(self):
+        trigger_menu = self.menubar_get_menu("&Trigger")
+
+        mode_submenu = trigger_menu.addMenu("&Mode")
+        self.trigger_mode_action_group = QActionGroup(self)
+        for mode in Trigger.MODES:
+            action = mode_submenu.addAction(
+                "&" + mode.capitalize(), functools.partial(self.__on_trigger_mode_changed__, mode)
+            )
+            action.setCheckable(True)
+            if mode == self.trigger.mode:
+                action.setChecked(True)
+            self.trigger_mode_action_group.addAction(action)
+        self.trigger_mode_action_group.setExclusive(True)
+
+        kind_submenu = trigger_menu.addMenu("&Type")
+        self.trigger_kind_action_group = QActionGroup(self)
+        for kind in Trigger.KINDS:
+            action = kind_submenu.addAction(
+                "&" + kind.capitalize(), functools.partial(self.__on_trigger_kind_changed__, kind)
+            )
+            action.setCheckable(True)
+            if kind == self.trigger.kind:
+                action.setChecked(True)
+            self.trigger_kind_action_group.addAction(action)
+        self.trigger_kind_action_group.setExclusive(True)
+
+        self.menu_add_action("&Trigger", self.triggerChannelAction)
+        self.menu_add_action("&Trigger", self.triggerLevelAction)
+        self.menu_add_action("&Trigger", self.triggerWindowHighAction)
+        self.menu_add_action("&Trigger", self.triggerHoldoffAction)
+        self.menu_add_action("&Trigger", self.triggerCaptureSizeAction)
+        self.menu_add_action("&Trigger", self.triggerArmAction)
+
     def log(self, msg):
         cursor = self.log_editor.textCursor()
         cursor.movePosition(QtGui.QTextCursor.End)
@@ -321,11 +711,16 @@ class MainWindow(QMainWindow):
         self.log_editor.ensureCursorVisible()
 
     def output(self, msg):
-        cursor = self.output_editor.textCursor()
-        cursor.movePosition(QtGui.QTextCursor.End)
-        cursor.insertText(msg + "\n")
-        self.output_editor.setTextCursor(cursor)
-        self.output_editor.ensureCursorVisible()
+        self.output_view.append(msg, time.time(), self.last_sample_time)
+
+    def __show_plot_position__(self, x):
+        # keep the current zoom, just center the view on the position
+        plot_item = self.plot_page.plot.plot_item
+        (x_min, x_max), _ = plot_item.viewRange()
+        half_width = (x_max - x_min) / 2.0
+        plot_item.disableAutoRange(axis="x")
+        plot_item.setXRange(x - half_width, x + half_width, padding=0)
+        self.plot_tab.setCurrentWidget(self.plot_page)
 
     def __on_port_changed__(self, newPort):
         if newPort != self.port:
@@ -340,104 +735,401 @@ class MainWindow(QMainWindow):
         self.__reopen_serial_port__()
         self.__change_menubar_text_open_close_port__()
 
+    def __open_network_source__(self):
+        import network_session
+
+        kinds = {
+            "TCP client (connect to the device)": network_session.TCP_CLIENT,
+            "TCP server (the device connects)": network_session.TCP_SERVER,
+            "UDP listener": network_session.UDP,
+        }
+        kind, ok = QInputDialog.getItem(self, "Network Source", "Type:", list(kinds), 0, False)
+        if not ok:
+            return
+        default = "192.168.4.1:3333" if kinds[kind] == network_session.TCP_CLIENT else "0.0.0.0:3333"
+        text, ok = QInputDialog.getText(self, "Network Source", "host:port", text=default)
+        if not ok:
+            return
+        address = kinds[kind] + text.strip()
+        try:
+            network_session.parse_address(address)
+        except ValueError as e:
+            self.log(str(e))
+            return
+        if address not in self.port_actions:
+            self.network_sources.append(address)
+            self.__add_port_action__(address)
+        self.port_actions[address].setChecked(True)
+        self.__on_port_changed__(address)
+
     def __refresh_ports__(self):
         self.log("Refreshing serial ports")
-        self.serial_ports = list_serial_ports()
+        self.port_enumerator.refresh()
 
-        # If the device that was being monitored has
-        # now been removed, close the port
-        if self.port not in self.serial_ports:
-            self.port = None
-            if self.serial_port:
-                self.serial_port.close()
-            self.serial_port = None
+    def __on_ports_listed__(self, ports):
+        # apply only the difference to the port menu
+        for port_name in [p for p in self.port_actions if p not in ports + self.network_sources]:
+            self.__on_port_removed__(port_name)
+        for port_name in ports:
+            if port_name not in self.port_actions:
+                self.serial_ports.append(port_name)
+                self.__add_port_action__(port_name)
 
-        self.__init_port_menu__()
         if len(self.serial_ports) == 0:
-            self.resetDevice.setEnabled(False)
             self.log("No serial ports detected")
-        else:
-            self.resetDevice.setEnabled(True)
-            self.log("One or more serial ports detected")
+            return
+        self.log("One or more serial ports detected")
+
+        # Check (and open) the last serial port if none is selected yet
+        if self.port is None:
+            self.port = self.serial_ports[-1]
+            self.port_actions[self.port].setChecked(True)
+            self.log("Current port: " + str(self.port))
+            try:
+                self.__on_port_changed__(self.port)
+            except Exception as e:
+                self.log("Could not open {}: {}".format(self.port, e))
 
     def __reset_device__(self):
         self.log("Toggling DTR/RTS for device at serial port {}".format(self.port))
 
-        # Close if already open
-        if self.serial_port:
-            self.serial_port.close()
-
-        # Reset the device by re-opening Serial port
-        # with DTR and RTS enabled
-        #
-        # These are enabled by default
-        self.serial_port = serial.Serial(self.port, self.baudrate)
-        self.__reopen_serial_port__()
+        # The port session toggles the lines on its own thread, keeping the
+        # port open, so the output of the device booting is not lost
+        if not (self.port_session and self.port_session.is_open):
+            self.__reopen_serial_port__()
+        if self.port_session:
+            self.port_session.reset_device()
         self.__change_menubar_text_open_close_port__()
 
+    def __on_trigger_mode_changed__(self, mode):
+        self.trigger.set_mode(mode)
+        self.log("Trigger mode: {}".format(mode))
+
+    def __on_trigger_kind_changed__(self, kind):
+        self.trigger.set_kind(kind)
+        self.log("Trigger type: {}".format(kind))
+
+    def __arm_trigger__(self):
+        self.trigger.arm()
+        if self.trigger.armed:
+            self.log("Trigger armed on '{}'".format(self.trigger.channel))
+        else:
+            self.log("Trigger mode is off, select a mode to arm it")
+
+    def __set_trigger_channel__(self):
+        channels = self.plot_page.plot.column_names()
+        if not len(channels):
+            self.log("No channels available to trigger on")
+            return
+        current = channels.index(self.trigger.channel) if self.trigger.channel in channels else 0
+        channel, ok = QInputDialog.getItem(self, "Trigger", "Channel:", channels, current, False)
+        if ok:
+            self.trigger.channel = channel
+            self.trigger.reset()
+            self.log("Trigger channel: {}".format(channel))
+
+    def __set_trigger_level__(self):
+        level, ok = QInputDialog.getDouble(self, "Trigger", "Level:", self.trigger.level, decimals=6)
+        if ok:
+            self.trigger.level = level
+            self.log("Trigger level: {}".format(level))
+
+    def __set_trigger_window_high__(self):
+        level, ok = QInputDialog.getDouble(
+            self, "Trigger", "Window upper level:", self.trigger.window_high, decimals=6
+        )
+        if ok:
+            self.trigger.window_high = level
+            self.log("Trigger window upper level: {}".format(level))
+
+    def __set_trigger_holdoff__(self):
+        holdoff, ok = QInputDialog.getDouble(
+            self, "Trigger", "Holdoff (x axis units):", self.trigger.holdoff, 0, decimals=6
+        )
+        if ok:
+            self.trigger.holdoff = holdoff
+            self.log("Trigger holdoff: {}".format(holdoff))
+
+    def __set_trigger_capture_size__(self):
+        pre, ok = QInputDialog.getInt(
+            self, "Trigger", "Pre-trigger samples:", self.trigger.pre_samples, 0
+        )
+        if not ok:
+            return
+        post, ok = QInputDialog.getInt(
+            self, "Trigger", "Post-trigger samples:", self.trigger.post_samples, 1
+        )
+        if ok:
+            self.trigger.pre_samples = pre
+            self.trigger.post_samples = post
+            self.trigger.arm()
+            self.log("Trigger capture: {} pre / {} post samples".format(pre, post))
+
+    def __process_trigger__(self, dataset):
+        plot = self.plot_page.plot
+        channels = plot.column_names()
+        if self.trigger.mode == "off" or self.trigger.channel not in channels:
+            return
+        channel = channels.index(self.trigger.channel) + 1
+        # indices count the spilled samples too, so they stay valid across spills
+        offset = len(plot.column(self.trigger.channel, 0)) - len(dataset)
+        for index in self.trigger.process(dataset[:, 0], dataset[:, channel], offset):
+            self.__show_trigger_capture__(index)
+
+    def __show_trigger_capture__(self, index):
+        plot = self.plot_page.plot
+        capture = self.trigger_page.plot
+        trigger_time = plot.column(self.trigger.channel, 0).read(index, index + 1)[0]
+
+        capture.plot_item.clear()
+        capture.traces = {}
+        capture.data = {}
+        capture.legend.clear()
+        capture.set_header(plot.trace_names[:1] + plot.column_names())
+        for name in plot.column_names():
+            # traces may hold different samples (e.g. a math channel added
+            # later), so each window is found from the trigger time
+            times = plot.column(name, 0)
+            position = times.search(trigger_time)
+            start = max(0, position - self.trigger.pre_samples)
+            end = position + self.trigger.post_samples
+            x = times.read(start, end) - trigger_time
+            y = plot.column(name, 1).read(start, end)
+            capture.data[name] = {"x": x, "y": y}
+            capture.set_plotdata(name, x, y)
+        capture.plot_item.addLine(x=0, pen="r")
+        self.log("Triggered on '{}' at {}".format(self.trigger.channel, trigger_time))
+
+    def __add_derived_channel__(self):
+        definition, ok = QInputDialog.getText(
+            self, "Math Channel", "name = expression (header columns, + - * / ^, sqrt, abs, ...):"
+        )
+        if not ok or not definition.strip():
+            return
+        from derived_channels import DerivedChannel
+
+        try:
+            channel = DerivedChannel.parse(definition)
+        except ValueError as e:
+            self.log(str(e))
+            return
+        missing = channel.columns.difference(self.plot_page.plot.trace_names)
+        if len(self.plot_page.plot.trace_names) and len(missing):
+            self.log("Warning: '{}' uses unknown columns: {}".format(channel, ", ".join(sorted(missing))))
+        self.plot_page.plot.add_derived_channel(channel)
+        self.log("Added math channel '{}'".format(channel))
+
+    def __remove_derived_channel__(self):
+        plot = self.plot_page.plot
+        names = [channel.name for channel in plot.derived]
+        if not len(names):
+            self.log("No math channels to remove")
+            return
+        name, ok = QInputDialog.getItem(self, "Math Channel", "Channel:", names, 0, False)
+        if not ok:
+            return
+        plot.derived = [channel for channel in plot.derived if channel.name != name]
+        if name in plot.traces:
+            trace = plot.traces.pop(name)
+            plot.legend.removeItem(trace)
+            plot.plot_item.removeItem(trace)
+        plot.forget(name)
+        self.log("Removed math channel '{}'".format(name))
+
+    def __add_filter__(self):
+        plot = self.plot_page.plot
+        channels = plot.column_names()
+        if not len(channels):
+            self.log("No channels available to filter")
+            return
+        name, ok = QInputDialog.getItem(self, "Filter", "Channel:", channels, 0, False)
+        if not ok:
+            return
+        from filters import MovingAverage, ExponentialMovingAverage, Biquad, Median, Decimate
+
+        kinds = ["Moving Average", "EMA", "Low-pass", "High-pass", "Band-pass", "Median", "Decimate"]
+        kind, ok = QInputDialog.getItem(self, "Filter", "Type:", kinds, 0, False)
+        if not ok:
+            return
+
+        if kind in ["Moving Average", "Median"]:
+            length, ok = QInputDialog.getInt(self, "Filter", "Length (samples):", 8, 1)
+            filter = MovingAverage(length) if kind == "Moving Average" else Median(length)
+        elif kind == "EMA":
+            alpha, ok = QInputDialog.getDouble(self, "Filter", "Alpha:", 0.1, 0.0001, 1.0, decimals=4)
+            filter = ExponentialMovingAverage(alpha)
+        elif kind == "Decimate":
+            factor, ok = QInputDialog.getInt(self, "Filter", "Factor:", 4, 1)
+            filter = Decimate(factor)
+        else:
+            cutoff, ok = QInputDialog.getDouble(
+                self, "Filter", "Cutoff / center frequency (1 / x axis units):", 1.0, 0, decimals=6
+            )
+            if not ok:
+                return
+            q, ok = QInputDialog.getDouble(self, "Filter", "Q:", 0.7071, 0.01, 100.0, decimals=4)
+            filter = Biquad(kind.lower(), cutoff, q)
+        if not ok:
+            return
+
+        plot.add_filter(name, filter)
+        self.log("Filter chain of '{}': {}".format(name, plot.filters[name]))
+
+    def __remove_filters__(self):
+        plot = self.plot_page.plot
+        names = list(plot.filters)
+        if not len(names):
+            self.log("No filters to remove")
+            return
+        name, ok = QInputDialog.getItem(self, "Filter", "Channel:", names, 0, False)
+        if ok:
+            plot.remove_filters(name)
+            self.log("Removed the filters of '{}'".format(name))
+
+    def __on_show_raw_traces_action__(self):
+        self.plot_page.plot.set_show_raw(self.showRawTracesAction.isChecked())
+
     def __clear_plot__(self):
-        self.plot_page.plot.plot_item.clear()
-        self.plot_page.plot.traces = {}
-        self.plot_page.plot.trace_names = []
-        self.plot_page.plot.data = {}
+        self.plot_page.plot.clear()
+        self.last_sample_time = np.nan
+        self.clock_analysis.reset()
+        if self.plot_page.spectrum is not None:
+            self.plot_page.spectrum.clear()
+        self.trigger.reset()
+        self.__reset_alarms__()
+        self.log_events.clear()
+        self.pending_log_events = []
+        self.event_segment = 1
+        self.event_resets.clear()
+        if self.event_markers is not None:
+            self.event_markers.refresh()
 
     def __open_raw__(self):
-        # ensure we close the serial port
-        self.__close_port()
-
         dialog = QFileDialog()
         fmts = ["Any Text Files (*.csv *.txt)", "CSV (*csv)", "Text (*txt)"]
         dialog.setDefaultSuffix(fmts[0])
         dialog.setNameFilters(fmts)
 
         if dialog.exec_() == QDialog.Accepted:
-            path = dialog.selectedFiles()[0]
+            path = os.path.abspath(dialog.selectedFiles()[0])
 
-            # Set plot tab title to filename
-            filename = os.path.basename(path)
-            self.plot_tab.setTabText(0, filename)
-            self.plot_tab.setToolTip(path)
+            # a file already open is shown from its cache, not parsed again
+            page = self.page_cache.get(path)
+            if page is not None:
+                self.plot_tab.setCurrentWidget(page)
+                return
 
-            with open(path, "r") as csvfile:
-                filedata = csvfile.read()
-                filedata = escape_ansi(filedata)
-                self.output(filedata)
-                reader = csv.reader(StringIO(filedata))
+            if self.import_job is not None and self.import_job.running:
+                self.log("An import is already running")
+                return
 
-                # Clear existing plot and set new header
-                self.__clear_plot__()
-                self.plot_page.plot.legend.clear()
+            # each file gets its own tab, titled with its name
+            page = PlotPage()
+            page.plot.canvas.getAxis("left").tickFont = self.font
+            page.plot.canvas.getAxis("bottom").tickFont = self.font
+            index = self.plot_tab.addTab(page, os.path.basename(path))
+            self.plot_tab.setTabToolTip(index, path)
+            self.page_cache.add(path, page)
+            self.plot_tab.setCurrentWidget(page)
+
+            import csv_import
+
+            self.import_page = page
+            self.import_alarms = None
+            if self.alarm_rules is not None and len(self.alarm_rules):
+                from alarms import AlarmMarkers
+
+                self.import_alarms = (self.alarm_rules.copy(), AlarmMarkers(page.plot))
+            self.import_job = csv_import.ImportJob(
+                path, None, self.import_header.emit, self.import_range.emit, self.import_finished.emit
+            )
+            self.import_incorrect = 0
+            self.import_progress_dialog = QProgressDialog("Importing '{}'".format(path), "Cancel", 0, 1000, self)
+            self.import_progress_dialog.setWindowModality(QtCore.Qt.NonModal)
+            self.import_progress_dialog.canceled.connect(self.import_job.cancel)
+            self.import_job.start()
+
+    def __on_import_header__(self, header, text):
+        self.output(text)
+        if len(header):
+            self.import_page.plot.set_header(header)
+
+    def __on_import_range__(self, parsed, fraction):
+        # the ranges arrive in file order, each is appended to the plot
+        # without redrawing it until the whole file is in
+        try:
+            self.output(parsed.text)
+            plot = self.import_page.plot
+            if len(parsed.rows) and len(plot.trace_names) == parsed.rows.shape[1]:
+                batch = plot.update_data(parsed.rows, render=False)
+                if self.import_alarms is not None:
+                    self.__process_alarms__(plot, batch, *self.import_alarms)
+                self.__enforce_memory_budget__()
+            for line in parsed.examples[: max(0, 10 - self.import_incorrect)]:
+                self.log("Warning: line has incorrect length:'{}'".format(line))
+            self.import_incorrect += parsed.incorrect
+            if self.import_progress_dialog is not None:
+                self.import_progress_dialog.setValue(int(fraction * 1000))
+        finally:
+            # the import thread only parses ahead of the plot by a few ranges
+            self.import_job.applied()
+
+    def __on_import_finished__(self, path, error):
+        if self.import_progress_dialog is not None:
+            self.import_progress_dialog.canceled.disconnect()
+            self.import_progress_dialog.close()
+            self.import_progress_dialog = None
+        page, self.import_page = self.import_page, None
+        self.import_alarms = None
+        page.plot.finish_spilling()
+        page.plot.render()
+        self.__enforce_memory_budget__()
+        if self.import_incorrect > 10:
+            self.log("Warning: {} lines had an incorrect length in total".format(self.import_incorrect))
+        if error:
+            self.log("Import from '{}' failed: {}".format(path, error))
+        else:
+            self.log("Successfully imported from '{}'".format(path))
 
-                header = []
-                dataset = []
-                for row in reader:
-                    if not len(header) and len(row) >= 2 and '%' in row[0]:
-                        try:
-                            # Parse Header
-                            # Expected: Time, Foo, Bar, Baz, ...
-                            # Note: first line (header) must be prepended with %
-                            # Convert to: "Foo","Bar",...
-                            header = [h.replace('%', '').strip() for h in row]
-                            header = list(dict.fromkeys(header))
-                            self.plot_page.plot.set_header(header)
-                            dataset = []
-                        except:
-                            pass
-                    elif len(header):
-                        try:
-                            time = float(row[0])
-                            signals = [float(x) for x in row[1:]]
-                            data = []
-                            if len(row) == len(header):
-                                data.append(time)
-                                data.extend(signals)
-                                dataset.append(data)
-                            else:
-                                self.log("Warning: line has incorrect length:'{}'".format(row))
-                        except:
-                            pass
-                self.plot_page.plot.update_data(dataset)
-                self.log("Successfully imported from '{}'".format(path))
+    def __pin_tab__(self, index):
+        """Removes the close button of a tab which is not a file's"""
+        for side in (QTabBar.LeftSide, QTabBar.RightSide):
+            self.plot_tab.tabBar.setTabButton(index, side, None)
+
+    def __close_tab__(self, index):
+        page = self.plot_tab.widget(index)
+        if page not in self.page_cache:
+            return
+        if page is self.import_page:
+            self.log("Cancel the import before closing its tab")
+            return
+        self.plot_tab.removeTab(index)
+        self.page_cache.remove(page)
+        # deletes the spill files
+        page.plot.clear()
+        page.deleteLater()
+
+    def __on_tab_changed__(self, index):
+        page = self.plot_tab.widget(index)
+        if page in self.page_cache:
+            self.page_cache.use(page)
+        self.__enforce_memory_budget__()
+
+    def __enforce_memory_budget__(self):
+        """Evicts the file tabs used least recently, if the plots take more than the budget"""
+        other = 0
+        for index in range(self.plot_tab.count()):
+            page = self.plot_tab.widget(index)
+            if page not in self.page_cache:
+                other += page.plot.memory_bytes()
+        keep = (self.plot_tab.currentWidget(), self.import_page)
+        for page in self.page_cache.enforce(keep, other):
+            self.log("Moved '{}' to the disk cache to stay within the memory budget".format(self.page_cache.path_of(page)))
+
+    def __export_page__(self):
+        """The page exported: the file shown, or the main plot"""
+        page = self.plot_tab.currentWidget()
+        return page if page in self.page_cache else self.plot_page
 
     def __import_scene__(self):
         # ensure we close the serial port
@@ -489,6 +1181,12 @@ class MainWindow(QMainWindow):
     # window functions
     def __quit(self):
         self.__close_port()
+        if self.device_monitor:
+            self.device_monitor.stop()
+        if self.fanout_server is not None:
+            self.fanout_server.stop()
+        if self.plot_page.spectrum is not None:
+            self.plot_page.spectrum.stop()
         self.close()
 
     def __center_window__(self):
@@ -498,82 +1196,116 @@ class MainWindow(QMainWindow):
         self.move(qr.topLeft())
 
     def __reopen_serial_port__(self):
-        # stop serial port thread if running
-        self.run_serial_port_thread = False
-        if self.serial_port_thread:
-            self.log("Asking serial port thread to stop")
-            self.serial_port_thread.join()
-            self.log("Stopped serial port thread")
-
-        # Close if already open
-        if self.serial_port:
-            self.serial_port.close()
-            self.log("Closed serial port")
+        # ask the current session to stop, the new one opens the port once
+        # it has been closed
+        previous = self.port_session
+        # the same device again (e.g. reopened, or at another baud rate)
+        # continues the same capture
+        same_port = previous is not None and previous.port == self.port
+        if previous:
+            previous.stop()
+            self.log("Closing serial port")
 
         # if baudrate or port are invalid, return
         if not self.port or not self.baudrate:
             self.log("Invalid port or baudrate")
             self.log(f"Port: {self.port}, Baudrate: {self.baudrate}")
+            self.port_session = None
+            self.__change_menubar_text_open_close_port__()
             return
 
-        print("Opening serial port {}, baud={}".format(self.port, self.baudrate))
-        self.serial_port = serial.Serial()
-        self.serial_port.port = self.port
-        self.serial_port.baudrate = self.baudrate
-        # Disable hardware flow control
-        self.serial_port.setRTS(False)
-        self.serial_port.setDTR(False)
-        # open the serial port
-        self.serial_port.open()
+        import network_session
+        from port_session import PortSession
+
+        session_class = PortSession
+        if network_session.is_network_address(self.port):
+            session_class = network_session.NetworkSession
+        print("Opening {}, baud={}".format(self.port, self.baudrate))
+        self.port_session = session_class(
+            self.port,
+            self.baudrate,
+            self.__on_serial_line__,
+            self.port_state_changed.emit,
+        )
+        self.port_session.start(previous)
         # update the menubar text
         self.__change_menubar_text_open_close_port__()
 
         # if auto clear plot is enabled, clear the plot
-        if self.auto_clear_plot_on_header_change:
+        if self.auto_clear_plot_on_header_change and not same_port:
             self.__clear_plot__()
-            if self.output_editor:
-                # and also clear the output editor
-                self.output_editor.clear()
-
-        # start a thread to open and read from the serial port
-        self.serial_port_thread = threading.Thread(target = self.__read_serial_port__)
-        self.run_serial_port_thread = True
-        self.serial_port_thread.start()
-
-    def __read_serial_port__(self):
-        # Loop until the thread is asked to stop
-        try:
-            while self.run_serial_port_thread:
-                if self.serial_port.inWaiting():
-                    serial_port_data = self.serial_port.readline()
-                    # and decode it
-                    if sys.version_info >= (3, 0):
-                        serial_port_data = serial_port_data.decode("utf-8", "backslashreplace")
-                    serial_port_data = escape_ansi(serial_port_data)
-                    serial_port_data = serial_port_data.strip()
-                    self.serial_data_queue.put_nowait(serial_port_data)
-        except Exception as e:
-            print("Serial port thread exception: " + str(e))
-        print("Serial port thread exiting")
+            for stream in self.tagged_streams.values():
+                stream.clear()
+            if self.output_view:
+                # and also clear the output
+                self.output_view.clear()
+
+    def __on_serial_line__(self, serial_port_data, received_ns):
+        # runs on the port session thread: decode the line and queue it
+        # along with the host time it was received at
+        if PROFILER.enabled:
+            self.__on_serial_line_profiled__(serial_port_data, received_ns)
+            return
+        serial_port_data = serial_port_data.decode("utf-8", "backslashreplace")
+        serial_port_data = escape_ansi(serial_port_data)
+        serial_port_data = serial_port_data.strip()
+        self.serial_data_queue.put_nowait((serial_port_data, received_ns))
+
+    def __on_serial_line_profiled__(self, serial_port_data, received_ns):
+        # the same as __on_serial_line__, timing each step
+        started = perf_counter_ns()
+        serial_port_data = serial_port_data.decode("utf-8", "backslashreplace")
+        PROFILER.record("decode", started)
+        started = perf_counter_ns()
+        serial_port_data = escape_ansi(serial_port_data)
+        serial_port_data = serial_port_data.strip()
+        PROFILER.record("sanitize", started)
+        started = perf_counter_ns()
+        self.serial_data_queue.put_nowait((serial_port_data, received_ns))
+        PROFILER.record("enqueue", started)
+
+    def __on_port_state_changed__(self, state, detail):
+        if detail:
+            self.log("Serial port {}: {} ({})".format(self.port, state, detail))
+        else:
+            self.log("Serial port {}: {}".format(self.port, state))
+        self.__change_menubar_text_open_close_port__()
 
     def __update_plot__(self):
-        # as long as there is data in the queue, get it, parse it, and plot it
+        # as long as there is data in the queue, get it and parse it, then
+        # plot all of the datapoints received since the last update at once
+        dataset = []
+        received = []
+        events = []
+        profiling = PROFILER.enabled
+        if profiling:
+            tick_started = perf_counter_ns()
         while True:
             strdata = ""
+            if profiling:
+                started = perf_counter_ns()
             try:
-                strdata = self.serial_data_queue.get_nowait()
-            except:
-                # there is no data in the queue, do nothing
-                return
-
-            self.output(strdata)
+                strdata, received_ns = self.serial_data_queue.get_nowait()
+            except queue.Empty:
+                # there is no more data in the queue
+                break
+
+            if profiling:
+                PROFILER.record("dequeue", started)
+                PROFILER.record_duration("queued", time.monotonic_ns() - received_ns)
+                started = perf_counter_ns()
+                self.output(strdata)
+                PROFILER.record("console", started)
+            else:
+                self.output(strdata)
             arrdata = strdata.split(",")
 
             # There must be at least 2 columns
             # Time,Signal_1
             # Then it is (possibly) a valid timeseries
             if len(arrdata) < 2:
-                return
+                self.__capture_log_event__(strdata, events, dataset)
+                continue
 
             # determine if this line is a header or not
             # The line must start with `%`
@@ -583,61 +1315,332 @@ class MainWindow(QMainWindow):
 
             if is_header:
                 # an array of strings
-
-                # Clear existing plot and set new header
-                if self.auto_clear_plot_on_header_change:
-                    self.__clear_plot__()
-                    self.plot_page.plot.legend.clear()
-
                 arrdata[0] = arrdata[0].replace('%', '')
-                self.plot_page.plot.set_header(arrdata)
+                self.headers[arrdata[0]] = arrdata[1:]
+                stream = self.tagged_streams.get(arrdata[0])
+                if stream is not None:
+                    self.__flush_tagged_stream__(stream)
+                    stream.set_header(arrdata[1:], self.auto_clear_plot_on_header_change)
+                    self.__publish__(stream.tag, stream.page.plot, [])
+                    continue
+
+                # until untagged rows of its width arrive, this may as well
+                # be the header of a tag which data has not been seen yet
+                self.pending_headers.pop(arrdata[0], None)
+                self.pending_headers[arrdata[0]] = arrdata
+                continue
             else:
                 # an array of numbers
+                if profiling:
+                    started = perf_counter_ns()
                 try:
                     datapoint = [float(x.strip()) for x in arrdata]
-
-                    if len(self.plot_page.plot.trace_names) == len(datapoint):
-                        # This is a good datapoint
-                        # Matches the exact number of cols as the header
-                        self.plot_page.plot.update_data([datapoint])
-                    else:
-                        # Ignore it, this is not a valid datapoint
-                        # datapoint could be an empty list
+                except ValueError:
+                    datapoint = None
+                if profiling:
+                    PROFILER.record("parse", started)
+                if datapoint is None:
+                    # e.g. `imu,1.5,0.1,...` of a multiplexed stream, or text
+                    routed = self.__route_tagged_line__(arrdata)
+                    if routed is None:
+                        self.__capture_log_event__(strdata, events, dataset)
+                    elif routed is False:
                         self.log("Not a valid datapoint: '{}'".format(strdata))
-                except:
-                    pass
+                    continue
+
+                header = self.__pending_header__(len(datapoint))
+                if header is not None:
+                    # Plot what was received under the previous header first
+                    self.__plot_dataset__(dataset, received)
+                    dataset = []
+                    received = []
+                    self.__apply_header__(header)
+
+                if len(self.plot_page.plot.trace_names) == len(datapoint):
+                    # This is a good datapoint
+                    # Matches the exact number of cols as the header
+                    dataset.append(datapoint)
+                    received.append(received_ns)
+                    self.last_sample_time = datapoint[0]
+                else:
+                    # Ignore it, this is not a valid datapoint
+                    # datapoint could be an empty list
+                    self.log("Not a valid datapoint: '{}'".format(strdata))
+
+        self.__plot_dataset__(dataset, received)
+        for stream in self.tagged_streams.values():
+            self.__flush_tagged_stream__(stream)
+        if len(events) or len(self.pending_log_events):
+            self.__add_log_events__(events)
+        if profiling:
+            PROFILER.record("update", tick_started, len(received))
+
+    def __pending_header__(self, width):
+        """
+        The held header untagged rows of `width` columns were received for, if
+        any. A header with the x column of the main plot is its own (e.g. the
+        device restarted); any other only once the rows do not fit the main
+        plot, the last one received of that width. The others are forgotten,
+        as they belong to tags (see __route_tagged_line__).
+        """
+        if not len(self.pending_headers):
+            return None
+        names = self.plot_page.plot.trace_names
+        headers = [header for header in self.pending_headers.values() if len(header) == width]
+        same_x = [header for header in headers if len(names) and header[0] == names[0]]
+        if len(same_x):
+            header = same_x[-1]
+        elif len(headers) and len(names) != width:
+            header = headers[-1]
+        else:
+            return None
+        self.pending_headers = {}
+        return header
+
+    def __apply_header__(self, header):
+        # the device (re)started, so its clock did too
+        self.clock_analysis.reset()
+
+        # the same header again: the device restarted, keep the
+        # previous run as a segment; otherwise clear the plot
+        if self.auto_clear_plot_on_header_change:
+            if header == self.plot_page.plot.trace_names:
+                self.__start_segment__(self.plot_page.plot)
+            else:
+                self.__clear_plot__()
+                self.plot_page.plot.legend.clear()
+
+        self.plot_page.plot.set_header(header)
+        if self.trigger.channel not in header[1:]:
+            self.trigger.channel = header[1]
+        self.trigger.reset()
+
+    def __capture_log_event__(self, line, events, dataset):
+        category = self.event_patterns.classify(line)
+        if category is not None:
+            self.__count_restarts__(dataset)
+            events.append((self.last_sample_time, category, line, self.event_segment))
+
+    def __add_log_events__(self, events):
+        pending = self.pending_log_events + [event for event in events if np.isnan(event[0])]
+        events = [event for event in events if not np.isnan(event[0])]
+        plot = self.plot_page.plot
+        names = [name for name in plot.column_names() if name in plot.data]
+        if len(pending) and len(names) and len(plot.column(names[0], 0)):
+            # received before the first sample, placed at it
+            first = plot.column(names[0], 0).read(0, 1)[0]
+            events += [(first, category, line, segment) for _, category, line, segment in pending]
+            pending = []
+        self.pending_log_events = pending
+        if not len(events):
+            return
+        self.log_events.extend(events)
+        if self.event_markers is None:
+            from log_events import EventMarkers
+
+            self.event_markers = EventMarkers(self.plot_page.plot, self.log_events, self.event_patterns)
+            self.event_markers.set_visible(self.showLogEventsAction.isChecked())
+        else:
+            self.event_markers.refresh()
+
+    def __on_show_log_events_action__(self):
+        if self.event_markers is not None:
+            self.event_markers.set_visible(self.showLogEventsAction.isChecked())
+
+    def __edit_event_patterns__(self):
+        text, ok = QInputDialog.getMultiLineText(
+            self, "Event Patterns", "One 'category: regex' per line, the first match wins:", self.event_patterns.text
+        )
+        if not ok:
+            return
+        try:
+            self.event_patterns = EventPatterns(text)
+        except ValueError as e:
+            self.log("Invalid event patterns: {}".format(e))
+            return
+        if self.event_markers is not None:
+            self.event_markers.patterns = self.event_patterns
+            self.event_markers.refresh()
+        self.log("Event categories: {}".format(", ".join(self.event_patterns.categories)))
+
+    def __flush_tagged_stream__(self, stream):
+        batch = stream.flush()
+        if batch is not None:
+            self.__publish__(stream.tag, stream.page.plot, batch)
+
+    def __publish__(self, tag, plot, batch):
+        """Sends a batch (and the columns, if they changed) to the subscribers"""
+        if self.fanout_server is not None and len(plot.trace_names):
+            self.fanout_server.publish(tag, plot.trace_names[:1] + plot.column_names(), batch)
+
+    def __route_tagged_line__(self, fields):
+        """
+        Appends the line to the stream of its tag (its first field), creating
+        the stream the first time data arrives for a tag with a known header.
+
+        :returns: None if the line has no known tag (e.g. it is log text),
+            otherwise whether it matched the header of its stream
+        """
+        stream = self.tagged_streams.get(fields[0])
+        if stream is None:
+            # its header is not one of the main plot
+            self.pending_headers.pop(fields[0], None)
+            header = self.headers.get(fields[0])
+            if header is None:
+                return None
+            stream = self.__add_tagged_stream__(fields[0], header)
+        return stream.append(fields[1:])
+
+    def __add_tagged_stream__(self, tag, header):
+        page = PlotPage()
+        page.plot.canvas.getAxis("left").tickFont = self.font
+        page.plot.canvas.getAxis("bottom").tickFont = self.font
+        self.__pin_tab__(self.plot_tab.addTab(page, tag))
+        stream = TaggedStream(tag, header, page)
+        self.tagged_streams[tag] = stream
+        self.log("Plotting tagged stream '{}': {}".format(tag, ", ".join(header)))
+        return stream
+
+    def __count_restarts__(self, dataset):
+        """Counts the segments started by the rows not plotted yet, as the plot will find them"""
+        if len(dataset) > self.event_rows:
+            times = [row[0] for row in dataset[self.event_rows :]]
+            self.event_segment += len(self.event_resets.reset_rows(times))
+            self.event_rows = len(dataset)
+
+    def __plot_dataset__(self, dataset, received):
+        if not len(dataset):
+            return
+        self.__count_restarts__(dataset)
+        self.event_rows = 0
+        plot = self.plot_page.plot
+        segments = len(plot.segments)
+        batch = plot.update_data(dataset)
+        self.__publish__("", plot, batch)
+        if len(plot.segments) != segments:
+            # the time column went far back: the device restarted
+            first = len(batch) - plot.segment_rows
+            self.__process_alarms__(plot, batch[:first])
+            self.__log_segment__(plot.segments[-1])
+            self.clock_analysis.reset()
+            self.trigger.reset()
+            self.__reset_alarms__()
+            self.__on_new_segment__(plot)
+            # only the rows since then belong to the current segment
+            batch = batch[first:]
+            received = received[first:]
+        self.clock_analysis.update(batch[:, 0], received)
+        self.__process_trigger__(batch)
+        self.__process_alarms__(plot, batch)
+
+    def __start_segment__(self, plot):
+        segment = plot.new_segment()
+        self.event_resets.clear()
+        if segment is not None:
+            self.__log_segment__(segment)
+            self.__reset_alarms__()
+            # the events until the first sample belong to the new run
+            self.last_sample_time = np.nan
+            self.__on_new_segment__(plot)
+
+    def __on_new_segment__(self, plot):
+        self.event_segment = len(plot.segments) + 1
+        if self.event_markers is not None:
+            self.event_markers.refresh()
+
+    def __process_alarms__(self, plot, batch, rules=None, markers=None):
+        """Evaluates the alarm rules (those of the main plot by default) over a batch of a plot"""
+        if rules is None:
+            rules, markers = self.alarm_rules, self.alarm_markers
+        if rules is None or not len(batch):
+            return
+        events = rules.process(plot.trace_names[:1] + plot.column_names(), batch)
+        if not len(events):
+            return
+        markers.add(events)
+        # a chattering rule must not flood the log
+        for event in events[:10]:
+            self.log(str(event))
+        if len(events) > 10:
+            self.log("... and {} more alarm events".format(len(events) - 10))
+
+    def __reset_alarms__(self):
+        if self.alarm_rules is not None:
+            self.alarm_rules.reset()
+            self.alarm_markers.clear()
+
+    def __add_alarm_rule__(self):
+        definition, ok = QInputDialog.getText(
+            self,
+            "Alarm Rule",
+            "[name:] channel > level [hysteresis h] [for duration], or rate(channel) > level, nan(channel), stuck(channel):",
+        )
+        if not ok or not definition.strip():
+            return
+        from alarms import AlarmMarkers, AlarmRule, AlarmRules
+
+        try:
+            rule = AlarmRule(definition)
+        except ValueError as e:
+            self.log("Invalid alarm rule: {}".format(e))
+            return
+        if self.alarm_rules is None:
+            self.alarm_rules = AlarmRules()
+            self.alarm_markers = AlarmMarkers(self.plot_page.plot)
+        self.alarm_rules.add(rule)
+        self.log("Added alarm rule '{}'".format(rule.definition))
+        if rule.channel not in self.plot_page.plot.column_names():
+            self.log("Warning: there is no channel '{}' yet".format(rule.channel))
+
+    def __remove_alarm_rule__(self):
+        if self.alarm_rules is None or not len(self.alarm_rules):
+            self.log("No alarm rules to remove")
+            return
+        names = [rule.name for rule in self.alarm_rules.rules]
+        name, ok = QInputDialog.getItem(self, "Alarm Rule", "Rule:", names, 0, False)
+        if ok:
+            self.alarm_rules.remove(name)
+            self.log("Removed alarm rule '{}'".format(name))
+
+    def __log_alarm_counts__(self):
+        if self.alarm_rules is None or not len(self.alarm_rules):
+            self.log("No alarm rules")
+            return
+        self.log("Alarms raised:\n" + "\n".join(self.alarm_rules.summary()))
+
+    def __log_segment__(self, segment):
+        self.log("Device restarted, kept the previous run as {}".format(segment.describe()))
+
+    def __select_segments__(self):
+        plot = self.plot_page.plot
+        if not len(plot.segments):
+            self.log("No earlier segments, a segment is kept each time the device restarts")
+            return
+        choices = ["None", "Previous", "All"] + [segment.describe() for segment in plot.segments]
+        overlays = ["none", "previous", "all"] + [segment.number for segment in plot.segments]
+        current = overlays.index(plot.segment_overlay) if plot.segment_overlay in overlays else 0
+        choice, ok = QInputDialog.getItem(self, "Segments", "Draw under the current segment:", choices, current, False)
+        if ok:
+            plot.set_segment_overlay(overlays[choices.index(choice)])
+            if self.event_markers is not None:
+                self.event_markers.refresh()
 
     def __open_close_port__(self):
-        if self.serial_port and self.serial_port.is_open:
+        if self.port_session and self.port_session.is_open:
             self.__close_port()
         else:
             self.__reopen_serial_port__()
 
     def __close_port(self):
-        self.log("Closing serial port")
-        self.run_serial_port_thread = False
-        if self.serial_port:
-            try:
-                self.serial_port.close()
-                self.log("Closed serial port")
-            except Exception as e:
-                self.log(str(e))
-        self.__change_menubar_text_open_close_port__()
-
-    def __open_port(self):
-        self.log("Opening serial port")
-        if self.serial_port:
-            try:
-                self.serial_port.open()
-                self.log("Opened serial port")
-            except Exception as e:
-                self.log(str(e))
+        if self.port_session:
+            self.log("Closing serial port")
+            self.port_session.stop()
         self.__change_menubar_text_open_close_port__()
 
     def __change_menubar_text_open_close_port__(self):
-        if self.serial_port:
+        if self.port:
             self.openClosePort.setDisabled(False)
-            if self.serial_port.is_open:
+            if self.port_session and self.port_session.is_open:
                 self.openClosePort.setText("Close " + str(self.port))
                 self.openClosePort.setToolTip("Close serial port")
             else:
@@ -656,8 +1659,168 @@ class MainWindow(QMainWindow):
             self.log("Clear plot on reset is disabled")
             self.auto_clear_plot_on_header_change = False
 
+    def __on_show_spectrum_action__(self):
+        self.plot_page.set_spectrum_visible(self.showSpectrumAction.isChecked())
+
+    def __on_show_statistics_action__(self):
+        self.plot_page.set_statistics_visible(self.showStatisticsAction.isChecked())
+
+    def __on_show_crosshair_action__(self):
+        self.plot_page.set_crosshair_visible(self.showCrosshairAction.isChecked())
+
+    def __on_show_measurement_action__(self):
+        self.plot_page.set_measurement_visible(self.showMeasurementAction.isChecked())
+
+    def __on_stage_timers_action__(self):
+        if not PROFILER.capturing:
+            PROFILER.enabled = self.stageTimersAction.isChecked()
+
+    def __log_stage_timings__(self):
+        self.log(PROFILER.summary())
+
+    def __capture_trace__(self):
+        if PROFILER.capturing:
+            self.log("A trace is already being captured")
+            return
+        seconds, ok = QInputDialog.getInt(self, "Capture Trace", "Seconds:", 10, 1, 600)
+        if not ok:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, caption="Save trace", filter="Trace (*.json)")
+        if not path:
+            return
+        profile_path = None
+        if self.captureCProfileAction.isChecked():
+            profile_path = os.path.splitext(path)[0] + ".prof"
+        PROFILER.start_capture(cprofile=profile_path is not None)
+        self.log("Capturing a trace for {} s".format(seconds))
+        QtCore.QTimer.singleShot(seconds * 1000, functools.partial(self.__finish_capture__, path, profile_path))
+
+    def __finish_capture__(self, path, profile_path):
+        capture = PROFILER.stop_capture(profile_path)
+        PROFILER.enabled = self.stageTimersAction.isChecked()
+        if profile_path:
+            self.log("Saved the cProfile statistics to '{}'".format(profile_path))
+        if capture is None:
+            return
+        if capture.dropped:
+            self.log("The trace is missing the last {} steps (too many)".format(capture.dropped))
+        self.log(PROFILER.summary())
+        self.__start_export__(path, functools.partial(write_trace, capture), len(capture))
+
+    def __on_publish_samples_action__(self):
+        if not self.publishSamplesAction.isChecked():
+            if self.fanout_server is not None:
+                self.fanout_server.stop()
+                self.fanout_server = None
+                self.log("Stopped publishing samples")
+            return
+        from fanout_server import FanoutServer
+
+        try:
+            self.fanout_server = FanoutServer()
+        except OSError as e:
+            self.log("Could not publish samples: {}".format(e))
+            self.publishSamplesAction.setChecked(False)
+            return
+        self.fanout_server.start()
+        self.log("Publishing samples on {}".format(self.fanout_server.address))
+        # announce the tagged streams right away; the main plot's header may
+        # still be that of a tag with no data yet, so it comes with a batch
+        for stream in self.tagged_streams.values():
+            self.__publish__(stream.tag, stream.page.plot, [])
+
+    def __on_show_timing_action__(self):
+        visible = self.showTimingAction.isChecked()
+        if self.clock_view is None:
+            if not visible:
+                return
+            from clock_analysis import ClockView
+
+            self.clock_view = ClockView(self.clock_analysis, self.font)
+        if visible:
+            self.tabs.setCurrentIndex(self.tabs.addTab(self.clock_view, "Timing"))
+        else:
+            self.tabs.removeTab(self.tabs.indexOf(self.clock_view))
+        self.clock_view.set_visible(visible)
+
     def __save_received_data_to_file__(self):
         name = QFileDialog.getSaveFileName(self, caption="Save file", filter="*.txt;;*")
         if len(name) > 0 and name[0] != '':
-            with open(name[0], "w") as file:
-                file.write(self.output_editor.toPlainText())
+            end = self.output_view.store.size
+
+            def write(file, job):
+                self.output_view.write_to(file, end, job.progress)
+
+            self.__start_export__(name[0], write, end, binary=True)
+
+    def __export_plot_data__(self):
+        fmts = ["CSV (*.csv)", "Columnar (*{})".format(exporter.COLUMNAR_EXTENSION)]
+        path, selected = QFileDialog.getSaveFileName(self, caption="Export plot data", filter=";;".join(fmts))
+        if not path:
+            return
+        ranges = ["Whole history", "Visible range"]
+        selected_range, ok = QInputDialog.getItem(self, "Export Plot Data", "Rows:", ranges, 0, False)
+        if not ok:
+            return
+        x_range = None
+        if selected_range == ranges[1]:
+            x_range, _ = self.__export_page__().plot.plot_item.viewRange()
+        try:
+            snapshot = exporter.PlotSnapshot(self.__export_page__().plot, x_range)
+        except ValueError as e:
+            self.log(str(e))
+            return
+
+        columnar = selected == fmts[1] or path.endswith(exporter.COLUMNAR_EXTENSION)
+        if columnar:
+            write = functools.partial(exporter.write_columnar, snapshot)
+        else:
+            write = functools.partial(exporter.write_csv, snapshot)
+        self.__start_export__(path, write, len(snapshot), binary=columnar)
+
+    def __export_plot_image__(self):
+        fmts = ["PNG (*.png)", "SVG (*.svg)"]
+        path, selected = QFileDialog.getSaveFileName(self, caption="Export plot image", filter=";;".join(fmts))
+        if not path:
+            return
+        width, ok = QInputDialog.getInt(self, "Export Plot Image", "Width (px):", 1920, 100, 20000)
+        if not ok:
+            return
+        height, ok = QInputDialog.getInt(self, "Export Plot Image", "Height (px):", 1080, 100, 20000)
+        if not ok:
+            return
+        import image_export
+
+        snapshot = image_export.ImageSnapshot(self.__export_page__().plot, self.font)
+        svg = selected == fmts[1] or path.lower().endswith(".svg")
+        write = image_export.write_svg if svg else image_export.write_png
+        self.__start_export__(
+            path, functools.partial(write, snapshot, width, height), len(snapshot.traces), binary=True
+        )
+
+    def __start_export__(self, path, write, total, binary=False):
+        if self.export_job is not None and self.export_job.running:
+            self.log("An export is already running")
+            return
+        self.export_job = exporter.ExportJob(
+            path, write, total, binary, self.export_progress.emit, self.export_finished.emit
+        )
+        self.export_progress_dialog = QProgressDialog("Exporting to '{}'".format(path), "Cancel", 0, 1000, self)
+        self.export_progress_dialog.setWindowModality(QtCore.Qt.NonModal)
+        self.export_progress_dialog.canceled.connect(self.export_job.cancel)
+        self.log("Exporting to '{}'".format(path))
+        self.export_job.start()
+
+    def __on_export_progress__(self, fraction):
+        if self.export_progress_dialog is not None:
+            self.export_progress_dialog.setValue(int(fraction * 1000))
+
+    def __on_export_finished__(self, path, error):
+        if self.export_progress_dialog is not None:
+            self.export_progress_dialog.canceled.disconnect()
+            self.export_progress_dialog.close()
+            self.export_progress_dialog = None
+        if error:
+            self.log("Export to '{}' failed: {}".format(path, error))
+        else:
+            self.log("Exported to '{}'".format(path))
@@ -0,0 +1,186 @@
+import os
+import socket
+import sys
+import threading
+import time
+
+from port_session import PortSession
+
+# address prefixes of the network sources, e.g. tcp://192.168.4.1:3333
+TCP_CLIENT = "tcp://"
+TCP_SERVER = "tcp-listen://"
+UDP = "udp://"
+SCHEMES = [TCP_CLIENT, TCP_SERVER, UDP]
+
+
+def is_network_address(address):
+    return isinstance(address, str) and address.startswith(tuple(SCHEMES))
+
+
+def parse_address(address):
+    """
+    :param in string address: e.g. `tcp://192.168.4.1:3333` or `udp://:3333`
+    :returns: (scheme, host, port)
+    :raises ValueError: if the address is not a network address
+    """
+    for scheme in SCHEMES:
+        if address.startswith(scheme):
+            host, separator, port = address[len(scheme) :].rpartition(":")
+            if not separator or not port.isdigit():
+                raise ValueError("Expected {}host:port, got '{}'".format(scheme, address))
+            return scheme, host.strip("[]"), int(port)
+    raise ValueError("'{}' is not a network address ({})".format(address, ", ".join(SCHEMES)))
+
+
+class NetworkSession(PortSession):
+    """
+    A :class:`PortSession` reading from the network instead of a serial port,
+    so the received bytes go through the same line framing, callbacks and
+    reconnect state machine:
+
+    - `tcp://host:port` connects to a device, reconnecting with backoff
+    - `tcp-listen://host:port` waits for a device to connect, and for the
+      next one once it disconnects
+    - `udp://host:port` receives datagrams, each holding one or more whole
+      lines (the line ending of the last one is optional)
+
+    The baud rate is ignored, and there is no DTR/RTS to reset the device.
+    """
+
+    def __init__(self, address, baudrate, on_line_callback, on_state_callback=None, **kwargs):
+        super().__init__(address, baudrate, on_line_callback, on_state_callback, **kwargs)
+        self.scheme, self.host, self.network_port = parse_address(address)
+        self.listener = None
+
+    def __open__(self):
+        if self.scheme == TCP_CLIENT:
+            connection = socket.create_connection((self.host, self.network_port), timeout=2.0)
+        elif self.scheme == TCP_SERVER:
+            connection = self.__accept__()
+        else:
+            connection = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            connection.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            connection.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+            connection.bind((self.host, self.network_port))
+        connection.settimeout(0.1)
+        return connection
+
+    def __accept__(self):
+        if self.listener is None:
+            self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.listener.bind((self.host, self.network_port))
+            self.listener.listen(1)
+            self.listener.settimeout(0.1)
+        while self.running.is_set():
+            try:
+                connection, _ = self.listener.accept()
+                return connection
+            except socket.timeout:
+                continue
+        raise OSError("stopped while waiting for a connection")
+
+    def __receive__(self):
+        try:
+            if self.scheme == UDP:
+                data = self.connection.recv(65536)
+                return data if data.endswith(b"\n") else data + b"\n"
+            data = self.connection.recv(1 << 16)
+        except socket.timeout:
+            return b""
+        if not data:
+            raise ConnectionError("connection closed by the peer")
+        return data
+
+    def __toggle_dtr_rts__(self):
+        raise OSError("a network source has no DTR/RTS")
+
+    def __run__(self, previous_thread):
+        try:
+            super().__run__(previous_thread)
+        finally:
+            if self.listener is not None:
+                self.listener.close()
+                self.listener = None
+
+
+def benchmark(address, send, samples, line):
+    """
+    Receives the lines sent by `send(count, line)`, until all `samples`
+    arrived or none did for a second (e.g. lost UDP datagrams).
+
+    :returns: (lines received, samples/s up to the last one received)
+    """
+    received = threading.Event()
+    count = [0]
+    last = [0.0]
+
+    def on_line(data, received_ns):
+        count[0] += 1
+        last[0] = time.perf_counter()
+        if count[0] == samples:
+            received.set()
+
+    if is_network_address(address):
+        session = NetworkSession(address, 0, on_line)
+    else:
+        session = PortSession(address, 115200, on_line)
+    session.start()
+    time.sleep(0.3)
+    started = time.perf_counter()
+    send(samples, line)
+    while not received.wait(1.0) and time.perf_counter() - max(last[0], started) < 1.0:
+        pass
+    session.stop()
+    session.thread.join()
+    return count[0], count[0] / max(1e-9, last[0] - started)
+
+
+if __name__ == "__main__":
+    # loopback test and benchmark, e.g. `python network_session.py 200000`:
+    # sends CSV lines to each kind of source (and to a pty, standing in for
+    # a serial port, on linux) and reports the sustained samples/s
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    line = b"12345.678,0.123456,-0.654321,1.000000\n"
+
+    def send_tcp_client(count, line):
+        with socket.create_connection(("127.0.0.1", 47001)) as sender:
+            sender.sendall(line * count)
+
+    def send_udp(count, line):
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        per_datagram = 1024 // len(line)
+        for start in range(0, count, per_datagram):
+            sender.sendto(line * min(per_datagram, count - start), ("127.0.0.1", 47002))
+            if start % (per_datagram * 64) == 0:
+                time.sleep(0.0005)
+        sender.close()
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", 47003))
+    listener.listen(1)
+
+    def send_tcp_server(count, line):
+        # the session connects to this listener as a client
+        connection, _ = listener.accept()
+        connection.sendall(line * count)
+        connection.close()
+
+    results = []
+    # tcp-listen: the session listens, the sender connects to it
+    results.append(("tcp-listen", benchmark("tcp-listen://127.0.0.1:47001", send_tcp_client, samples, line)))
+    results.append(("tcp", benchmark("tcp://127.0.0.1:47003", send_tcp_server, samples, line)))
+    results.append(("udp", benchmark("udp://127.0.0.1:47002", send_udp, samples, line)))
+    if sys.platform.startswith("linux"):
+        master, slave = os.openpty()
+
+        def send_pty(count, line):
+            data = line * count
+            for start in range(0, len(data), 4096):
+                os.write(master, data[start : start + 4096])
+
+        results.append(("pty", benchmark(os.ttyname(slave), send_pty, samples, line)))
+    listener.close()
+    for name, (count, rate) in results:
+        print("{:>10}: {:>8} / {} lines, {:>12,.0f} samples/s".format(name, count, samples, rate))
@@ -0,0 +1,194 @@
+import datetime
+import re
+import time
+
+import numpy as np
+from PyQt5 import QtGui
+from PyQt5.QtCore import pyqtSignal, Qt
+from PyQt5.QtWidgets import (
+    QWidget,
+    QVBoxLayout,
+    QHBoxLayout,
+    QLineEdit,
+    QCheckBox,
+    QLabel,
+    QListWidget,
+    QListWidgetItem,
+    QPlainTextEdit,
+    QSplitter,
+)
+
+from line_store import LineStore
+
+
+def format_timestamp(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%H:%M:%S.%f")[:-3]
+
+
+class OutputView(QWidget):
+    """
+    The Output tab: every received line is kept in a :class:`LineStore`, and
+    the editor only ever holds a window of it - the latest lines while
+    following the stream, or the lines around a search hit.
+    """
+
+    # emitted with the plot x position of a line the user selected
+    position_selected = pyqtSignal(float)
+
+    def __init__(self, font, stylesheet, window_lines=5000, parent=None):
+        super().__init__(parent)
+        self.store = LineStore()
+        self.window_lines = window_lines
+        self.follow = True
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Search output (Enter)")
+        self.search_edit.returnPressed.connect(self.search)
+        self.regex_check = QCheckBox("Regex")
+        self.case_check = QCheckBox("Match Case")
+        self.time_edit = QLineEdit()
+        self.time_edit.setPlaceholderText("Jump to time (HH:MM:SS)")
+        self.time_edit.returnPressed.connect(self.jump_to_time)
+        self.follow_check = QCheckBox("Follow")
+        self.follow_check.setChecked(True)
+        self.follow_check.toggled.connect(self.set_follow)
+        self.status = QLabel()
+
+        bar = QHBoxLayout()
+        bar.setContentsMargins(0, 0, 0, 0)
+        bar.addWidget(self.search_edit, 3)
+        bar.addWidget(self.regex_check)
+        bar.addWidget(self.case_check)
+        bar.addWidget(self.time_edit, 1)
+        bar.addWidget(self.follow_check)
+        bar.addWidget(self.status)
+
+        self.editor = QPlainTextEdit()
+        self.editor.setReadOnly(True)
+        self.editor.setFont(font)
+        self.editor.setStyleSheet(stylesheet)
+        self.editor.setMaximumBlockCount(window_lines)
+
+        self.results = QListWidget()
+        self.results.setFont(font)
+        self.results.itemActivated.connect(self.__on_result_activated__)
+        self.results.itemClicked.connect(self.__on_result_activated__)
+        self.results.hide()
+
+        splitter = QSplitter(Qt.Horizontal)
+        splitter.addWidget(self.editor)
+        splitter.addWidget(self.results)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(bar)
+        layout.addWidget(splitter)
+
+        self.setStyleSheet(
+            "QLineEdit, QListWidget {background: rgb(27,27,28); color: white; border: 1px solid gray;}"
+            "QCheckBox, QLabel {color: white;}"
+        )
+
+    def append(self, text, timestamp, position=np.nan):
+        self.store.append_text(text, timestamp, position)
+        if self.follow:
+            if len(text) > 100 * self.window_lines:
+                # e.g. part of an imported file: only the lines the editor
+                # keeps are worth inserting
+                text = "\n".join(text.rsplit("\n", self.window_lines)[1:])
+            cursor = self.editor.textCursor()
+            cursor.movePosition(QtGui.QTextCursor.End)
+            cursor.insertText(text + "\n")
+            self.editor.setTextCursor(cursor)
+            self.editor.ensureCursorVisible()
+
+    def clear(self):
+        self.store.clear()
+        self.editor.clear()
+        self.results.clear()
+        self.results.hide()
+        self.status.clear()
+
+    def set_follow(self, follow):
+        self.follow = follow
+        if self.follow_check.isChecked() != follow:
+            self.follow_check.setChecked(follow)
+        if follow:
+            # show the latest lines again
+            end = len(self.store)
+            self.__show_window__(end - self.window_lines, end)
+            self.editor.moveCursor(QtGui.QTextCursor.End)
+
+    def __show_window__(self, start, end):
+        start = max(0, start)
+        self.editor.setPlainText("\n".join(self.store.lines(start, end)))
+        return start
+
+    def show_line(self, index):
+        """Stops following and shows the lines around line `index`"""
+        if index < 0 or index >= len(self.store):
+            return
+        self.set_follow(False)
+        half = self.window_lines // 2
+        start = self.__show_window__(index - half, index + half)
+        block = self.editor.document().findBlockByNumber(index - start)
+        cursor = QtGui.QTextCursor(block)
+        cursor.select(QtGui.QTextCursor.LineUnderCursor)
+        self.editor.setTextCursor(cursor)
+        self.editor.centerCursor()
+
+        position = self.store.positions.view()[index]
+        if np.isfinite(position):
+            self.position_selected.emit(float(position))
+
+    def search(self):
+        pattern = self.search_edit.text()
+        self.results.clear()
+        if not pattern:
+            self.results.hide()
+            self.status.clear()
+            return
+        started = time.perf_counter()
+        try:
+            hits = self.store.search(
+                pattern,
+                regex=self.regex_check.isChecked(),
+                ignore_case=not self.case_check.isChecked(),
+            )
+        except re.error as e:
+            self.status.setText("Invalid regex: {}".format(e))
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+
+        timestamps = self.store.timestamps.view()
+        for index in hits:
+            text = "{}  {}  {}".format(index + 1, format_timestamp(timestamps[index]), self.store.line(index)[:200])
+            item = QListWidgetItem(text)
+            item.setData(Qt.UserRole, index)
+            self.results.addItem(item)
+        self.results.setVisible(len(hits) > 0)
+        self.status.setText(
+            "{}{} matches in {} lines ({:.1f} ms)".format(
+                len(hits), "+" if len(hits) >= 1000 else "", len(self.store), elapsed_ms
+            )
+        )
+
+    def __on_result_activated__(self, item):
+        self.show_line(item.data(Qt.UserRole))
+
+    def jump_to_time(self):
+        if not len(self.store):
+            return
+        text = self.time_edit.text().strip()
+        try:
+            parsed = datetime.datetime.strptime(text, "%H:%M:%S.%f" if "." in text else "%H:%M:%S")
+        except ValueError:
+            self.status.setText("Expected a time like 13:37:00 or 13:37:00.250")
+            return
+        # the time is on the day the capture was received
+        day = datetime.datetime.fromtimestamp(self.store.timestamps.view()[0]).date()
+        timestamp = datetime.datetime.combine(day, parsed.time()).timestamp()
+        self.show_line(self.store.index_of_time(timestamp))
+
+    def write_to(self, file, end=None, progress=None):
+        self.store.write_to(file, end, progress)
@@ -0,0 +1,86 @@
+import collections
+import os
+
+# memory budget (MB) of the plots of all tabs, see PageCache
+BUDGET_VARIABLE = "UART_SERIAL_PLOTTER_MEMORY_BUDGET_MB"
+DEFAULT_BUDGET_MB = 1024
+
+
+class PageCache(object):
+    """
+    The plot pages of the opened files, one per path, within a memory budget
+    shared with the other tabs: once their samples take more than the budget,
+    the pages used least recently are evicted (see :meth:`plot.Plot.evict`)
+    until they fit. An evicted page keeps its samples in its spill files and
+    only their overviews in memory, and is restored from them when it is
+    used again, without parsing the file again.
+    """
+
+    def __init__(self, budget_bytes=None):
+        if budget_bytes is None:
+            budget_bytes = PageCache.load_budget()
+        self.budget_bytes = budget_bytes
+        # path -> page, least recently used first
+        self.pages = collections.OrderedDict()
+
+    @staticmethod
+    def load_budget():
+        """The budget set by `UART_SERIAL_PLOTTER_MEMORY_BUDGET_MB`, or the default one, in bytes"""
+        value = os.environ.get(BUDGET_VARIABLE)
+        if value:
+            try:
+                return int(float(value) * (1 << 20))
+            except ValueError:
+                print("Invalid memory budget '{}', using {} MB".format(value, DEFAULT_BUDGET_MB))
+        return DEFAULT_BUDGET_MB << 20
+
+    def __contains__(self, page):
+        return page in self.pages.values()
+
+    def get(self, path):
+        return self.pages.get(path)
+
+    def path_of(self, page):
+        for path, cached in self.pages.items():
+            if cached is page:
+                return path
+        return None
+
+    def add(self, path, page):
+        self.pages[path] = page
+
+    def remove(self, page):
+        path = self.path_of(page)
+        if path is not None:
+            del self.pages[path]
+
+    def use(self, page):
+        """Makes a page the most recently used one, restoring it if it was evicted"""
+        path = self.path_of(page)
+        if path is not None:
+            self.pages.move_to_end(path)
+            page.plot.restore()
+
+    def memory_bytes(self):
+        return sum(page.plot.memory_bytes() for page in self.pages.values())
+
+    def enforce(self, keep=(), other_bytes=0):
+        """
+        Evicts pages, least recently used first, until all of them (and
+        `other_bytes` of the other tabs) fit in the budget
+
+        :param in keep: pages not to evict (e.g. the one shown, or importing)
+        :returns: list of the pages evicted
+        """
+        used = self.memory_bytes() + other_bytes
+        evicted = []
+        for page in list(self.pages.values()):
+            if used <= self.budget_bytes:
+                break
+            size = page.plot.memory_bytes()
+            if page in keep or not size:
+                continue
+            page.plot.evict()
+            used -= size
+            evicted.append(page)
+        return evicted
@@ -5,6 +5,7 @@ from PyQt5.QtWidgets import (
     QVBoxLayout,
     QVBoxLayout,
     QSizePolicy,
+    QSplitter,
 )
 from PyQt5.QtCore import pyqtSignal, pyqtSlot, QSize, Qt
 
@@ -69,7 +70,53 @@ class PlotPage(BasePage):
         self.previousEnabled = False
 
         self.plot = Plot()
-        self.layout.addWidget(self.plot.canvas)
+        # the statistics table and the spectrum are only created the first
+        # time they are shown, most sessions never open them
+        self.statistics_table = None
+        self.spectrum = None
+        self.cursors = None
+
+        self.splitter = QSplitter(Qt.Horizontal)
+        self.splitter.addWidget(self.plot.canvas)
+        self.layout.addWidget(self.splitter)
+
+    def set_statistics_visible(self, visible):
+        if self.statistics_table is None:
+            if not visible:
+                return
+            from statistics_table import StatisticsTable
+
+            self.statistics_table = StatisticsTable(self.plot)
+            self.splitter.addWidget(self.statistics_table)
+        self.statistics_table.set_visible(visible)
+
+    def set_spectrum_visible(self, visible):
+        if self.spectrum is None:
+            if not visible:
+                return
+            from spectrum import Spectrum
+
+            self.spectrum = Spectrum(self.plot)
+            self.layout.addWidget(self.spectrum.canvas)
+        self.spectrum.set_visible(visible)
+
+    def __get_cursors__(self):
+        if self.cursors is None:
+            from cursors import Cursors
+
+            self.cursors = Cursors(self.plot)
+            self.layout.addWidget(self.cursors.readout)
+        return self.cursors
+
+    def set_crosshair_visible(self, visible):
+        if self.cursors is None and not visible:
+            return
+        self.__get_cursors__().set_crosshair_visible(visible)
+
+    def set_measurement_visible(self, visible):
+        if self.cursors is None and not visible:
+            return
+        self.__get_cursors__().set_measurement_visible(visible)
 
     @pyqtSlot()
     def onEnter(self):
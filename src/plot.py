@@ -1,11 +1,72 @@
+import datetime
+from time import perf_counter_ns
+
+import numpy as np
 import pyqtgraph as pg
+from PyQt5 import QtCore
+
+from channel_stats import Statistics
+from profiler import PROFILER
+from sample_history import CHUNK_SAMPLES, Column, SealJob, SpillFile, TraceHistory
+from segments import ResetDetector, Segment
+
+
+class ShowWatcher(QtCore.QObject):
+    """Calls `callback` whenever the watched widget is shown, e.g. when its tab is selected"""
+
+    def __init__(self, widget, callback):
+        super(ShowWatcher, self).__init__(widget)
+        self.callback = callback
+        widget.installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if event.type() == QtCore.QEvent.Show:
+            self.callback()
+        return False
 
 
 class Plot(object):
+    # samples of each trace kept in memory, older ones are spilled to disk
+    MEMORY_SAMPLES = 1 << 21
+    # most samples of spilled history drawn one by one, beyond that the
+    # overviews of the chunks are drawn
+    HISTORY_POINTS = 1 << 20
+    # about the memory of a sample of a trace: its x and y list entries and
+    # float objects, and its share of the range index
+    SAMPLE_BYTES = 96
+
     def __init__(self, header=None, data=None):
 
         self.traces = dict()
         self.data = dict()
+        # trace name -> TraceHistory of the samples spilled from `data`
+        self.history = dict()
+        # trace name -> SpillFile of its histories, shared by the segments
+        self.spill_files = dict()
+        # trace name -> SealJob writing its oldest samples, still in `data`
+        self.sealing = dict()
+        # trace name -> (chunks, detail) of the history it shows, and the arrays
+        self.shown_history = dict()
+        # names of the traces whose data changed while they (or the plot)
+        # were hidden, drawn once they are shown again
+        self.stale = set()
+        # items drawn over the traces (e.g. cursors), kept across `clear`
+        self.overlays = []
+        # earlier runs of the device (see `new_segment`), oldest first, and
+        # which of them are drawn under the current one: "none", "previous",
+        # "all" or the number of one segment
+        self.segments = []
+        self.segment_overlay = "previous"
+        # (segment number, trace name) -> trace drawn for an earlier segment
+        self.segment_traces = dict()
+        self.segment_started = datetime.datetime.now()
+        self.segment_rows = 0
+        self.reset_detector = ResetDetector()
+        self.statistics = Statistics()
+        self.derived = []
+        # trace name -> FilterChain, the output is shown as its own trace
+        self.filters = dict()
+        self.show_raw = True
         self.trace_names = []
         self.canvas = pg.PlotWidget()
         self.plot = None
@@ -13,6 +74,8 @@ class Plot(object):
         self.canvas.getAxis("left").setTextPen("w")
         self.canvas.getAxis("bottom").setTextPen("w")
         self.plot_item = self.canvas.getPlotItem()
+        self.plot_item.sigXRangeChanged.connect(self.__on_x_range_changed__)
+        self.show_watcher = ShowWatcher(self.canvas, self.__catch_up__)
 
         if header:
             self.set_header(header)
@@ -22,14 +85,27 @@ class Plot(object):
         self.legend = self.canvas.addLegend()
 
     def get_pen(self, index):
-        return pg.mkPen(index, len(self.trace_names))
+        return pg.mkPen(index, len(self.trace_names) + len(self.derived) + len(self.filters))
+
+    def column_names(self):
+        """Returns the names of the y columns of a batch, received and derived"""
+        return self.trace_names[1:] + [channel.name for channel in self.derived]
+
+    def channel_names(self):
+        """Returns the names of all y traces, including filtered ones"""
+        names = self.column_names()
+        return names + [Plot.filtered_name(name) for name in self.filters if name in names]
+
+    @staticmethod
+    def filtered_name(name):
+        return "{} (filtered)".format(name)
 
     def set_header(self, header_names):
         self.trace_names = header_names
         # the first trace is the x axis, so take it out and use it to set the x
         # axis label
         self.plot_item.setLabel("bottom", text=self.trace_names[0])
-        for i, name in enumerate(self.trace_names[1:]):
+        for i, name in enumerate(self.channel_names()):
             if name in self.traces:
                 pass
             else:
@@ -37,23 +113,360 @@ class Plot(object):
                     pen=self.get_pen(i),
                     name=name,
                 )
+                self.__watch__(name)
+        self.set_show_raw(self.show_raw)
 
-    def update_data(self, data):
-        for name in self.trace_names:
+    def add_derived_channel(self, channel):
+        """
+        :param in DerivedChannel channel: channel computed from the header
+            columns for every batch of data from now on
+        """
+        self.derived = [c for c in self.derived if c.name != channel.name]
+        self.derived.append(channel)
+        if len(self.trace_names):
+            self.set_header(self.trace_names)
+
+    def add_filter(self, name, filter):
+        """
+        :param in string name: trace to filter
+        :param in Filter filter: filter appended to the chain of the trace, the
+            filtered trace restarts from the next batch
+        """
+        from filters import FilterChain
+
+        if name not in self.filters:
+            self.filters[name] = FilterChain()
+        self.filters[name].append(filter)
+        self.filters[name].reset()
+        filtered = Plot.filtered_name(name)
+        self.forget(filtered)
+        self.data[filtered] = {"x": [], "y": []}
+        if len(self.trace_names):
+            self.set_header(self.trace_names)
+
+    def remove_filters(self, name):
+        self.filters.pop(name, None)
+        filtered = Plot.filtered_name(name)
+        if filtered in self.traces:
+            trace = self.traces.pop(filtered)
+            self.legend.removeItem(trace)
+            self.plot_item.removeItem(trace)
+        self.forget(filtered)
+        if name in self.traces:
+            self.traces[name].setVisible(True)
+
+    def clear(self):
+        """Removes the header, traces and data, keeping math channels and filters"""
+        self.plot_item.clear()
+        for item in self.overlays:
+            self.plot_item.addItem(item, ignoreBounds=True)
+        self.legend.clear()
+        self.traces = {}
+        self.trace_names = []
+        self.data = {}
+        self.__wait_for_spills__(attach=False)
+        for history in self.history.values():
+            history.close()
+        self.history = {}
+        self.shown_history = {}
+        self.stale = set()
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+        for file in self.spill_files.values():
+            file.close()
+        self.spill_files = {}
+        self.segment_traces = {}
+        self.segment_started = datetime.datetime.now()
+        self.segment_rows = 0
+        self.reset_detector.clear()
+        self.statistics.clear()
+        self.reset_filters()
+
+    def forget(self, name):
+        """Drops the data, history and statistics of a trace"""
+        self.data.pop(name, None)
+        self.statistics.channels.pop(name, None)
+        self.shown_history.pop(name, None)
+        self.stale.discard(name)
+        job = self.sealing.pop(name, None)
+        if job is not None:
+            job.wait()
+        history = self.history.pop(name, None)
+        if history is not None:
+            history.close()
+
+    def column(self, name, index):
+        """
+        Returns the x (`index` 0) or y (1) values of a trace, spilled and in
+        memory, as a :class:`sample_history.Column`
+        """
+        return Column(self.history.get(name), self.data[name][("x", "y")[index]], index)
+
+    def add_overlay(self, item):
+        """Draws `item` over the traces, without affecting the auto range"""
+        self.overlays.append(item)
+        self.plot_item.addItem(item, ignoreBounds=True)
+
+    def sample_at(self, name, x_value):
+        """
+        Returns (x, y) of the sample of a trace closest to `x_value`, spilled
+        or in memory, None if it has none: a binary search of the time column.
+        """
+        if name not in self.data:
+            return None
+        x = self.column(name, 0)
+        if not len(x):
+            return None
+        index = x.search(x_value)
+        candidates = x.read(max(0, index - 1), index + 1)
+        if index > 0 and (len(candidates) == 1 or x_value - candidates[0] <= candidates[1] - x_value):
+            index -= 1
+        return x.read(index, index + 1)[0], self.column(name, 1).read(index, index + 1)[0]
+
+    def range_statistics(self, name, x_min, x_max):
+        """Returns the statistics of a trace over x_min <= x <= x_max, see :meth:`channel_stats.ChannelStatistics.visible`"""
+        channel = self.statistics.channels.get(name)
+        if channel is None:
+            return None
+        return channel.visible(x_min, x_max, self.history.get(name))
+
+    def reset_filters(self):
+        for chain in self.filters.values():
+            chain.reset()
+
+    def set_show_raw(self, show_raw):
+        """Shows the raw traces alongside their filtered traces, or hides them"""
+        self.show_raw = show_raw
+        for name in self.filters:
+            if name in self.traces:
+                self.traces[name].setVisible(show_raw)
+
+    def __evaluate_derived__(self, batch):
+        """Appends the derived channels as extra columns of the batch"""
+        if not len(self.derived):
+            return batch
+        columns = {name: batch[:, i] for i, name in enumerate(self.trace_names)}
+        derived = []
+        for channel in self.derived:
+            if not channel.columns.issubset(columns):
+                values = np.full(len(batch), np.nan)
+            else:
+                values = channel(columns, len(batch))
+            columns[channel.name] = values
+            derived.append(values)
+        return np.column_stack([batch] + derived)
+
+    def update_data(self, data, render=True):
+        """
+        :param in data: rows of [time, trace values...] matching the header
+        :param in bool render: update the traces, False when more batches
+            follow right away (e.g. importing a file), see :meth:`render`
+        :returns: numpy array of the rows, with the derived channels appended
+            as extra columns
+        """
+        batch = np.asarray(data, dtype=float).reshape(len(data), len(self.trace_names))
+        batch = self.__evaluate_derived__(batch)
+
+        # the time column going far back means the device restarted: the
+        # rows from there on start a new segment
+        resets = self.reset_detector.reset_rows(batch[:, 0])
+        for part, rows in enumerate(np.split(batch, resets)):
+            if part:
+                self.__archive_segment__()
+            self.__append__(rows)
+
+        if render:
+            self.render(len(batch))
+        return batch
+
+    def __append__(self, batch):
+        """Appends rows (with the derived channels) to the current segment"""
+        names = self.column_names()
+        for name in self.channel_names():
             # initialize the data for this trace
             if name not in self.data:
                 self.data[name] = {"x": [], "y": []}
 
-        for row in data:
-            time = row[0]
-            # skip the first value (since we assume it is time)
-            for i in range(1, len(self.trace_names)):
-                self.data[self.trace_names[i]]["x"].append(time)
-                self.data[self.trace_names[i]]["y"].append(row[i])
+        if len(batch):
+            self.segment_rows += len(batch)
+            time = batch[:, 0].tolist()
+            # skip the first column (since we assume it is time)
+            for i, name in enumerate(names, start=1):
+                self.data[name]["x"].extend(time)
+                self.data[name]["y"].extend(batch[:, i].tolist())
+                # update the running statistics with only the new batch
+                self.statistics.update(name, batch[:, 0], batch[:, i])
 
-        # now actually plot the data
-        for i, name in enumerate(self.trace_names[1:]):
-            self.set_plotdata(name, self.data[name]["x"], self.data[name]["y"])
+            # run the filters with the state carried over from the last batch
+            for name, chain in self.filters.items():
+                if name not in names:
+                    continue
+                x, y = chain.process(batch[:, 0], batch[:, names.index(name) + 1])
+                filtered = Plot.filtered_name(name)
+                self.data[filtered]["x"].extend(x.tolist())
+                self.data[filtered]["y"].extend(y.tolist())
+                self.statistics.update(filtered, x, y)
+
+        # dropping the samples of a spilled chunk from memory takes some
+        # time, do it for one trace per batch
+        attach = True
+        for name in self.channel_names():
+            if self.__spill__(name, attach):
+                attach = False
+
+    def new_segment(self):
+        """
+        Archives the samples received so far as a :class:`segments.Segment`
+        and starts the traces over, e.g. when the device restarted. Nothing
+        happens if no rows were received since the segment started.
+        """
+        # the next rows start the new segment, whatever their time
+        self.reset_detector.clear()
+        return self.__archive_segment__()
+
+    def __archive_segment__(self):
+        """:meth:`new_segment`, at a restart found in the rows themselves"""
+        if not self.segment_rows:
+            return None
+        history = self.history
+        self.__seal__()
+        segment = Segment(
+            len(self.segments) + 1,
+            list(self.trace_names),
+            history,
+            self.statistics,
+            self.segment_started,
+            self.segment_rows,
+        )
+        self.segments.append(segment)
+
+        self.data = {name: {"x": [], "y": []} for name in self.data}
+        self.history = {}
+        self.shown_history = {}
+        self.statistics = Statistics()
+        self.reset_filters()
+        self.segment_started = datetime.datetime.now()
+        self.segment_rows = 0
+        for trace in self.traces.values():
+            trace.setData([], [])
+        self.__show_segments__()
+        return segment
+
+    def __seal__(self):
+        """Spills all the samples in memory to the history, leaving the traces' memory empty"""
+        self.__wait_for_spills__()
+        for name, data in self.data.items():
+            channel = self.statistics.channels.get(name)
+            if channel is not None and len(channel.index):
+                # the index holds the same samples, already as arrays
+                x, y = channel.index.x.view(), channel.index.y.view()
+            else:
+                x, y = data["x"], data["y"]
+            if len(x):
+                if name not in self.history:
+                    self.history[name] = TraceHistory(self.__spill_file__(name))
+                self.history[name].seal(x, y)
+            if channel is not None:
+                channel.index.clear()
+            data["x"] = []
+            data["y"] = []
+
+    def __spill_file__(self, name):
+        if name not in self.spill_files:
+            self.spill_files[name] = SpillFile()
+        return self.spill_files[name]
+
+    def memory_bytes(self):
+        """About the memory held by the samples of the traces, not counting the spilled ones"""
+        return sum(len(data["x"]) for data in self.data.values()) * self.SAMPLE_BYTES
+
+    def evict(self):
+        """
+        Frees the memory of the traces (e.g. of a tab in the background) by
+        spilling all their samples to the history, and draws them from the
+        chunks' overviews; :meth:`restore` loads the newest ones back.
+        """
+        self.__seal__()
+        self.shown_history = {}
+        (x_min, x_max), _ = self.plot_item.viewRange()
+        for name in self.channel_names():
+            if name in self.history:
+                self.set_plotdata(name, *self.history[name].view(x_min, x_max, 0))
+                # drawn in full once shown again
+                self.stale.add(name)
+
+    def restore(self):
+        """
+        Loads the newest samples of the traces emptied by :meth:`evict` back
+        into memory, from the history's chunks (as many as fit before spilling
+        again), and draws them.
+        """
+        for name, data in self.data.items():
+            history = self.history.get(name)
+            if history is None or len(data["x"]):
+                continue
+            x, y = history.unseal(self.MEMORY_SAMPLES + CHUNK_SAMPLES - 1)
+            data["x"] = x.tolist()
+            data["y"] = y.tolist()
+            channel = self.statistics.channels.get(name)
+            if channel is not None:
+                # only the index, the statistics already cover these samples
+                channel.index.append(x, y)
+        self.shown_history = {}
+        self.render()
+
+    def set_segment_overlay(self, overlay):
+        """
+        :param in overlay: earlier segments drawn under the current one,
+            "none", "previous", "all" or the number of one segment
+        """
+        self.segment_overlay = overlay
+        self.__show_segments__()
+
+    def shown_segments(self):
+        if self.segment_overlay == "previous":
+            return self.segments[-1:]
+        if self.segment_overlay == "all":
+            return list(self.segments)
+        return [segment for segment in self.segments if segment.number == self.segment_overlay]
+
+    def __show_segments__(self):
+        """Draws the traces of the earlier segments being overlaid, removes the others"""
+        shown = self.shown_segments()
+        wanted = set((segment.number, name) for segment in shown for name in segment.history)
+        for key in [key for key in self.segment_traces if key not in wanted]:
+            trace = self.segment_traces.pop(key)
+            self.legend.removeItem(trace)
+            self.plot_item.removeItem(trace)
+        (x_min, x_max), _ = self.plot_item.viewRange()
+        for segment in shown:
+            names = segment.trace_names[1:] + [name for name in segment.history if name not in segment.trace_names]
+            for index, name in enumerate(names):
+                if name not in segment.history:
+                    continue
+                key = (segment.number, name)
+                if key not in self.segment_traces:
+                    # the colour of the trace, faded
+                    pen = self.get_pen(index)
+                    color = pen.color()
+                    color.setAlpha(90)
+                    pen.setColor(color)
+                    self.segment_traces[key] = self.canvas.plot(pen=pen, name="{} (#{})".format(name, segment.number))
+                    self.segment_traces[key].setZValue(-1)
+                x, y = segment.view(name, x_min, x_max, self.HISTORY_POINTS)
+                self.segment_traces[key].setData(x, y)
+
+    def render(self, rows=0):
+        """Updates the traces with the data received so far"""
+        profiling = PROFILER.enabled
+        if profiling:
+            started = perf_counter_ns()
+        for name in self.channel_names():
+            if name in self.data:
+                self.__show_if_visible__(name)
+        if profiling:
+            PROFILER.record("render", started, rows)
 
     def update_raw(self, data):
         for name in self.trace_names:
@@ -68,10 +481,161 @@ class Plot(object):
                 self.data[self.trace_names[i]]["x"].append(row[i*2])
                 self.data[self.trace_names[i]]["y"].append(row[i*2+1])
 
+        if len(data):
+            batch = np.asarray(data, dtype=float)
+            for i in range(1, len(self.trace_names)):
+                self.statistics.update(self.trace_names[i], batch[:, i * 2], batch[:, i * 2 + 1])
+
         # now actually plot the data
         for i, name in enumerate(self.trace_names[1:]):
             self.set_plotdata(name, self.data[name]["x"], self.data[name]["y"])
 
+    def __spill__(self, name, attach=True):
+        """
+        Moves the oldest samples of a trace to disk, once it holds too many:
+        the chunk is written on a worker thread, and the samples are only
+        dropped from memory (if `attach`) once it is done.
+
+        :returns: whether a chunk was attached
+        """
+        data = self.data[name]
+        attached = False
+        job = self.sealing.get(name)
+        if job is not None:
+            # far behind (e.g. a file importing faster than it is written):
+            # wait for the chunk rather than let the memory grow unbounded
+            behind = len(data["x"]) >= 2 * (self.MEMORY_SAMPLES + CHUNK_SAMPLES)
+            if behind:
+                job.wait()
+            if not job.done or not (attach or behind):
+                return False
+            self.__attach__(name)
+            attached = True
+        if len(data["x"]) - CHUNK_SAMPLES >= self.MEMORY_SAMPLES:
+            if name not in self.history:
+                self.history[name] = TraceHistory(self.__spill_file__(name))
+            channel = self.statistics.channels.get(name)
+            if channel is not None:
+                # the index holds the same samples, already as arrays: it
+                # only appends (or moves to a new buffer) until the chunk is
+                # attached and they are discarded, so no copy is needed
+                x = channel.index.x.view()[:CHUNK_SAMPLES]
+                y = channel.index.y.view()[:CHUNK_SAMPLES]
+            else:
+                x = np.asarray(data["x"][:CHUNK_SAMPLES], dtype=float)
+                y = np.asarray(data["y"][:CHUNK_SAMPLES], dtype=float)
+            self.sealing[name] = SealJob(self.history[name], x, y)
+        return attached
+
+    def __attach__(self, name):
+        """Adds the chunk written for a trace to its history, and drops its samples from memory"""
+        job = self.sealing.pop(name)
+        if job.error:
+            # e.g. the disk is full: the samples stay in memory
+            return
+        self.history[name].attach(job.chunk)
+        channel = self.statistics.channels.get(name)
+        if channel is not None:
+            channel.index.discard(job.chunk.count)
+        data = self.data[name]
+        # new lists instead of deleting from the old ones, which exports
+        # may still be reading
+        data["x"] = data["x"][job.chunk.count :]
+        data["y"] = data["y"][job.chunk.count :]
+
+    def finish_spilling(self):
+        """
+        Spills until every trace is back within its memory, waiting for the
+        chunks to be written, e.g. once an import is done and no more
+        batches come to attach them
+        """
+        self.__wait_for_spills__()
+        for name in self.channel_names():
+            while name in self.data:
+                self.__spill__(name)
+                if name not in self.sealing:
+                    break
+                self.__wait_for_spills__()
+
+    def __wait_for_spills__(self, attach=True):
+        """Waits for the chunks being written, e.g. before sealing all of memory"""
+        for name in list(self.sealing):
+            self.sealing[name].wait()
+            if attach:
+                self.__attach__(name)
+            else:
+                del self.sealing[name]
+
+    def __history_view__(self, name, x_min, x_max):
+        """Returns the (x, y) arrays of the spilled samples of a trace to draw for a view"""
+        history = self.history[name]
+        chunks = history.overlapping(x_min, x_max)
+        detail = sum(chunk.count for chunk in chunks) <= self.HISTORY_POINTS
+        key = (len(history), chunks[0].start if len(chunks) else None, len(chunks), detail)
+        shown = self.shown_history.get(name)
+        if shown is None or shown[0] != key:
+            shown = (key, history.view(x_min, x_max, self.HISTORY_POINTS))
+            self.shown_history[name] = shown
+        return shown[1]
+
+    def __history_in_view__(self, name, x_min):
+        # only once the user panned / zoomed: while following the live data,
+        # the padding of the automatic range would pull in chunk after chunk
+        x = self.data[name]["x"]
+        if name not in self.history:
+            return False
+        # evicted: all the samples are in the history
+        if not len(x):
+            return True
+        return x_min < x[0] and not self.plot_item.getViewBox().autoRangeEnabled()[0]
+
+    def __show__(self, name):
+        """Draws a trace: the samples in memory, and the spilled ones if they are in view"""
+        x, y = self.data[name]["x"], self.data[name]["y"]
+        (x_min, x_max), _ = self.plot_item.viewRange()
+        if self.__history_in_view__(name, x_min):
+            history_x, history_y = self.__history_view__(name, x_min, x_max)
+            x = np.concatenate((history_x, x))
+            y = np.concatenate((history_y, y))
+        else:
+            self.shown_history.pop(name, None)
+        self.set_plotdata(name, x, y)
+
+    def __on_x_range_changed__(self, *args):
+        if len(self.segment_traces):
+            self.__show_segments__()
+        # panning / zooming into or out of the spilled history
+        if not len(self.history):
+            return
+        (x_min, _), _ = self.plot_item.viewRange()
+        for name in self.channel_names():
+            if name in self.data and (name in self.shown_history or self.__history_in_view__(name, x_min)):
+                self.__show_if_visible__(name)
+
+    def __is_visible__(self, name):
+        trace = self.traces.get(name)
+        # a trace not created yet is created by drawing it
+        return self.canvas.isVisible() and (trace is None or trace.isVisible())
+
+    def __show_if_visible__(self, name):
+        """Draws a trace, or only marks it stale while it cannot be seen"""
+        if self.__is_visible__(name):
+            self.stale.discard(name)
+            self.__show__(name)
+        else:
+            self.stale.add(name)
+
+    def __catch_up__(self):
+        """Draws the stale traces which can now be seen, once each"""
+        for name in [name for name in self.stale if self.__is_visible__(name)]:
+            self.stale.discard(name)
+            if name in self.data:
+                self.__show__(name)
+
+    def __watch__(self, name):
+        # e.g. toggled from the legend, or by `set_show_raw`
+        self.traces[name].visibleChanged.connect(self.__catch_up__)
+
     def set_plotdata(self, name, data_x, data_y):
         if name in self.traces:
             self.traces[name].setData(data_x, data_y)
@@ -80,3 +644,4 @@ class Plot(object):
                 pen=self.get_pen(len(self.trace_names)),
                 name=name,
             )
+            self.__watch__(name)
@@ -0,0 +1,190 @@
+import threading
+import time
+from time import perf_counter_ns
+
+import serial
+
+from profiler import PROFILER
+
+
+class PortSession(object):
+    """
+    Owns one serial device for as long as the user wants it open, in a
+    background thread running a small state machine:
+
+        connecting -> streaming -> lost -> backoff -> reconnecting -> streaming
+                                             ^              |
+                                             +--------------+
+
+    Subclasses read from other kinds of connections (see
+    :class:`network_session.NetworkSession`) by overriding `__open__`,
+    `__receive__`, `__close__` and `__toggle_dtr_rts__`.
+
+    When the device disappears (e.g. an ESP32 resets or is unplugged) the
+    same device is reopened with exponential backoff. Opening, closing and
+    toggling DTR/RTS all happen on the session thread, so none of them block
+    the caller.
+
+    Received data is split into lines, each passed (as bytes, without the
+    line ending) to `on_line_callback` on the session thread, together with
+    the `time.monotonic_ns()` of the read which completed the line.
+    """
+
+    CLOSED = "closed"
+    CONNECTING = "connecting"
+    STREAMING = "streaming"
+    LOST = "lost"
+    BACKOFF = "backoff"
+    RECONNECTING = "reconnecting"
+
+    def __init__(
+        self,
+        port,
+        baudrate,
+        on_line_callback,
+        on_state_callback=None,
+        min_backoff=0.25,
+        max_backoff=5.0,
+    ):
+        self.port = port
+        self.baudrate = baudrate
+        self.on_line_callback = on_line_callback
+        self.on_state_callback = on_state_callback
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.state = PortSession.CLOSED
+        self.connection = None
+        self.running = threading.Event()
+        self.reset_requested = threading.Event()
+        self.thread = None
+
+    @property
+    def is_open(self):
+        return self.running.is_set()
+
+    def start(self, previous=None):
+        """
+        :param in PortSession previous: session which is being replaced, the
+            port is only opened once that session has closed its port
+        """
+        if self.thread is not None:
+            return
+        self.running.set()
+        previous_thread = previous.thread if previous is not None else None
+        self.thread = threading.Thread(target=self.__run__, args=(previous_thread,), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Asks the session to close the port, without waiting for it"""
+        self.running.clear()
+
+    def reset_device(self):
+        """Toggles DTR/RTS (e.g. resetting an ESP32) on the session thread"""
+        self.reset_requested.set()
+
+    def __set_state__(self, state, detail=""):
+        self.state = state
+        if self.on_state_callback:
+            self.on_state_callback(state, detail)
+
+    def __open__(self):
+        port = serial.Serial()
+        port.port = self.port
+        port.baudrate = self.baudrate
+        port.timeout = 0.1
+        # Disable hardware flow control
+        port.rts = False
+        port.dtr = False
+        port.open()
+        return port
+
+    def __receive__(self):
+        """Returns the bytes received since the last call, empty on a timeout"""
+        return self.connection.read(self.connection.in_waiting or 1)
+
+    def __close__(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def __toggle_dtr_rts__(self):
+        # hold EN low through RTS (with DTR released, so IO0 is not pulled
+        # low and the device boots normally), then release it
+        self.connection.dtr = False
+        self.connection.rts = True
+        time.sleep(0.1)
+        self.connection.rts = False
+
+    def __stream__(self):
+        """Reads lines until the port fails or the session is stopped"""
+        buffer = bytearray()
+        while self.running.is_set():
+            if self.reset_requested.is_set():
+                self.reset_requested.clear()
+                try:
+                    self.__toggle_dtr_rts__()
+                except (OSError, serial.SerialException) as e:
+                    # e.g. a pty, which has no modem control lines
+                    self.__set_state__(PortSession.STREAMING, "could not toggle DTR/RTS: " + str(e))
+            if PROFILER.enabled:
+                started = perf_counter_ns()
+                data = self.__receive__()
+                PROFILER.record("read", started, len(data))
+            else:
+                data = self.__receive__()
+            if not data:
+                continue
+            received_ns = time.monotonic_ns()
+            buffer += data
+            if b"\n" not in data:
+                continue
+            lines = buffer.split(b"\n")
+            buffer = bytearray(lines.pop())
+            for line in lines:
+                self.on_line_callback(bytes(line), received_ns)
+
+    def __backoff__(self, seconds):
+        self.__set_state__(PortSession.BACKOFF, "retrying in {:.2f} s".format(seconds))
+        deadline = time.monotonic() + seconds
+        while self.running.is_set() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def __run__(self, previous_thread):
+        if previous_thread is not None:
+            previous_thread.join()
+
+        backoff = self.min_backoff
+        state = PortSession.CONNECTING
+        while self.running.is_set():
+            self.__set_state__(state)
+            try:
+                self.connection = self.__open__()
+            except (OSError, serial.SerialException) as e:
+                if state == PortSession.CONNECTING:
+                    # the device was never there, nothing to reconnect to
+                    self.running.clear()
+                    self.__set_state__(PortSession.CLOSED, str(e))
+                    return
+                self.__backoff__(backoff)
+                backoff = min(self.max_backoff, backoff * 2)
+                continue
+
+            backoff = self.min_backoff
+            self.__set_state__(PortSession.STREAMING)
+            try:
+                self.__stream__()
+            except (OSError, serial.SerialException, TypeError) as e:
+                # TypeError: pyserial's read on a vanished device can fail
+                # with it instead of a SerialException
+                self.__close__()
+                if self.running.is_set():
+                    self.__set_state__(PortSession.LOST, str(e))
+                    self.__backoff__(backoff)
+                    backoff = min(self.max_backoff, backoff * 2)
+                state = PortSession.RECONNECTING
+            self.__close__()
+
+        self.__set_state__(PortSession.CLOSED)
@@ -0,0 +1,215 @@
+import json
+import os
+import threading
+from time import perf_counter_ns
+
+# the pipeline stages, in the order a line goes through them
+STAGES = [
+    # port session thread
+    "read",  # one read of the port (including waiting for data)
+    "decode",  # bytes -> str
+    "sanitize",  # ANSI escapes and whitespace removed
+    "enqueue",  # put on the queue to the GUI thread
+    # GUI thread
+    "queued",  # from the read which completed the line until it was dequeued
+    "dequeue",  # taken off the queue
+    "console",  # appended to the output view
+    "parse",  # fields converted to floats
+    "render",  # setData of the traces of a plot
+    "update",  # one whole plot update tick
+]
+
+
+class Stage(object):
+    """Count, total / max duration and a log2 histogram of the durations of a stage"""
+
+    BUCKETS = 48
+
+    def __init__(self, name):
+        self.name = name
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.items = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        # bucket i counts the durations d with 2**(i-1) <= d < 2**i ns
+        self.histogram = [0] * Stage.BUCKETS
+
+    def add(self, duration, items):
+        self.count += 1
+        self.items += items
+        self.total_ns += duration
+        if duration > self.max_ns:
+            self.max_ns = duration
+        self.histogram[min(duration.bit_length(), Stage.BUCKETS - 1)] += 1
+
+    def percentile(self, fraction):
+        """Returns an upper bound (ns) of the `fraction` percentile: that of its bucket, or the maximum"""
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= target:
+                return min(1 << index, self.max_ns)
+        return 0
+
+
+def format_ns(ns):
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if ns >= scale:
+            return "{:.3g} {}".format(ns / scale, unit)
+    return "{} ns".format(ns)
+
+
+class Profiler(object):
+    """
+    Timers around the stages of the receive / plot pipeline. The pipeline
+    checks `enabled` before taking any timestamp, so it costs one attribute
+    lookup per stage while off:
+
+        profiling = PROFILER.enabled
+        if profiling:
+            started = perf_counter_ns()
+        ...
+        if profiling:
+            PROFILER.record("parse", started)
+
+    Each stage is only recorded from one thread, so the histograms are
+    updated without a lock.
+
+    A capture additionally keeps every timing as a trace event for a while
+    and writes them as a Chrome / Perfetto trace (`chrome://tracing`,
+    https://ui.perfetto.dev), along with an optional cProfile dump of the GUI
+    thread (cProfile only profiles the thread which enables it).
+    """
+
+    MAX_EVENTS = 2_000_000
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = {name: Stage(name) for name in STAGES}
+        self.events = None
+        self.dropped = 0
+        self.capture_started = 0
+        self.profile = None
+
+    def record(self, name, started, items=1):
+        """Records the stage `name` as running from `started` (perf_counter_ns) until now"""
+        ended = perf_counter_ns()
+        duration = ended - started
+        self.stages[name].add(duration, items)
+        events = self.events
+        if events is not None:
+            if len(events) < Profiler.MAX_EVENTS:
+                events.append((name, threading.get_ident(), started, duration))
+            else:
+                self.dropped += 1
+
+    def record_duration(self, name, duration, items=1):
+        """Records a duration measured elsewhere (e.g. across threads), not as a trace event"""
+        self.stages[name].add(duration, items)
+
+    def clear(self):
+        for stage in self.stages.values():
+            stage.clear()
+
+    def summary(self):
+        """Returns a table of the stages recorded so far"""
+        lines = [
+            "{:<10} {:>10} {:>12} {:>10} {:>10} {:>10} {:>10}".format(
+                "stage", "count", "items", "mean", "p50 <=", "p99 <=", "max"
+            )
+        ]
+        for stage in self.stages.values():
+            if not stage.count:
+                continue
+            lines.append(
+                "{:<10} {:>10} {:>12} {:>10} {:>10} {:>10} {:>10}".format(
+                    stage.name,
+                    stage.count,
+                    stage.items,
+                    format_ns(stage.total_ns // stage.count),
+                    format_ns(stage.percentile(0.5)),
+                    format_ns(stage.percentile(0.99)),
+                    format_ns(stage.max_ns),
+                )
+            )
+        return "\n".join(lines)
+
+    @property
+    def capturing(self):
+        return self.events is not None
+
+    def start_capture(self, cprofile=False):
+        """Starts keeping trace events (and profiling the calling thread, if `cprofile`)"""
+        self.dropped = 0
+        self.capture_started = perf_counter_ns()
+        self.events = []
+        self.enabled = True
+        if cprofile:
+            import cProfile
+
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def stop_capture(self, profile_path=None):
+        """
+        Stops keeping trace events, and writes the cProfile statistics (if
+        profiling) to `profile_path`.
+
+        :returns: the :class:`Capture`, or None if there was none
+        """
+        events, self.events = self.events, None
+        if self.profile is not None:
+            self.profile.disable()
+            if profile_path:
+                self.profile.dump_stats(profile_path)
+            self.profile = None
+        if events is None:
+            return None
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        return Capture(events, self.capture_started, self.dropped, names)
+
+
+class Capture(object):
+    """The trace events of a capture, see :func:`write_trace`"""
+
+    def __init__(self, events, started, dropped, thread_names):
+        self.events = events
+        self.started = started
+        self.dropped = dropped
+        self.thread_names = thread_names
+
+    def __len__(self):
+        return len(self.events)
+
+
+def write_trace(capture, file, job, chunk=65536):
+    """
+    Writes a capture as Chrome / Perfetto trace event JSON, `chunk` events
+    at a time (an :class:`exporter.ExportJob` write function)
+    """
+    pid = os.getpid()
+    metadata = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": capture.thread_names.get(tid, str(tid))}}
+        for tid in set(event[1] for event in capture.events)
+    ]
+    file.write('{"displayTimeUnit": "ns", "traceEvents": [\n')
+    file.write(",\n".join(json.dumps(event) for event in metadata))
+    events = capture.events
+    for start in range(0, len(events), chunk):
+        file.write(
+            "".join(
+                ',\n{{"name": "{}", "cat": "pipeline", "ph": "X", "pid": {}, "tid": {}, "ts": {:.3f}, "dur": {:.3f}}}'.format(
+                    name, pid, tid, (started - capture.started) / 1e3, duration / 1e3
+                )
+                for name, tid, started, duration in events[start : start + chunk]
+            )
+        )
+        job.progress(start + chunk)
+    file.write("\n]}\n")
+
+
+PROFILER = Profiler()
@@ -0,0 +1,198 @@
+import numpy as np
+
+from buffers import GrowableArray
+
+
+def block_moments(blocks):
+    """
+    Returns the number of finite values of each row of `blocks`, their mean
+    and their sum of squared deviations from it (M2), computed in two passes
+    so a large offset (e.g. a pressure around 101325 Pa) does not cancel out
+    the variance. NaNs (and padding) are left out.
+    """
+    blocks = np.asarray(blocks, dtype=float)
+    finite = np.isfinite(blocks)
+    counts = finite.sum(axis=1)
+    values = np.where(finite, blocks, 0.0)
+    means = values.sum(axis=1) / np.maximum(counts, 1)
+    deviations = np.where(finite, blocks - means[:, None], 0.0)
+    return counts, means, (deviations * deviations).sum(axis=1)
+
+
+def merge_moments(counts, means, m2s):
+    """
+    Returns the (count, mean, M2) of the union of parts from theirs: Chan's
+    parallel update, applied to all the parts at once
+    """
+    counts = np.asarray(counts, dtype=float)
+    count = counts.sum()
+    if count <= 0:
+        return 0, 0.0, 0.0
+    means = np.asarray(means, dtype=float)
+    mean = (counts * means).sum() / count
+    m2 = np.asarray(m2s, dtype=float).sum() + (counts * (means - mean) ** 2).sum()
+    return int(count), float(mean), float(m2)
+
+
+def values_moments(values):
+    """Returns (count, mean, M2, min, max) of the finite values of an array"""
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return 0, 0.0, 0.0, np.nan, np.nan
+    counts, means, m2s = block_moments(values.reshape(1, -1))
+    return int(counts[0]), float(means[0]), float(m2s[0]), np.fmin.reduce(values), np.fmax.reduce(values)
+
+
+class RangeIndex(object):
+    """
+    Index over a trace with a sorted x column which answers range queries
+    without scanning the whole history:
+
+    * the x range -> sample range lookup is a binary search
+    * every block of samples keeps its count of finite values, mean, sum of
+      squared deviations (M2) and extrema, so the statistics of a range
+      merge those of its full blocks and only scan the partial blocks at its
+      ends
+
+    Appending a batch costs O(batch + block_size).
+    """
+
+    def __init__(self, block_size=1024):
+        self.block_size = block_size
+        self.clear()
+
+    def clear(self):
+        self.x = GrowableArray()
+        self.y = GrowableArray()
+        self.block_count = GrowableArray()
+        self.block_mean = GrowableArray()
+        self.block_m2 = GrowableArray()
+        self.block_min = GrowableArray()
+        self.block_max = GrowableArray()
+
+    def __blocks__(self):
+        return self.block_count, self.block_mean, self.block_m2, self.block_min, self.block_max
+
+    def __len__(self):
+        return len(self.x)
+
+    def discard(self, count):
+        """Forgets the oldest `count` samples (a multiple of the block size), e.g. once spilled to disk"""
+        self.x.discard(count)
+        self.y.discard(count)
+        for array in self.__blocks__():
+            array.discard(count // self.block_size)
+
+    def append(self, x, y):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if not len(y):
+            return
+        start = len(self.y)
+        self.x.append(x)
+        self.y.append(y)
+
+        # recompute the summaries of the (possibly partial) blocks touched
+        first_block = start // self.block_size
+        values = self.y.view()[first_block * self.block_size :]
+        padding = -len(values) % self.block_size
+        blocks = np.pad(values, (0, padding), constant_values=np.nan).reshape(-1, self.block_size)
+        for array in self.__blocks__():
+            array.size = first_block
+        counts, means, m2s = block_moments(blocks)
+        self.block_count.append(counts)
+        self.block_mean.append(means)
+        self.block_m2.append(m2s)
+        self.block_min.append(np.fmin.reduce(blocks, axis=1))
+        self.block_max.append(np.fmax.reduce(blocks, axis=1))
+
+    def index_range(self, x_min, x_max):
+        """Returns the [start, end) sample range covering x_min <= x <= x_max"""
+        x = self.x.view()
+        return (
+            int(np.searchsorted(x, x_min, side="left")),
+            int(np.searchsorted(x, x_max, side="right")),
+        )
+
+    def index_of(self, x_value):
+        """Returns the index of the sample closest to `x_value`"""
+        x = self.x.view()
+        if not len(x):
+            return None
+        i = int(np.searchsorted(x, x_value))
+        if i >= len(x):
+            return len(x) - 1
+        if i > 0 and x_value - x[i - 1] <= x[i] - x_value:
+            return i - 1
+        return i
+
+    def extrema(self, start, end):
+        """Returns (min, max) of the samples in [start, end)"""
+        if end <= start:
+            return np.nan, np.nan
+        y = self.y.view()
+        first_full = -(-start // self.block_size)
+        last_full = end // self.block_size
+        if first_full >= last_full:
+            segment = y[start:end]
+            return np.fmin.reduce(segment), np.fmax.reduce(segment)
+        parts_min = [self.block_min.view()[first_full:last_full]]
+        parts_max = [self.block_max.view()[first_full:last_full]]
+        for segment in (y[start : first_full * self.block_size], y[last_full * self.block_size : end]):
+            if len(segment):
+                parts_min.append(segment)
+                parts_max.append(segment)
+        return (
+            np.fmin.reduce(np.concatenate(parts_min)),
+            np.fmax.reduce(np.concatenate(parts_max)),
+        )
+
+    def moments(self, start, end):
+        """Returns (count of finite values, mean, M2, min, max) of [start, end)"""
+        if end <= start:
+            return 0, 0.0, 0.0, np.nan, np.nan
+        y = self.y.view()
+        first_full = -(-start // self.block_size)
+        last_full = end // self.block_size
+        if first_full >= last_full:
+            return values_moments(y[start:end])
+        full = slice(first_full, last_full)
+        parts = [
+            merge_moments(self.block_count.view()[full], self.block_mean.view()[full], self.block_m2.view()[full])
+            + (np.fmin.reduce(self.block_min.view()[full]), np.fmax.reduce(self.block_max.view()[full]))
+        ]
+        for segment in (y[start : first_full * self.block_size], y[last_full * self.block_size : end]):
+            if len(segment):
+                parts.append(values_moments(segment))
+        return combine(parts)
+
+    def stats(self, start, end):
+        """Returns a dict of count / min / max / mean / rms / std of [start, end)"""
+        return summarize([self.moments(start, end)])
+
+
+def combine(parts):
+    """Returns the (count, mean, M2, min, max) of the union of parts from theirs"""
+    counts, means, m2s, minima, maxima = zip(*parts)
+    count, mean, m2 = merge_moments(counts, means, m2s)
+    return count, mean, m2, np.fmin.reduce(minima), np.fmax.reduce(maxima)
+
+
+def summarize(parts):
+    """
+    Returns a dict of count / min / max / mean / rms / std of the finite
+    samples of one or more ranges, from their (count, mean, M2, min, max),
+    None if they hold no samples
+    """
+    count, mean, m2, minimum, maximum = combine(parts)
+    if count <= 0:
+        return None
+    variance = m2 / count
+    return {
+        "count": count,
+        "min": minimum,
+        "max": maximum,
+        "mean": mean,
+        "rms": np.sqrt(mean * mean + variance),
+        "std": np.sqrt(variance),
+    }
@@ -1,12 +1,6 @@
 import os
 import sys
 
-try:
-    base_path = sys._MEIPASS
-    print("[RESOURCE] Running as a package")
-except Exception:
-    print("[RESOURCE] Running from source")
-
 
 def path(relative_path):
     """Get absolute path to resource, works for dev and for PyInstaller"""
@@ -16,7 +10,6 @@ def path(relative_path):
     except Exception:
         base_path = os.path.abspath("../")
 
-    print("[RESOURCE]", relative_path)
     rPath = os.path.join(base_path, relative_path)
     return rPath
 
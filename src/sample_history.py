@@ -0,0 +1,402 @@
+import bisect
+import os
+import queue
+import tempfile
+import threading
+
+import numpy as np
+
+from range_index import block_moments, combine, merge_moments, values_moments
+
+# samples sealed into one chunk at a time
+CHUNK_SAMPLES = 1 << 20
+# samples summarized by one min / max pair of a chunk's overview
+OVERVIEW_BLOCK = 256
+# directory of the spill files, the temp directory if not set
+HISTORY_DIR_VARIABLE = "UART_SERIAL_PLOTTER_HISTORY_DIR"
+# bytes of a spill file mapped at once: every mapping holds a file
+# descriptor, so the chunks share them
+EXTENT_BYTES = 64 << 20
+
+
+def overview_indices(y, block):
+    """
+    Returns the sorted indices of the first and last sample, and of the
+    minimum and maximum of every `block` samples: drawn as a line, they have
+    the same envelope as all of the samples.
+    """
+    count = len(y)
+    padding = -count % block
+    blocks = np.pad(y, (0, padding), constant_values=np.nan).reshape(-1, block)
+    # NaNs (and the padding) must not be picked as extremes
+    low = np.where(np.isnan(blocks), np.inf, blocks).argmin(axis=1)
+    high = np.where(np.isnan(blocks), -np.inf, blocks).argmax(axis=1)
+    starts = np.arange(len(blocks)) * block
+    indices = np.concatenate(([0, count - 1], starts + low, starts + high))
+    return np.unique(np.clip(indices, 0, count - 1))
+
+
+class SampleChunk(object):
+    """
+    A sealed block of samples of one trace, in the spill file of its
+    :class:`TraceHistory`. Only its time index (x range), summary and
+    overview are kept in memory, the samples themselves are memory mapped.
+    """
+
+    def __init__(self, start, x, y, block=OVERVIEW_BLOCK):
+        """
+        :param in int start: index of the first sample within the trace
+        :param in numpy.ndarray x: sample x values, sorted
+        :param in numpy.ndarray y: sample y values
+        """
+        self.start = start
+        self.count = len(x)
+        self.x_min = float(x[0])
+        self.x_max = float(x[-1])
+        # moments and extremes of every `block` samples, so the moments of
+        # part of the chunk only read the samples of the blocks at its edges
+        self.block = block
+        blocks = np.pad(y, (0, -len(y) % block), constant_values=np.nan).reshape(-1, block)
+        self.block_count, self.block_mean, self.block_m2 = block_moments(blocks)
+        self.block_min = np.fmin.reduce(blocks, axis=1)
+        self.block_max = np.fmax.reduce(blocks, axis=1)
+        self.summary = merge_moments(self.block_count, self.block_mean, self.block_m2) + (
+            float(np.fmin.reduce(self.block_min)),
+            float(np.fmax.reduce(self.block_max)),
+        )
+        indices = overview_indices(y, block)
+        self.overview_x = x[indices]
+        self.overview_y = y[indices]
+        # rows x and y of the chunk in the spill file, set once written
+        self.samples = None
+
+    @property
+    def end(self):
+        return self.start + self.count
+
+    def moments(self, x_min, x_max):
+        """Returns (count of finite values, mean, M2, min, max) of the samples with x_min <= x <= x_max"""
+        if x_min <= self.x_min and self.x_max <= x_max:
+            return self.summary
+        x = self.samples[0]
+        start = int(np.searchsorted(x, x_min, side="left"))
+        end = int(np.searchsorted(x, x_max, side="right"))
+        if end <= start:
+            return 0, 0.0, 0.0, np.nan, np.nan
+        first_full = -(-start // self.block)
+        last_full = end // self.block
+        if first_full >= last_full:
+            return values_moments(self.samples[1][start:end])
+        full = slice(first_full, last_full)
+        parts = [
+            merge_moments(self.block_count[full], self.block_mean[full], self.block_m2[full])
+            + (np.fmin.reduce(self.block_min[full]), np.fmax.reduce(self.block_max[full]))
+        ]
+        for edge in (self.samples[1][start : first_full * self.block], self.samples[1][last_full * self.block : end]):
+            if len(edge):
+                parts.append(values_moments(edge))
+        return combine(parts)
+
+
+class SpillFile(object):
+    """
+    A temporary file the chunks of one trace are appended to, shared by the
+    histories of all the segments of the trace (see :meth:`plot.Plot.new_segment`).
+    The file is grown and memory mapped an extent of `EXTENT_BYTES` at a
+    time, and the chunks are views of the extents: however many chunks (or
+    segments) there are, the file descriptors only grow with the size of
+    the file.
+    """
+
+    def __init__(self):
+        self.file = None
+        # (offset, size, memmap) of the extent written to, and where the
+        # next chunk starts within it
+        self.extent = None
+        self.used = 0
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def write(self, x, y):
+        """
+        Appends the samples of a chunk (contiguous float64) and returns them
+        as a read-only (2, count) array of x and y, mapped from the file
+        """
+        count = len(x)
+        with self.lock:
+            if self.file is None:
+                directory = os.environ.get(HISTORY_DIR_VARIABLE) or None
+                self.file = tempfile.TemporaryFile(prefix="uart_serial_plotter_history_", dir=directory)
+            if self.extent is None or self.used + 16 * count > self.extent[1]:
+                # a new extent, larger than usual for a larger chunk
+                size = max(EXTENT_BYTES, -(-16 * count // EXTENT_BYTES) * EXTENT_BYTES)
+                self.file.truncate(self.size + size)
+                mapping = np.memmap(self.file, dtype=np.uint8, mode="r", offset=self.size, shape=(size,))
+                self.extent = (self.size, size, mapping)
+                self.size += size
+                self.used = 0
+            offset, _, mapping = self.extent
+            self.file.seek(offset + self.used)
+            self.file.write(x.tobytes())
+            self.file.write(y.tobytes())
+            self.file.flush()
+            samples = mapping[self.used : self.used + 16 * count].view("<f8").reshape(2, count)
+            self.used += 16 * count
+        return samples
+
+    def close(self):
+        """Deletes the file (readers keep their chunks' mappings)"""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.extent = None
+            self.used = 0
+            self.size = 0
+
+
+class TraceHistory(object):
+    """
+    The oldest samples of one trace, spilled to disk a chunk at a time by
+    :meth:`plot.Plot.update_data`, so a capture is only limited by the disk.
+
+    Chunks are looked up by their x range (the traces are sorted by x), and
+    drawn either sample by sample, or from their overview when there are too
+    many to draw. Chunks are only appended (or taken back whole by
+    :meth:`unseal`) and the file only grows, so they may be read from another
+    thread (e.g. an export) while the plot keeps spilling.
+    """
+
+    def __init__(self, file=None):
+        """
+        :param in SpillFile file: file shared with the histories of the
+            trace's other segments, which closes with its owner; the
+            history has a file of its own (closed by :meth:`close`) if None
+        """
+        self.chunks = []
+        # x range of every chunk, for bisecting
+        self.x_mins = []
+        self.x_maxs = []
+        self.owns_file = file is None
+        self.file = file if file is not None else SpillFile()
+        # the chunks last taken back by `unseal`, still in the file
+        self.unsealed = []
+
+    def __len__(self):
+        """Number of samples spilled"""
+        return self.chunks[-1].end if len(self.chunks) else 0
+
+    @property
+    def x_max(self):
+        return self.x_maxs[-1] if len(self.x_maxs) else -np.inf
+
+    def seal(self, x, y):
+        """
+        Writes the next (oldest not yet spilled) samples of the trace to disk.
+        Sealing the samples last taken back by :meth:`unseal` (as many as
+        they were, the memory of the trace starts with them) puts their
+        chunks back instead of writing them again.
+        """
+        unsealed = self.unsealed
+        if len(unsealed) and len(x) == sum(chunk.count for chunk in unsealed):
+            for chunk in unsealed:
+                self.attach(chunk)
+            return
+        self.attach(self.write(x, y))
+
+    def write(self, x, y):
+        """
+        Writes the next samples of the trace to the spill file and returns
+        their chunk, without adding it to the history yet (see :meth:`attach`).
+        The slow part of sealing, so it may run on a worker thread (see
+        :class:`SealJob`), one chunk of the history at a time.
+        """
+        x = np.ascontiguousarray(x, dtype="<f8")
+        y = np.ascontiguousarray(y, dtype="<f8")
+        chunk = SampleChunk(len(self), x, y)
+        chunk.samples = self.file.write(x, y)
+        return chunk
+
+    def attach(self, chunk):
+        """Adds a chunk written by :meth:`write` as the newest one"""
+        self.unsealed = []
+        self.chunks.append(chunk)
+        self.x_mins.append(chunk.x_min)
+        self.x_maxs.append(chunk.x_max)
+
+    def unseal(self, max_samples):
+        """
+        Takes the newest chunks, at most `max_samples` samples of them (but at
+        least one chunk), back out of the history, e.g. to load them into
+        memory again.
+
+        :returns: (x, y) arrays of their samples, in order
+        """
+        chunks = []
+        count = 0
+        while len(self.chunks) and (not len(chunks) or count + self.chunks[-1].count <= max_samples):
+            count += self.chunks[-1].count
+            chunks.insert(0, self.chunks.pop())
+            self.x_mins.pop()
+            self.x_maxs.pop()
+        self.unsealed = chunks
+        if not len(chunks):
+            return np.empty(0), np.empty(0)
+        return (
+            np.concatenate([chunk.samples[0] for chunk in chunks]),
+            np.concatenate([chunk.samples[1] for chunk in chunks]),
+        )
+
+    def close(self):
+        """Drops the chunks, deleting the spill file if the history owns it (readers keep their chunks' mappings)"""
+        self.chunks = []
+        self.x_mins = []
+        self.x_maxs = []
+        self.unsealed = []
+        if self.owns_file:
+            self.file.close()
+
+    def overlapping(self, x_min, x_max):
+        """Returns the chunks holding samples with x_min <= x <= x_max"""
+        first = bisect.bisect_left(self.x_maxs, x_min)
+        last = bisect.bisect_right(self.x_mins, x_max)
+        return self.chunks[first:last]
+
+    def view(self, x_min, x_max, max_points):
+        """
+        Returns (x, y) arrays of the chunks overlapping the x range, sample by
+        sample if they hold at most `max_points` samples, from their overviews
+        otherwise. Whole chunks are returned either way, so the x bounds of the
+        result do not depend on the level of detail.
+        """
+        chunks = self.overlapping(x_min, x_max)
+        if not len(chunks):
+            return np.empty(0), np.empty(0)
+        if sum(chunk.count for chunk in chunks) <= max_points:
+            samples = [chunk.samples for chunk in chunks]
+            return (
+                np.concatenate([s[0] for s in samples]),
+                np.concatenate([s[1] for s in samples]),
+            )
+        return (
+            np.concatenate([chunk.overview_x for chunk in chunks]),
+            np.concatenate([chunk.overview_y for chunk in chunks]),
+        )
+
+    def moments(self, x_min, x_max):
+        """Returns (count of finite values, mean, M2, min, max) of the spilled samples with x_min <= x <= x_max"""
+        parts = [chunk.moments(x_min, x_max) for chunk in self.overlapping(x_min, x_max)]
+        if not len(parts):
+            return 0, 0.0, 0.0, np.nan, np.nan
+        return combine(parts)
+
+
+class SealJob(object):
+    """
+    A chunk of a :class:`TraceHistory` to write (see
+    :meth:`TraceHistory.write`) on the spill thread, so spilling does not
+    stall the GUI. The samples stay in memory, and the chunk is only
+    attached by its owner once `done`.
+    """
+
+    def __init__(self, history, x, y):
+        self.history = history
+        self.x = x
+        self.y = y
+        self.chunk = None
+        self.error = ""
+        self.finished = threading.Event()
+        SEALER.submit(self)
+
+    @property
+    def done(self):
+        return self.finished.is_set()
+
+    def wait(self):
+        self.finished.wait()
+
+    def run(self):
+        try:
+            self.chunk = self.history.write(self.x, self.y)
+        except Exception as e:
+            print("Spill thread exception: " + str(e))
+            self.error = str(e)
+        self.x = self.y = None
+        self.finished.set()
+
+
+class Sealer(object):
+    """
+    Runs the :class:`SealJob` of all the plots one at a time, in order, on a
+    single worker thread: sealing the chunks of many traces at once would
+    only compete with the GUI thread for the interpreter.
+    """
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, job):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__run__, daemon=True)
+                self.thread.start()
+        self.jobs.put(job)
+
+    def __run__(self):
+        while True:
+            self.jobs.get().run()
+
+
+SEALER = Sealer()
+
+
+class Column(object):
+    """
+    The x or y values of a trace across both tiers, the spilled chunks then
+    the in-memory list, limited to the samples which existed when it was
+    created (the list is only referenced, see :class:`exporter.PlotSnapshot`).
+    """
+
+    def __init__(self, history, values, index):
+        """
+        :param in TraceHistory history: spilled samples of the trace, or None
+        :param in list values: in-memory samples of the trace
+        :param in int index: 0 for the x values, 1 for the y values
+        """
+        self.chunks = list(history.chunks) if history is not None else []
+        self.spilled = self.chunks[-1].end if len(self.chunks) else 0
+        self.values = values
+        self.index = index
+        self.length = self.spilled + len(values)
+
+    def __len__(self):
+        return self.length
+
+    def read(self, start, end):
+        """Returns the values [start, end) as a numpy array"""
+        start, end = max(0, start), min(self.length, end)
+        if end <= start:
+            return np.empty(0)
+        parts = []
+        if start < self.spilled:
+            first = bisect.bisect_right([chunk.start for chunk in self.chunks], start) - 1
+            for chunk in self.chunks[first:]:
+                if chunk.start >= end:
+                    break
+                parts.append(chunk.samples[self.index][max(0, start - chunk.start) : end - chunk.start])
+        if end > self.spilled:
+            parts.append(np.asarray(self.values[max(0, start - self.spilled) : end - self.spilled], dtype=float))
+        return np.concatenate(parts) if len(parts) > 1 else np.asarray(parts[0], dtype=float)
+
+    def search(self, value, side="left"):
+        """Returns the insertion index of `value` into the (sorted x) values, like numpy.searchsorted"""
+        if len(self.chunks) and (value < self.chunks[-1].x_max or (side == "left" and value == self.chunks[-1].x_max)):
+            maxima = [chunk.x_max for chunk in self.chunks]
+            chunk = self.chunks[bisect.bisect_left(maxima, value)]
+            return chunk.start + int(np.searchsorted(chunk.samples[0], value, side=side))
+        length = self.length - self.spilled
+        if side == "left":
+            return self.spilled + bisect.bisect_left(self.values, value, 0, length)
+        return self.spilled + bisect.bisect_right(self.values, value, 0, length)
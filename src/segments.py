@@ -0,0 +1,140 @@
+import numpy as np
+
+# the time going back by more than this fraction of the segment's span (from
+# its first time to the previous row's) is a restart of the device, smaller
+# steps back are jitter
+RESET_FRACTION = 0.5
+# rows over which the time has to run forward before going back counts as a
+# restart, so that its span is well above the jitter
+RESET_MIN_ROWS = 32
+
+
+class ResetDetector(object):
+    """
+    Finds the rows where the device restarted, and its clock with it, in the
+    time column of the batches of a plot: the time goes back by more than
+    `fraction` of the span of the segment so far (from its first time to the
+    previous row's), after at least `min_rows` rows in which it did not go
+    back that far. Smaller steps back are jitter, and a first column which
+    is not a time and goes back every few rows (e.g. a counter wrapping
+    around) never restarts. Only earlier rows decide, so the result does not
+    depend on how the rows are split into batches.
+    """
+
+    def __init__(self, fraction=RESET_FRACTION, min_rows=RESET_MIN_ROWS):
+        self.fraction = fraction
+        self.min_rows = min_rows
+        self.clear()
+
+    def clear(self):
+        """Starts over, e.g. when a segment is started from outside"""
+        self.last_x = None
+        self.first_x = None
+        # rows since the segment started, or its time last went back too far
+        self.steady_rows = 0
+
+    def reset_rows(self, x):
+        """
+        Returns the indices of the rows of the next batch which start a new
+        segment, in order
+
+        :param in numpy.ndarray x: the time column of the batch
+        """
+        x = np.asarray(x, dtype=float)
+        if not len(x):
+            return []
+        if self.last_x is None:
+            self.first_x, self.steady_rows = x[0], 0
+        previous = np.concatenate(([self.last_x if self.last_x is not None else np.nan], x[:-1]))
+        # the rows going back at all, only some of them go back far enough:
+        # checked a block at a time, since each restart changes the first time
+        candidates = np.flatnonzero(x < previous)
+        first = self.first_x
+        # index (within the batch, negative if before) of the row the
+        # steady rows start from
+        steady = -self.steady_rows
+        resets = []
+        start = 0
+        while start < len(candidates):
+            block = candidates[start : start + 1024]
+            back = np.flatnonzero(previous[block] - x[block] > self.fraction * (previous[block] - first))
+            if not len(back):
+                start += len(block)
+                continue
+            rows = block[back]
+            # each step too far back starts the steady rows over
+            hits = np.flatnonzero(rows - np.concatenate(([steady], rows[:-1])) >= self.min_rows)
+            if not len(hits):
+                steady = rows[-1]
+                start += len(block)
+                continue
+            row = int(rows[hits[0]])
+            resets.append(row)
+            first = x[row]
+            steady = row
+            start += int(back[hits[0]]) + 1
+        self.last_x = x[-1]
+        self.first_x = first
+        self.steady_rows = len(x) - steady
+        return resets
+
+
+class Segment(object):
+    """
+    One run of the device, from a (re)start to the next, archived by
+    :meth:`plot.Plot.new_segment` when the next one begins. The samples of
+    every trace are sealed into its :class:`sample_history.TraceHistory`,
+    so an archived segment only keeps its chunk index, summaries and
+    overviews in memory, and its statistics stay queryable on their own.
+    """
+
+    def __init__(self, number, trace_names, history, statistics, started, rows):
+        """
+        :param in int number: 1 for the first segment of the plot, 2 for the next, ...
+        :param in list trace_names: header of the segment
+        :param in dict history: trace name -> TraceHistory of all its samples
+        :param in Statistics statistics: statistics of the traces of the segment
+        :param in datetime.datetime started: host time the segment started at
+        :param in int rows: number of rows received in the segment
+        """
+        self.number = number
+        self.trace_names = trace_names
+        self.history = history
+        self.statistics = statistics
+        self.started = started
+        self.rows = rows
+        # trace name -> (key, (x, y)) of the samples last drawn
+        self.shown = dict()
+
+    @property
+    def x_range(self):
+        """(first, last) time of the segment, None if it holds no samples"""
+        chunks = [history.chunks for history in self.history.values() if len(history.chunks)]
+        if not len(chunks):
+            return None
+        return min(c[0].x_min for c in chunks), max(c[-1].x_max for c in chunks)
+
+    def describe(self):
+        x_range = self.x_range
+        span = " {:.6g} .. {:.6g}".format(*x_range) if x_range is not None else ""
+        return "Segment #{} (started {}, {} rows{})".format(
+            self.number, self.started.strftime("%H:%M:%S"), self.rows, span
+        )
+
+    def view(self, name, x_min, x_max, max_points):
+        """Returns the (x, y) arrays of a trace to draw for a view, see :meth:`sample_history.TraceHistory.view`"""
+        history = self.history[name]
+        chunks = history.overlapping(x_min, x_max)
+        detail = sum(chunk.count for chunk in chunks) <= max_points
+        key = (chunks[0].start if len(chunks) else None, len(chunks), detail)
+        shown = self.shown.get(name)
+        if shown is None or shown[0] != key:
+            shown = (key, history.view(x_min, x_max, max_points))
+            self.shown[name] = shown
+        return shown[1]
+
+    def close(self):
+        for history in self.history.values():
+            history.close()
+        self.history = {}
+        self.shown = {}
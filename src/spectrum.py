@@ -0,0 +1,166 @@
+import queue
+import threading
+
+import numpy as np
+import pyqtgraph as pg
+from PyQt5 import QtCore
+
+
+def sample_rate(x):
+    """Infers the sample rate (in 1 / x-axis units) from the time column"""
+    if len(x) < 2:
+        return 0.0
+    dt = np.median(np.diff(x))
+    if not np.isfinite(dt) or dt <= 0:
+        return 0.0
+    return 1.0 / dt
+
+
+def welch(y, fs, nperseg=512, overlap=0.5):
+    """
+    Welch power spectral density estimate: the signal is split into
+    overlapping Hann windowed segments whose periodograms are averaged.
+
+    :param in numpy.ndarray y: evenly sampled signal
+    :param in float fs: sample rate of `y`
+    :param in int nperseg: number of samples per segment
+    :param in float overlap: fraction of overlap between segments
+    :returns: (frequencies, power spectral density)
+    """
+    y = np.asarray(y, dtype=float)
+    nperseg = min(nperseg, len(y))
+    step = max(1, int(nperseg * (1.0 - overlap)))
+    segments = np.lib.stride_tricks.sliding_window_view(y, nperseg)[::step]
+    segments = segments - segments.mean(axis=1, keepdims=True)
+    window = np.hanning(nperseg)
+    spectra = np.fft.rfft(segments * window, axis=1)
+    psd = (np.abs(spectra) ** 2).mean(axis=0) / (fs * (window**2).sum())
+    # one sided spectrum, so double everything except DC (and nyquist)
+    if nperseg % 2:
+        psd[1:] *= 2
+    else:
+        psd[1:-1] *= 2
+    return np.fft.rfftfreq(nperseg, 1.0 / fs), psd
+
+
+class SpectrumWorker(object):
+    """
+    Computes spectra in a background thread. Only the most recent request is
+    kept, so a slow computation never builds up a backlog of stale snapshots.
+    """
+
+    def __init__(self, nperseg=512):
+        self.nperseg = nperseg
+        self.requests = queue.Queue(maxsize=1)
+        self.results = queue.Queue()
+        self.busy = False
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.__run__, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.requests.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def submit(self, snapshot):
+        """
+        :param in dict snapshot: trace name -> (x, y) numpy arrays
+        """
+        if self.busy:
+            return
+        self.busy = True
+        self.requests.put(snapshot)
+
+    def __run__(self):
+        while True:
+            snapshot = self.requests.get()
+            if snapshot is None:
+                break
+            result = {}
+            try:
+                for name, (x, y) in snapshot.items():
+                    fs = sample_rate(x)
+                    if fs > 0 and len(y) >= 16:
+                        result[name] = welch(y, fs, self.nperseg)
+            except Exception as e:
+                print("Spectrum thread exception: " + str(e))
+            self.results.put(result)
+            self.busy = False
+
+
+class Spectrum(object):
+    """
+    Live spectrum view of the traces of a :class:`plot.Plot`, refreshed at its
+    own rate from a sliding window of the latest samples.
+    """
+
+    def __init__(self, plot, window_samples=4096, update_frequency_hz=5):
+        self.plot = plot
+        self.window_samples = window_samples
+        self.traces = dict()
+        self.worker = SpectrumWorker()
+
+        self.canvas = pg.PlotWidget()
+        self.canvas.showGrid(x=True, y=True, alpha=0.4)
+        self.canvas.getAxis("left").setTextPen("w")
+        self.canvas.getAxis("bottom").setTextPen("w")
+        self.plot_item = self.canvas.getPlotItem()
+        self.plot_item.setLabel("left", text="PSD (dB)")
+        self.plot_item.setLabel("bottom", text="Frequency")
+        self.legend = self.canvas.addLegend()
+        self.canvas.hide()
+
+        self.update_timer = QtCore.QTimer()
+        self.update_timer.timeout.connect(self.update)
+        self.update_period_ms = int(1000.0 / update_frequency_hz)
+
+    def set_visible(self, visible):
+        self.canvas.setVisible(visible)
+        if visible:
+            self.worker.start()
+            self.update_timer.start(self.update_period_ms)
+        else:
+            self.update_timer.stop()
+
+    def stop(self):
+        self.update_timer.stop()
+        self.worker.stop()
+
+    def clear(self):
+        self.plot_item.clear()
+        self.legend.clear()
+        self.traces = {}
+
+    def update(self):
+        # show whatever finished since the last update
+        while True:
+            try:
+                result = self.worker.results.get_nowait()
+            except queue.Empty:
+                break
+            for name, (freqs, psd) in result.items():
+                if name not in self.traces:
+                    channels = self.plot.channel_names()
+                    index = channels.index(name) if name in channels else 0
+                    self.traces[name] = self.canvas.plot(pen=self.plot.get_pen(index), name=name)
+                self.traces[name].setData(freqs, 10 * np.log10(psd + 1e-20))
+
+        if len(self.plot.trace_names):
+            self.plot_item.setLabel("bottom", text="Frequency (1 / {})".format(self.plot.trace_names[0]))
+
+        # and hand the latest window of samples to the worker
+        snapshot = {}
+        for name in self.plot.channel_names():
+            if name not in self.plot.data:
+                continue
+            x = self.plot.data[name]["x"][-self.window_samples :]
+            y = self.plot.data[name]["y"][-self.window_samples :]
+            if len(x) >= 16:
+                snapshot[name] = (np.array(x, dtype=float), np.array(y, dtype=float))
+        if len(snapshot):
+            self.worker.submit(snapshot)
@@ -0,0 +1,59 @@
+import os
+import time
+
+# main() imports this module before anything else, so this is as close to
+# the start of the process as the application can measure
+STARTED = time.perf_counter()
+
+from PyQt5 import QtCore
+
+
+class StartupTimer(QtCore.QObject):
+    """
+    Measures how long the application takes to start: named marks (e.g. once
+    all modules are imported, once the main window is constructed) and the
+    time until the main window is first painted, all in milliseconds since
+    this module was imported.
+
+    The results are reported once the first frame is painted; if the
+    UART_SERIAL_PLOTTER_STARTUP_LOG environment variable names a file, they
+    are also appended to it as a CSV row, to track startup time over changes.
+    """
+
+    LOG_VARIABLE = "UART_SERIAL_PLOTTER_STARTUP_LOG"
+
+    def __init__(self):
+        super().__init__()
+        self.marks = []
+        self.callback = None
+
+    def mark(self, name):
+        self.marks.append((name, (time.perf_counter() - STARTED) * 1000.0))
+
+    def watch(self, widget, callback=print):
+        """Reports the timings to `callback` once `widget` is first painted"""
+        self.callback = callback
+        widget.installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if event.type() == QtCore.QEvent.Paint:
+            watched.removeEventFilter(self)
+            self.mark("first frame")
+            self.__report__()
+        return False
+
+    def summary(self):
+        return "Startup: " + ", ".join("{} {:.1f} ms".format(name, ms) for name, ms in self.marks)
+
+    def __report__(self):
+        if self.callback:
+            self.callback(self.summary())
+        path = os.environ.get(StartupTimer.LOG_VARIABLE)
+        if not path:
+            return
+        try:
+            with open(path, "a") as file:
+                row = [time.strftime("%Y-%m-%dT%H:%M:%S")] + ["{:.1f}".format(ms) for _, ms in self.marks]
+                file.write(",".join(row) + "\n")
+        except OSError as e:
+            print("Could not write startup times to {}: {}".format(path, e))
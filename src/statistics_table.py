@@ -0,0 +1,90 @@
+from PyQt5 import QtCore
+from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem, QHeaderView
+
+
+class StatisticsTable(QTableWidget):
+    """
+    Side table showing the running statistics of every trace of a
+    :class:`plot.Plot`, both over the whole history and over the currently
+    visible x range.
+    """
+
+    COLUMNS = [
+        "Samples",
+        "Min",
+        "Max",
+        "Mean",
+        "RMS",
+        "Std",
+        "Median",
+        "P99",
+        "Rate",
+        "Jitter",
+        "View Min",
+        "View Max",
+        "View Mean",
+        "View RMS",
+        "View Std",
+    ]
+
+    def __init__(self, plot, update_frequency_hz=4, parent=None):
+        super().__init__(0, len(StatisticsTable.COLUMNS), parent)
+        self.plot = plot
+        self.setHorizontalHeaderLabels(StatisticsTable.COLUMNS)
+        self.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.setStyleSheet(
+            "QTableWidget {background: rgb(27,27,28); color: white; gridline-color: gray;}"
+            "QHeaderView::section {background: rgb(74,73,73); color: white;}"
+        )
+        self.hide()
+
+        self.update_timer = QtCore.QTimer()
+        self.update_timer.timeout.connect(self.refresh)
+        self.update_period_ms = int(1000.0 / update_frequency_hz)
+
+    def set_visible(self, visible):
+        self.setVisible(visible)
+        if visible:
+            self.refresh()
+            self.update_timer.start(self.update_period_ms)
+        else:
+            self.update_timer.stop()
+
+    def __set_cell__(self, row, column, value):
+        if isinstance(value, str):
+            text = value
+        elif isinstance(value, int):
+            text = str(value)
+        else:
+            text = "{:.6g}".format(value)
+        item = self.item(row, column)
+        if item is None:
+            self.setItem(row, column, QTableWidgetItem(text))
+        else:
+            item.setText(text)
+
+    def refresh(self):
+        channels = self.plot.statistics.channels
+        names = [name for name in self.plot.channel_names() if name in channels]
+        if self.rowCount() != len(names):
+            self.setRowCount(len(names))
+        self.setVerticalHeaderLabels(names)
+
+        (x_min, x_max), _ = self.plot.plot_item.viewRange()
+        for row, name in enumerate(names):
+            channel = channels[name]
+            values = channel.values
+            self.__set_cell__(row, 0, values.count)
+            self.__set_cell__(row, 1, values.min)
+            self.__set_cell__(row, 2, values.max)
+            self.__set_cell__(row, 3, values.mean)
+            self.__set_cell__(row, 4, values.rms)
+            self.__set_cell__(row, 5, values.std)
+            self.__set_cell__(row, 6, channel.quantiles.quantile(0.5))
+            self.__set_cell__(row, 7, channel.quantiles.quantile(0.99))
+            self.__set_cell__(row, 8, channel.sample_rate)
+            self.__set_cell__(row, 9, channel.jitter)
+            visible = channel.visible(x_min, x_max, self.plot.history.get(name))
+            for column, key in enumerate(["min", "max", "mean", "rms", "std"], start=10):
+                self.__set_cell__(row, column, visible[key] if visible else "-")
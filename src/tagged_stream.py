@@ -0,0 +1,61 @@
+class TaggedStream(object):
+    """
+    One schema of a multiplexed stream: a header `%imu,t,ax,ay,az` declares
+    the tag `imu` with the columns `t,ax,ay,az`, and lines `imu,<t>,<ax>,...`
+    are then routed to this stream (by tag, without looking at the header
+    again) and plotted on its own page, independently of the other tags.
+
+    Samples are collected in `dataset` and plotted in one batch per update.
+    """
+
+    def __init__(self, tag, header, page):
+        """
+        :param in string tag: first field of the lines of this stream
+        :param in list header: column names, the first one is the x axis
+        :param in PlotPage page: page the stream is plotted on
+        """
+        self.tag = tag
+        self.page = page
+        self.header = []
+        self.width = 0
+        self.dataset = []
+        self.set_header(header)
+
+    def set_header(self, header, clear=True):
+        """Flushes the samples received under the previous header and applies `header`"""
+        self.flush()
+        if clear:
+            if header == self.header:
+                # the device restarted, keep the previous run as a segment
+                self.page.plot.new_segment()
+            else:
+                self.page.plot.clear()
+        self.header = header
+        self.width = len(header)
+        self.page.plot.set_header(header)
+
+    def clear(self):
+        self.dataset = []
+        self.page.plot.clear()
+        self.page.plot.set_header(self.header)
+
+    def append(self, fields):
+        """
+        :param in list fields: the fields of a line after the tag
+        :returns: False if they do not match the header of the stream
+        """
+        if len(fields) != self.width:
+            return False
+        try:
+            self.dataset.append([float(x) for x in fields])
+        except ValueError:
+            return False
+        return True
+
+    def flush(self):
+        """Plots the pending samples, returns them as a batch (None if there were none)"""
+        if not len(self.dataset):
+            return None
+        batch = self.page.plot.update_data(self.dataset)
+        self.dataset = []
+        return batch
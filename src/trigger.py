@@ -0,0 +1,129 @@
+import numpy as np
+
+
+class Trigger(object):
+    """
+    Oscilloscope style trigger evaluated over batches of samples.
+
+    Samples are identified by their absolute index into the plot history, so a
+    capture is simply the [index - pre_samples, index + post_samples) slice of
+    that history once enough post-trigger samples have been received.
+
+    The trigger re-arms at the end of each capture (`index + post_samples`),
+    and in auto mode runs free after a capture window (`pre_samples +
+    post_samples`) without a trigger: both are absolute indices, so the
+    captures do not depend on how the samples are split into batches.
+    """
+
+    MODES = ["off", "single", "normal", "auto"]
+    KINDS = ["rising", "falling", "level", "window"]
+
+    def __init__(self):
+        self.mode = "off"
+        self.kind = "rising"
+        self.channel = None
+        self.level = 0.0
+        # upper bound of the window, `level` is used as the lower bound
+        self.window_high = 1.0
+        # minimum time (in units of the x axis) between two triggers
+        self.holdoff = 0.0
+        self.pre_samples = 500
+        self.post_samples = 500
+        self.armed = False
+        self.reset()
+
+    def reset(self):
+        """Forget all state carried between batches (e.g. on header change)"""
+        self.pending = None
+        # index the next trigger is looked for from, the first sample of the
+        # next batch if None
+        self.search_from = None
+        self.last_y = None
+        self.holdoff_until = -np.inf
+
+    def set_mode(self, mode):
+        if mode not in Trigger.MODES:
+            raise ValueError("Unknown trigger mode '{}'".format(mode))
+        self.mode = mode
+        self.reset()
+        self.arm()
+
+    def set_kind(self, kind):
+        if kind not in Trigger.KINDS:
+            raise ValueError("Unknown trigger kind '{}'".format(kind))
+        self.kind = kind
+        self.last_y = None
+
+    def arm(self):
+        self.armed = self.mode != "off"
+        self.pending = None
+        self.search_from = None
+
+    def __condition__(self, y):
+        """Returns a boolean mask of the samples in `y` which fire the trigger"""
+        if self.last_y is None:
+            y_prev = np.concatenate(([y[0]], y[:-1]))
+        else:
+            y_prev = np.concatenate(([self.last_y], y[:-1]))
+
+        if self.kind == "rising":
+            return (y_prev < self.level) & (y >= self.level)
+        elif self.kind == "falling":
+            return (y_prev > self.level) & (y <= self.level)
+        elif self.kind == "level":
+            return y >= self.level
+        else:
+            # fire when the signal leaves the window [level, window_high]
+            inside_prev = (y_prev >= self.level) & (y_prev <= self.window_high)
+            outside = (y < self.level) | (y > self.window_high)
+            return inside_prev & outside
+
+    def process(self, x, y, offset):
+        """
+        :param in numpy.ndarray x: time values of the batch
+        :param in numpy.ndarray y: values of the trigger channel for the batch
+        :param in int offset: history index of the first sample in the batch
+        :returns: list of history indices of triggers whose capture window
+                  is now complete
+        """
+        completed = []
+        if self.mode == "off" or len(y) == 0:
+            return completed
+
+        fired = self.__condition__(y)
+        self.last_y = y[-1]
+        end = offset + len(y)
+        if self.search_from is None:
+            self.search_from = offset
+
+        while True:
+            if self.pending is not None:
+                if end - self.pending < self.post_samples:
+                    break
+                completed.append(self.pending)
+                # re-armed once the capture is complete: that is always in
+                # this batch, as the capture was not complete before it
+                self.search_from = self.pending + self.post_samples
+                self.pending = None
+                if self.mode == "single":
+                    self.armed = False
+                    break
+            if not self.armed:
+                break
+            start = max(0, self.search_from - offset)
+            if start >= len(y):
+                break
+            candidates = np.flatnonzero(fired[start:] & (x[start:] >= self.holdoff_until))
+            # auto: the (batch) index of the free running trigger, if nothing
+            # triggered for a whole capture window
+            timeout = self.search_from + self.pre_samples + self.post_samples - offset
+            if len(candidates) and (self.mode != "auto" or start + candidates[0] <= timeout):
+                index = start + candidates[0]
+                self.pending = offset + index
+                self.holdoff_until = x[index] + self.holdoff
+            elif self.mode == "auto" and timeout < len(y):
+                self.pending = offset + timeout
+            else:
+                break
+
+        return completed
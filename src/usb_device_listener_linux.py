@@ -0,0 +1,171 @@
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import select
+import struct
+import sys
+import threading
+
+#
+# inotify event masks (see <sys/inotify.h>)
+#
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+EVENT_HEADER = struct.Struct("iIII")
+
+# device nodes of USB-UART bridges and USB CDC devices, plus the persistent
+# symlinks udev creates for them
+DEFAULT_WATCHES = [
+    ("/dev", ["ttyUSB*", "ttyACM*"]),
+    ("/dev/serial/by-id", ["*"]),
+]
+
+
+class UsbDeviceChangeMonitor:
+    """
+    Watches directories of device nodes with inotify in a background thread
+    and calls back with the device path whenever a matching node (or symlink
+    to one) appears or disappears. The callbacks run on the monitor thread.
+
+    Symlinks are reported as the device they point to, so `/dev/serial/by-id`
+    entries and `/dev/ttyUSB0` report the same port.
+    """
+
+    def __init__(
+        self,
+        on_device_arrival_callback=None,
+        on_device_removal_callback=None,
+        watches=DEFAULT_WATCHES,
+    ):
+        self.on_device_arrival_callback = on_device_arrival_callback
+        self.on_device_removal_callback = on_device_removal_callback
+        self.watches = watches
+        self.watch_descriptors = {}
+        # symlink path -> device, so removed links can still be reported
+        self.links = {}
+        self.thread = None
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.inotify_add_watch = libc.inotify_add_watch
+        self.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.stop_read, self.stop_write = os.pipe()
+        self.__add_watches__()
+
+    def __add_watches__(self):
+        """Watches the directories which exist now, e.g. once by-id is created"""
+        watched = set(self.watch_descriptors.values())
+        mask = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF
+        for directory, patterns in self.watches:
+            if directory in watched or not os.path.isdir(directory):
+                continue
+            wd = self.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+            if wd >= 0:
+                self.watch_descriptors[wd] = directory
+                for name in os.listdir(directory):
+                    path = os.path.join(directory, name)
+                    if os.path.islink(path):
+                        self.links[path] = os.path.realpath(path)
+
+    def __patterns__(self, directory):
+        for watched, patterns in self.watches:
+            if watched == directory:
+                return patterns
+        return []
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.__run__, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            os.write(self.stop_write, b"\0")
+            self.thread.join()
+            self.thread = None
+        for fd in (self.fd, self.stop_read, self.stop_write):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __run__(self):
+        try:
+            while True:
+                readable, _, _ = select.select([self.fd, self.stop_read], [], [])
+                if self.stop_read in readable:
+                    break
+                try:
+                    data = os.read(self.fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                self.__dispatch__(data)
+        except Exception as e:
+            print("USB device monitor thread exception: " + str(e))
+        print("USB device monitor thread exiting")
+
+    def __dispatch__(self, data):
+        offset = 0
+        rescan = False
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & (IN_IGNORED | IN_DELETE_SELF):
+                self.watch_descriptors.pop(wd, None)
+                continue
+            directory = self.watch_descriptors.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_ISDIR:
+                # e.g. /dev/serial appearing, which by-id lives in
+                rescan = True
+                continue
+            if not any(fnmatch.fnmatch(name, p) for p in self.__patterns__(directory)):
+                continue
+
+            path = os.path.join(directory, name)
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                if os.path.islink(path):
+                    self.links[path] = os.path.realpath(path)
+                device = self.links.get(path, path)
+                rescan = True
+                if self.on_device_arrival_callback:
+                    self.on_device_arrival_callback(device)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                device = self.links.pop(path, path)
+                if self.on_device_removal_callback:
+                    self.on_device_removal_callback(device)
+        if rescan:
+            self.__add_watches__()
+
+
+if __name__ == "__main__":
+    # e.g. `python usb_device_listener_linux.py /tmp/fake_dev` and then
+    # create / remove files named ttyUSB* in /tmp/fake_dev
+    watches = [(d, ["ttyUSB*", "ttyACM*"]) for d in sys.argv[1:]] or DEFAULT_WATCHES
+    w = UsbDeviceChangeMonitor(
+        lambda device: print("Added: " + device),
+        lambda device: print("Removed: " + device),
+        watches,
+    )
+    w.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        w.stop()
@@ -0,0 +1,58 @@
+import queue
+
+import numpy as np
+import pytest
+
+import csv_import
+
+TIMEOUT = 5.0
+
+
+@pytest.fixture
+def path(tmp_path, monkeypatch):
+    # ranges of about 1 KB, so a small file has many
+    split_ranges = csv_import.split_ranges
+    monkeypatch.setattr(csv_import, "split_ranges", lambda path, start, end: split_ranges(path, start, end, 1024))
+    path = tmp_path / "capture.csv"
+    path.write_text("%t,a\n" + "".join("{},{}\n".format(i, 2 * i) for i in range(2000)))
+    return str(path)
+
+
+def start(path):
+    ranges = queue.Queue()
+    finished = queue.Queue()
+    job = csv_import.ImportJob(
+        path,
+        1,
+        on_range=lambda parsed, fraction: ranges.put(parsed),
+        on_finished=lambda path, error: finished.put(error),
+    )
+    job.start()
+    return job, ranges, finished
+
+
+def test_ranges_wait_to_be_applied(path):
+    job, ranges, finished = start(path)
+    received = [ranges.get(timeout=TIMEOUT) for _ in range(csv_import.QUEUED_RANGES)]
+    with pytest.raises(queue.Empty):
+        ranges.get(timeout=0.3)
+
+    while job.running or not ranges.empty():
+        job.applied()
+        try:
+            received.append(ranges.get(timeout=TIMEOUT))
+        except queue.Empty:
+            break
+    assert finished.get(timeout=TIMEOUT) == ""
+    rows = np.concatenate([parsed.rows for parsed in received])
+    assert len(received) > csv_import.QUEUED_RANGES
+    assert np.array_equal(rows[:, 0], np.arange(2000))
+
+
+def test_cancel_while_waiting(path):
+    job, ranges, finished = start(path)
+    for _ in range(csv_import.QUEUED_RANGES):
+        ranges.get(timeout=TIMEOUT)
+    job.cancel()
+    assert finished.get(timeout=TIMEOUT) == "cancelled"
+    assert ranges.empty()
@@ -0,0 +1,136 @@
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from fanout_client import FanoutClient
+from fanout_server import FanoutServer
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix domain sockets")
+
+TIMEOUT = 10.0
+BATCHES = 500
+COLUMNS = ["t", "a", "b", "c"]
+
+
+@pytest.fixture
+def address(tmp_path):
+    return "unix:" + str(tmp_path / "plotter.sock")
+
+
+@pytest.fixture
+def server(address):
+    server = FanoutServer(address, budget=256 << 10)
+    server.start()
+    yield server
+    server.stop()
+
+
+def wait_for_subscribers(server, count):
+    deadline = time.monotonic() + TIMEOUT
+    while server.subscriber_count < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def subscribe(address, results, index):
+    """Reads batches until every published one is either received or reported dropped"""
+    client = FanoutClient(address)
+    batches, gaps, rows = 0, 0, []
+    client.connection.settimeout(TIMEOUT)
+    for kind, tag, value in client:
+        if kind == "batch":
+            batches += 1
+            rows.append(value[:, 0])
+        elif kind == "gap":
+            gaps += value
+        if batches + gaps >= BATCHES:
+            break
+    client.close()
+    results[index] = (batches, gaps, np.concatenate(rows) if len(rows) else np.empty(0))
+
+
+def test_a_stalled_subscriber_does_not_block_the_others(address, server):
+    results = {}
+    threads = [threading.Thread(target=subscribe, args=(address, results, i)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    # connected, but not reading anything
+    stalled = FanoutClient(address)
+    wait_for_subscribers(server, 4)
+
+    batch = np.zeros((1000, len(COLUMNS)))
+    slowest = 0.0
+    for index in range(BATCHES):
+        batch[:, 0] = index
+        started = time.perf_counter()
+        server.publish("", COLUMNS, batch)
+        slowest = max(slowest, time.perf_counter() - started)
+        time.sleep(0.001)
+    for thread in threads:
+        thread.join(TIMEOUT)
+    # publishing only encodes and queues the batch
+    assert slowest < 0.1
+
+    assert len(results) == 3
+    for batches, gaps, times in results.values():
+        assert batches + gaps == BATCHES
+        # what was received arrived in order
+        assert np.all(np.diff(times[::1000]) > 0)
+
+    # the stalled subscriber now reads: its oldest batches were dropped
+    stalled.connection.settimeout(TIMEOUT)
+    kinds = []
+    batches = gaps = 0
+    for kind, tag, value in stalled:
+        kinds.append(kind)
+        if kind == "batch":
+            batches += 1
+        elif kind == "gap":
+            gaps += value
+        if batches + gaps >= BATCHES:
+            break
+    stalled.close()
+    assert kinds[0] == "header"
+    assert "gap" in kinds and gaps > 0
+    assert batches + gaps == BATCHES
+
+
+def test_a_live_socket_is_not_taken_over(address, server):
+    with pytest.raises(OSError):
+        FanoutServer(address)
+    # the first server still serves its subscribers
+    client = FanoutClient(address)
+    wait_for_subscribers(server, 1)
+    server.publish("", COLUMNS, np.ones((2, len(COLUMNS))))
+    assert next(iter(client))[0] == "header"
+    client.close()
+
+
+def test_a_stale_socket_is_replaced(address):
+    path = address[len("unix:") :]
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    assert os.path.exists(path)
+    server = FanoutServer(address)
+    server.start()
+    server.stop()
+    assert not os.path.exists(path)
+
+
+def test_stopping_keeps_the_socket_of_another_server(address):
+    first = FanoutServer(address)
+    first.start()
+    path = address[len("unix:") :]
+    # e.g. removed by hand, and another plotter started since
+    os.remove(path)
+    second = FanoutServer(address)
+    second.start()
+    first.stop()
+    assert os.path.exists(path)
+    second.stop()
+    assert not os.path.exists(path)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+WIDTH, HEIGHT = 800, 600
+
+
+class Job(object):
+    def progress(self, done):
+        pass
+
+
+@pytest.fixture
+def plot(monkeypatch):
+    pytest.importorskip("PyQt5")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+
+    from plot import Plot
+
+    app = QApplication.instance() or QApplication([])
+    plot = Plot(["t", "a", "b"])
+    yield plot
+    plot.clear()
+    app.processEvents()
+
+
+def pixels(plot):
+    """Renders the plot like File > Export Image, as an array of pixels"""
+    from PyQt5 import QtGui
+
+    import image_export
+
+    font = QtGui.QFont()
+    font.setPointSize(10)
+    image = QtGui.QImage(WIDTH, HEIGHT, QtGui.QImage.Format_ARGB32)
+    image_export.render(image_export.ImageSnapshot(plot, font), image, WIDTH, HEIGHT, Job())
+    bits = image.constBits()
+    bits.setsize(image.byteCount())
+    return np.frombuffer(bits, np.uint8).reshape(HEIGHT, WIDTH, 4).copy()
+
+
+def test_the_decimated_image_is_the_full_one(plot, monkeypatch):
+    import image_export
+
+    rng = np.random.default_rng(3)
+    t = np.arange(200000) * 1e-3
+    a = np.sin(t) + 0.3 * rng.standard_normal(len(t))
+    b = np.cos(3 * t) + 0.05 * rng.standard_normal(len(t))
+    # gaps the line is broken at
+    a[50000:50100] = np.nan
+    b[120000:150000] = np.nan
+    a[170000::997] = np.nan
+    plot.update_data(np.column_stack((t, a, b)))
+    plot.plot_item.setXRange(0, 200, padding=0)
+    plot.plot_item.setYRange(-2, 2, padding=0)
+
+    decimated = pixels(plot)
+    monkeypatch.setattr(image_export, "m4_indices", lambda px, y, left, width, runs=None: np.arange(len(px)))
+    assert np.array_equal(decimated, pixels(plot))
+
+
+def test_the_line_is_broken_at_gaps(plot):
+    t = np.arange(1000, dtype=float)
+    a = np.zeros(len(t))
+    a[400:600] = np.nan
+    plot.update_data(np.column_stack((t, a, np.full(len(t), np.nan))))
+    plot.plot_item.setXRange(0, 1000, padding=0)
+    plot.plot_item.setYRange(-1, 1, padding=0)
+    color = plot.traces["a"].opts["pen"].color()
+
+    # the pixels of the trace, below the legend
+    image = pixels(plot)[HEIGHT // 4 :]
+    drawn = np.all(image[:, :, :3] == (color.blue(), color.green(), color.red()), axis=2)
+    columns = np.flatnonzero(drawn.any(axis=0))
+    # about a fifth of the width is not drawn
+    assert np.diff(columns).max() > WIDTH // 8
@@ -0,0 +1,131 @@
+import queue
+import socket
+import time
+
+import pytest
+
+from network_session import NetworkSession, parse_address
+
+TIMEOUT = 5.0
+
+
+def free_port(kind=socket.SOCK_STREAM):
+    """A port of the loopback interface nothing listens on, for a session to bind"""
+    with socket.socket(socket.AF_INET, kind) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def wait_for_state(states, expected):
+    """Returns the states seen (in order) up to and including `expected`"""
+    seen = []
+    while True:
+        state, _ = states.get(timeout=TIMEOUT)
+        seen.append(state)
+        if state == expected:
+            return seen
+
+
+def connect(port):
+    """Connects to a session listening on `port`, once it does"""
+    deadline = time.monotonic() + TIMEOUT
+    while True:
+        try:
+            return socket.create_connection(("127.0.0.1", port), timeout=TIMEOUT)
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.02)
+
+
+@pytest.fixture
+def start():
+    sessions = []
+
+    def start(address):
+        lines = queue.Queue()
+        states = queue.Queue()
+        session = NetworkSession(
+            address,
+            0,
+            lambda line, received_ns: lines.put(line),
+            lambda state, detail: states.put((state, detail)),
+            min_backoff=0.05,
+            max_backoff=0.2,
+        )
+        sessions.append(session)
+        session.start()
+        return session, lines, states
+
+    yield start
+    for session in sessions:
+        session.stop()
+        session.thread.join(TIMEOUT)
+        assert session.state == "closed"
+
+
+def received(lines, count):
+    return [lines.get(timeout=TIMEOUT) for _ in range(count)]
+
+
+def test_parse_address():
+    assert parse_address("tcp://192.168.4.1:3333") == ("tcp://", "192.168.4.1", 3333)
+    assert parse_address("udp://:3333") == ("udp://", "", 3333)
+    assert parse_address("tcp-listen://[::1]:80") == ("tcp-listen://", "::1", 80)
+    with pytest.raises(ValueError):
+        parse_address("tcp://host")
+    with pytest.raises(ValueError):
+        parse_address("/dev/ttyUSB0")
+
+
+def test_tcp_client_reconnects(start):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        listener.settimeout(TIMEOUT)
+        session, lines, states = start("tcp://127.0.0.1:{}".format(listener.getsockname()[1]))
+
+        device, _ = listener.accept()
+        assert wait_for_state(states, "streaming") == ["connecting", "streaming"]
+        device.sendall(b"%t,a\n0,1")
+        device.sendall(b"\n1,2\n")
+        assert received(lines, 3) == [b"%t,a", b"0,1", b"1,2"]
+
+        # the device resets: the session connects again
+        device.close()
+        assert wait_for_state(states, "backoff") == ["lost", "backoff"]
+        device, _ = listener.accept()
+        seen = wait_for_state(states, "streaming")
+        assert seen[0] == "reconnecting"
+        device.sendall(b"2,3\n")
+        assert received(lines, 1) == [b"2,3"]
+        device.close()
+
+
+def test_tcp_server_accepts_the_next_device(start):
+    port = free_port()
+    session, lines, states = start("tcp-listen://127.0.0.1:{}".format(port))
+
+    with connect(port) as device:
+        assert wait_for_state(states, "streaming") == ["connecting", "streaming"]
+        device.sendall(b"%t,a\n0,1\n")
+        assert received(lines, 2) == [b"%t,a", b"0,1"]
+    assert wait_for_state(states, "backoff") == ["lost", "backoff"]
+
+    # the next connection is accepted on the same port
+    with connect(port) as device:
+        assert wait_for_state(states, "streaming")[-2:] == ["reconnecting", "streaming"]
+        device.sendall(b"1,2\n")
+        assert received(lines, 1) == [b"1,2"]
+
+
+def test_udp_datagrams_are_lines(start):
+    port = free_port(socket.SOCK_DGRAM)
+    session, lines, states = start("udp://127.0.0.1:{}".format(port))
+    assert wait_for_state(states, "streaming") == ["connecting", "streaming"]
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as device:
+        device.sendto(b"%t,a\n0,1\n", ("127.0.0.1", port))
+        # the line ending of the last line of a datagram is optional
+        device.sendto(b"1,2", ("127.0.0.1", port))
+        assert received(lines, 3) == [b"%t,a", b"0,1", b"1,2"]
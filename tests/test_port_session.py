@@ -0,0 +1,172 @@
+import os
+import queue
+import time
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pty")
+
+TIMEOUT = 5.0
+
+
+class FakeDevice(object):
+    """
+    The writer end of a pty, reached through a symlink like a
+    /dev/serial/by-id entry: closing it is the device going away, and
+    `plug` a new pty behind the same path is the device coming back.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.master = None
+
+    def plug(self):
+        self.master, slave = os.openpty()
+        if os.path.lexists(self.path):
+            os.remove(self.path)
+        os.symlink(os.ttyname(slave), self.path)
+        # only the session holds the reader end, so it sees the hang up
+        os.close(slave)
+
+    def unplug(self):
+        os.close(self.master)
+        self.master = None
+
+    def write(self, data):
+        os.write(self.master, data)
+
+    def close(self):
+        if self.master is not None:
+            os.close(self.master)
+            self.master = None
+
+
+def wait_for_state(states, expected):
+    """Returns the states seen (in order) up to and including `expected`"""
+    seen = []
+    while True:
+        state, _ = states.get(timeout=TIMEOUT)
+        seen.append(state)
+        if state == expected:
+            return seen
+
+
+@pytest.fixture
+def session(tmp_path):
+    from port_session import PortSession
+
+    device = FakeDevice(str(tmp_path / "ttyUSB-fake"))
+    device.plug()
+    lines = queue.Queue()
+    states = queue.Queue()
+    session = PortSession(
+        device.path,
+        115200,
+        lambda line, received_ns: lines.put(line),
+        lambda state, detail: states.put((state, detail)),
+        min_backoff=0.05,
+        max_backoff=0.2,
+    )
+    yield session, device, lines, states
+    session.stop()
+    if session.thread is not None:
+        session.thread.join(TIMEOUT)
+    device.close()
+
+
+def test_lines_are_split_across_reads(session):
+    session, device, lines, states = session
+    session.start()
+    assert wait_for_state(states, "streaming") == ["connecting", "streaming"]
+    device.write(b"%t,a\n0,1")
+    device.write(b"\n1,2\n")
+    assert [lines.get(timeout=TIMEOUT) for _ in range(3)] == [b"%t,a", b"0,1", b"1,2"]
+
+
+def test_reconnects_after_the_writer_end_is_closed(session):
+    session, device, lines, states = session
+    session.start()
+    wait_for_state(states, "streaming")
+    device.write(b"before\n")
+    assert lines.get(timeout=TIMEOUT) == b"before"
+
+    device.unplug()
+    assert wait_for_state(states, "backoff") == ["lost", "backoff"]
+    device.plug()
+    seen = wait_for_state(states, "streaming")
+    assert seen[0] == "reconnecting"
+    assert set(seen[:-1]) <= {"reconnecting", "backoff"}
+    assert session.is_open
+
+    device.write(b"after\n")
+    assert lines.get(timeout=TIMEOUT) == b"after"
+
+
+def test_unplugging_the_current_port_keeps_the_session_and_the_plot(tmp_path, monkeypatch):
+    pytest.importorskip("PyQt5")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+
+    from main_window import MainWindow
+
+    app = QApplication.instance() or QApplication([])
+    window = MainWindow()
+    window.log = lambda message: None
+    device = FakeDevice(str(tmp_path / "ttyUSB-fake"))
+    device.plug()
+
+    def wait_until(condition):
+        deadline = time.monotonic() + TIMEOUT
+        while not condition():
+            assert time.monotonic() < deadline
+            app.processEvents()
+            time.sleep(0.01)
+
+    def received(rows):
+        # the rows are parsed on the GUI thread
+        def condition():
+            window.__update_plot__()
+            plot = window.plot_page.plot
+            return "a" in plot.data and len(plot.column("a", 0)) == rows
+
+        return condition
+
+    try:
+        # the startup listing of the ports would remove the fake one
+        wait_until(lambda: window.port_enumerator.ports is not None and not window.port_enumerator.running)
+        app.processEvents()
+        window.serial_ports.append(device.path)
+        window.__add_port_action__(device.path)
+        window.__on_port_changed__(device.path)
+        session = window.port_session
+        wait_until(lambda: session.state == "streaming")
+        device.write(b"%t,a\n0,1\n1,2\n")
+        wait_until(received(2))
+
+        device.unplug()
+        window.__on_port_removed__(device.path)
+        wait_until(lambda: session.state == "backoff")
+        assert window.port == device.path
+        assert window.port_session is session and session.is_open
+
+        device.plug()
+        window.__on_port_added__(device.path)
+        wait_until(lambda: session.state == "streaming")
+        assert window.port_session is session
+        assert window.port_actions[device.path].isChecked()
+        device.write(b"2,3\n")
+        wait_until(received(3))
+
+        # opening the same port again continues the capture too
+        window.__on_port_changed__(device.path)
+        wait_until(lambda: window.port_session.state == "streaming")
+        device.write(b"3,4\n")
+        wait_until(received(4))
+    finally:
+        if window.port_session is not None:
+            window.port_session.stop()
+            window.port_session.thread.join(TIMEOUT)
+        if window.device_monitor is not None:
+            window.device_monitor.stop()
+        device.close()
+        window.close()
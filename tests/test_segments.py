@@ -0,0 +1,101 @@
+import os
+
+import numpy as np
+import pytest
+
+from segments import ResetDetector
+
+
+def reset_rows(x, batches=1):
+    """The restarts a detector finds in `x`, fed as that many batches"""
+    detector = ResetDetector()
+    resets = []
+    start = 0
+    for batch in np.array_split(np.asarray(x, dtype=float), batches):
+        resets += [start + row for row in detector.reset_rows(batch)]
+        start += len(batch)
+    return resets
+
+
+def test_restarts_are_found_whatever_the_batches():
+    x = np.concatenate((np.arange(100), np.arange(50), np.arange(40)))
+    assert reset_rows(x) == [100, 150]
+    for batches in (2, 7, 37, len(x)):
+        assert reset_rows(x, batches) == [100, 150]
+
+
+def test_jitter_is_not_a_restart():
+    x = np.arange(1000) + np.random.default_rng(1).uniform(-1.5, 1.5, 1000)
+    assert reset_rows(x) == []
+    assert reset_rows(x, 100) == []
+
+
+def test_a_wrapping_counter_is_not_a_restart():
+    assert reset_rows(np.arange(3000) % 2) == []
+    assert reset_rows(np.arange(3000) % 4, 300) == []
+
+
+def test_a_restart_needs_the_time_to_have_run_forward():
+    short = np.concatenate((np.arange(10), np.arange(100)))
+    assert reset_rows(short) == []
+    detector = ResetDetector(min_rows=5)
+    assert detector.reset_rows(short) == [10]
+
+
+def test_clear_starts_a_segment_from_the_next_rows():
+    detector = ResetDetector()
+    assert detector.reset_rows(np.arange(100.0)) == []
+    detector.clear()
+    # no restart at the first row, whatever its time
+    assert detector.reset_rows(np.arange(50.0)) == []
+    assert detector.reset_rows([10.0]) == [0]
+
+
+@pytest.fixture
+def plot(monkeypatch):
+    pytest.importorskip("PyQt5")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+
+    from plot import Plot
+
+    app = QApplication.instance() or QApplication([])
+    plot = Plot(["t", "a", "b", "c"])
+    yield plot
+    plot.clear()
+    app.processEvents()
+
+
+def rows(x):
+    return [[t, t * 2, -t, 1.0] for t in x]
+
+
+def test_new_segment_archives_the_rows_received(plot):
+    plot.update_data(rows(range(100)))
+    segment = plot.new_segment()
+    assert segment.number == 1
+    assert segment.rows == 100
+    assert segment.x_range == (0.0, 99.0)
+    assert plot.segment_rows == 0
+    # nothing received since
+    assert plot.new_segment() is None
+
+    # the rows after it start the segment, even though the time went back
+    plot.update_data(rows(range(50)))
+    assert len(plot.segments) == 1
+    assert plot.segment_rows == 50
+
+
+def test_segments_share_the_spill_file_of_each_trace(plot):
+    if not os.path.isdir("/proc/self/fd"):
+        pytest.skip("needs /proc/self/fd")
+    # a device restarting every 40 rows
+    plot.update_data(rows(np.tile(np.arange(40), 10)))
+    descriptors = len(os.listdir("/proc/self/fd"))
+    plot.update_data(rows(np.tile(np.arange(40), 200)))
+    assert len(plot.segments) == 209
+    assert len(os.listdir("/proc/self/fd")) == descriptors
+    files = set(id(segment.history[name].file) for segment in plot.segments for name in segment.history)
+    assert len(files) == 3
+    x, y = plot.segments[0].view("a", 0, 39, 1000)
+    assert np.array_equal(x, np.arange(40)) and np.array_equal(y, np.arange(40) * 2)
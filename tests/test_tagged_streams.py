@@ -0,0 +1,59 @@
+import pytest
+
+
+@pytest.fixture
+def window(monkeypatch):
+    pytest.importorskip("PyQt5")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+
+    from main_window import MainWindow
+
+    app = QApplication.instance() or QApplication([])
+    window = MainWindow()
+    window.log = lambda message: None
+    yield window
+    if window.device_monitor is not None:
+        window.device_monitor.stop()
+    window.close()
+    app.processEvents()
+
+
+def receive(window, *lines):
+    for line in lines:
+        window.serial_data_queue.put((line, 0))
+    window.__update_plot__()
+
+
+def rows(plot, name="a"):
+    return len(plot.column(name, 0)) if name in plot.data else 0
+
+
+def test_the_header_of_a_new_tag_keeps_the_main_plot(window):
+    assert window.auto_clear_plot_on_header_change
+    plot = window.plot_page.plot
+    receive(window, "%time,a,b", "0,1,2", "1,2,3")
+    assert plot.trace_names == ["time", "a", "b"]
+
+    # a tag of the same width, declared before its first data line
+    receive(window, "%imu,t,ax", "%motor,t,rpm")
+    receive(window, "2,3,4", "imu,0,1", "motor,0,100")
+    assert plot.trace_names == ["time", "a", "b"]
+    assert rows(plot) == 3
+    assert window.tagged_streams["imu"].page.plot.trace_names == ["t", "ax"]
+    assert rows(window.tagged_streams["motor"].page.plot, "rpm") == 1
+
+
+def test_a_main_header_applies_once_its_rows_arrive(window):
+    plot = window.plot_page.plot
+    receive(window, "%time,a,b", "0,1,2", "1,2,3")
+    receive(window, "%time,a,b,c")
+    assert plot.trace_names == ["time", "a", "b"]
+    receive(window, "0,1,2,3")
+    assert plot.trace_names == ["time", "a", "b", "c"]
+    assert rows(plot) == 1
+
+    # the same header again is a restart
+    receive(window, "%time,a,b,c", "0,1,2,3")
+    assert len(plot.segments) == 1
+    assert rows(plot) == 1
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from trigger import Trigger
+
+
+def make_trigger(mode, pre_samples=10, post_samples=10, holdoff=0.0):
+    trigger = Trigger()
+    trigger.level = 0.5
+    trigger.pre_samples = pre_samples
+    trigger.post_samples = post_samples
+    trigger.holdoff = holdoff
+    trigger.set_mode(mode)
+    return trigger
+
+
+def captures(trigger, y, batch):
+    """The capture indices of `y`, processed `batch` samples at a time"""
+    y = np.asarray(y, dtype=float)
+    x = np.arange(len(y), dtype=float)
+    completed = []
+    for offset in range(0, len(y), batch):
+        completed += trigger.process(x[offset : offset + batch], y[offset : offset + batch], offset)
+    return [int(index) for index in completed]
+
+
+@pytest.mark.parametrize("mode", ["normal", "auto"])
+def test_rearms_at_the_end_of_each_capture(mode):
+    y = [0, 1] * 50
+    assert captures(make_trigger(mode), y, len(y)) == list(range(1, 90, 10))
+
+
+@pytest.mark.parametrize("mode", ["single", "normal", "auto"])
+@pytest.mark.parametrize("holdoff", [0.0, 25.0])
+def test_captures_do_not_depend_on_the_batches(mode, holdoff):
+    rng = np.random.default_rng(2)
+    # bursts of edges, separated by quiet stretches for auto to run free
+    y = np.where(rng.random(2000) < 0.5, 1.0, 0.0) * (np.arange(2000) % 400 < 150)
+    expected = captures(make_trigger(mode, holdoff=holdoff), y, len(y))
+    assert len(expected)
+    for batch in (1, 3, 5, 64, 333):
+        assert captures(make_trigger(mode, holdoff=holdoff), y, batch) == expected
+
+
+def test_auto_runs_free_without_triggers():
+    trigger = make_trigger("auto", pre_samples=5, post_samples=10)
+    # one free running capture per capture window
+    assert captures(trigger, np.zeros(100), 7) == [15, 40, 65, 90]
+
+
+def test_single_captures_once():
+    assert captures(make_trigger("single"), [0, 1] * 50, 5) == [1]
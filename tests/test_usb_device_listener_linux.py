@@ -0,0 +1,57 @@
+import os
+import queue
+import sys
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+
+TIMEOUT = 5.0
+
+
+@pytest.fixture
+def monitor(tmp_path):
+    from usb_device_listener_linux import UsbDeviceChangeMonitor
+
+    events = queue.Queue()
+    watched = tmp_path / "dev"
+    watched.mkdir()
+    monitor = UsbDeviceChangeMonitor(
+        lambda device: events.put(("added", device)),
+        lambda device: events.put(("removed", device)),
+        watches=[(str(watched), ["ttyUSB*"])],
+    )
+    monitor.start()
+    yield monitor, watched, events
+    monitor.stop()
+
+
+def test_device_node_arrival_and_removal(monitor):
+    _, watched, events = monitor
+    node = watched / "ttyUSB0"
+    node.touch()
+    assert events.get(timeout=TIMEOUT) == ("added", str(node))
+    node.unlink()
+    assert events.get(timeout=TIMEOUT) == ("removed", str(node))
+
+
+def test_symlink_reports_the_device_it_points_to(monitor, tmp_path):
+    _, watched, events = monitor
+    device = tmp_path / "ttyACM3"
+    device.touch()
+    link = watched / "ttyUSB-by-id"
+    link.symlink_to(device)
+    assert events.get(timeout=TIMEOUT) == ("added", os.path.realpath(device))
+    # the target may be gone already when the link is removed
+    device.unlink()
+    link.unlink()
+    assert events.get(timeout=TIMEOUT) == ("removed", os.path.realpath(device))
+
+
+def test_other_names_are_ignored(monitor):
+    _, watched, events = monitor
+    (watched / "ttyS0").touch()
+    node = watched / "ttyUSB1"
+    node.touch()
+    assert events.get(timeout=TIMEOUT) == ("added", str(node))
+    assert events.empty()